@@ -3,11 +3,14 @@
 import logging
 import os
 import uuid
+from typing import Optional
 
 from eth_typing import HexStr
 from pydantic.dataclasses import dataclass
 from web3 import Web3
 
+LIQUORICE_WS_URL = "wss://api.liquorice.tech/v1/maker/ws"
+
 log = logging.getLogger(__name__)
 
 
@@ -22,11 +25,17 @@ class MakerConfig:
         maker (str): Maker session ID for authentication
         authorization (str): UUID authorization token for maker session
         signer_priv_key (str): Hex Private key for signing quotes
+        fast_path (bool): Decode/encode Liquorice messages without pydantic models
+        ws_url (str): Liquorice maker websocket URL
+        capture_path (str): Append all Liquorice websocket frames to this capture file
     """
 
     maker: str
     authorization: str
     signer_priv_key: HexStr
+    fast_path: bool = False
+    ws_url: str = LIQUORICE_WS_URL
+    capture_path: Optional[str] = None
 
     @classmethod
     def from_env(cls) -> "MakerConfig":
@@ -63,8 +72,22 @@ class MakerConfig:
             raise ValueError(f"Invalid SIGNER_PRIV_KEY: {e}") from e
         log.debug("Using account %s derived from SIGNER_PRIV_KEY", account.address)
 
+        fast_path = os.getenv("LIQUORICE_FAST_PATH", "").lower() in ("1", "true", "yes")
+        log.debug("Using Liquorice fast path: %s", fast_path)
+
+        ws_url = os.getenv("LIQUORICE_WS_URL") or LIQUORICE_WS_URL
+        if ws_url != LIQUORICE_WS_URL:
+            log.warning("Using non-default Liquorice WebSocket URL: %s", ws_url)
+
+        capture_path = os.getenv("LIQUORICE_CAPTURE") or None
+        if capture_path:
+            log.info("Capturing Liquorice WebSocket frames to %s", capture_path)
+
         return cls(
             maker=maker,
             authorization=authorization,
             signer_priv_key=signer_priv_key,
+            fast_path=fast_path,
+            ws_url=ws_url,
+            capture_path=capture_path,
         )
@@ -2,7 +2,7 @@ import os
 
 import pytest
 
-from app.config.maker import MakerConfig
+from app.config.maker import LIQUORICE_WS_URL, MakerConfig
 
 
 def test_maker_config_from_env_success():
@@ -24,6 +24,19 @@ def test_maker_config_from_env_success():
         config.signer_priv_key
         == "deadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeef"
     )
+    assert config.ws_url == LIQUORICE_WS_URL
+
+
+def test_maker_config_ws_url_override():
+    """Test LIQUORICE_WS_URL points the client to another (e.g. simulated) API."""
+    os.environ["MAKER_SESS_ID"] = "test_maker_id"
+    os.environ["MAKER_SESS_AUTH"] = "4aa0e0f2-50eb-48a0-b78e-b6bb446ccd7b"
+    os.environ["SIGNER_PRIV_KEY"] = (
+        "deadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeef"
+    )
+    os.environ["LIQUORICE_WS_URL"] = "ws://127.0.0.1:9010"
+
+    assert MakerConfig.from_env().ws_url == "ws://127.0.0.1:9010"
 
 
 def test_maker_config_missing_maker_id():
@@ -98,7 +111,7 @@ def clean_env():
     orig_env = dict(os.environ)
 
     # Clean relevant variables
-    for key in ["MAKER_SESS_ID", "MAKER_SESS_AUTH", "SIGNER_PRIV_KEY"]:
+    for key in ["MAKER_SESS_ID", "MAKER_SESS_AUTH", "SIGNER_PRIV_KEY", "LIQUORICE_WS_URL"]:
         os.environ.pop(key, None)
 
     yield
@@ -0,0 +1,157 @@
+"""JSON-RPC batching of the reads of a chain.
+
+`RpcBatcher` collects the reads issued in the same event loop tick (block number,
+ERC-20 balances and allowances, native balances) and sends them as one JSON-RPC
+batch request through the `RpcPool`, so a refresh of N balances costs one round
+trip instead of N + 1. Batches are split at `max_batch` requests and sent one at
+a time: web3 persistent providers match batch responses by a single fixed id, so
+two batches in flight on a connection would receive each other's responses.
+
+A failed batch (no endpoint could serve it) fails all of its reads with the pool
+error, an error response to a single request fails that read with `RpcCallError`.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, List, Optional, Tuple
+
+from eth_typing import ChecksumAddress
+from web3 import AsyncWeb3
+from web3.types import RPCEndpoint, RPCResponse
+
+from app.evm.helpers import encode_address
+from app.evm.pool import RPC_BATCH_SIZE, RpcPool
+from app.metrics.metrics import metrics
+
+log = getLogger(__name__)
+
+ERC20_BALANCE_OF_SELECTOR = "0x70a08231"  # keccak("balanceOf(address)")[:4]
+ERC20_ALLOWANCE_SELECTOR = "0xdd62ed3e"  # keccak("allowance(address,address)")[:4]
+
+
+class RpcCallError(Exception):
+    """JSON-RPC error response to a single request of a batch."""
+
+    def __init__(self, method: str, error: Any) -> None:
+        super().__init__(f"{method} failed: {error}")
+        self.method = method
+        self.error = error
+
+
+@dataclass(slots=True)
+class BatchedCall:
+    """Read waiting for its batch."""
+
+    method: str
+    params: List[Any]
+    future: asyncio.Future
+
+
+def hex_to_int(value: Any) -> int:
+    """Integer of a hex quantity or of a uint256 `eth_call` result.
+
+    Raises:
+        ValueError: if the value is not a hex number (e.g. `0x` from a non-contract)
+    """
+    if not isinstance(value, str) or len(value) <= 2:
+        raise ValueError(f"Not a hex number: {value!r}")
+    return int(value, 16)
+
+
+class RpcBatcher:
+    """Coalesces the reads issued in the same tick into JSON-RPC batches, see module."""
+
+    rpc: RpcPool
+    max_batch: int
+
+    def __init__(self, rpc: RpcPool, max_batch: int = RPC_BATCH_SIZE) -> None:
+        self.rpc = rpc
+        self.max_batch = max(1, max_batch)
+        self._pending: List[BatchedCall] = []
+        self._flush_scheduled = False
+        self._send_lock = asyncio.Lock()
+        self._tasks: set = set()
+
+    async def request(self, method: str, params: List[Any]) -> Any:
+        """Raw JSON-RPC result of `method`, sent with the other reads of this tick.
+
+        Raises:
+            RpcCallError: on an error response to this request
+            RpcUnavailable: if no endpoint could serve the batch
+        """
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending.append(BatchedCall(method, params, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+        return await future
+
+    async def block_number(self) -> int:
+        """Latest block number."""
+        return hex_to_int(await self.request("eth_blockNumber", []))
+
+    async def native_balance(self, holder: ChecksumAddress, block: str = "latest") -> int:
+        """Native (ETH) balance of `holder` in wei."""
+        return hex_to_int(await self.request("eth_getBalance", [holder, block]))
+
+    async def balance_of(
+        self, token: ChecksumAddress, holder: ChecksumAddress, block: str = "latest"
+    ) -> int:
+        """ERC-20 `balanceOf(holder)` of `token`."""
+        data = ERC20_BALANCE_OF_SELECTOR + encode_address(holder)[2:]
+        return hex_to_int(await self.request("eth_call", [{"to": token, "data": data}, block]))
+
+    async def allowance(
+        self,
+        token: ChecksumAddress,
+        owner: ChecksumAddress,
+        spender: ChecksumAddress,
+        block: str = "latest",
+    ) -> int:
+        """ERC-20 `allowance(owner, spender)` of `token`."""
+        data = ERC20_ALLOWANCE_SELECTOR + encode_address(owner)[2:] + encode_address(spender)[2:]
+        return hex_to_int(await self.request("eth_call", [{"to": token, "data": data}, block]))
+
+    def flush(self) -> None:
+        """Send the pending reads, in batches of at most `max_batch` requests."""
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.max_batch):
+            task = asyncio.create_task(self.send(pending[i : i + self.max_batch]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def send(self, calls: List[BatchedCall]) -> None:
+        """Send one batch and resolve the futures of its reads."""
+        requests: List[Tuple[RPCEndpoint, Any]] = [
+            (RPCEndpoint(call.method), call.params) for call in calls
+        ]
+
+        async def exchange(w3: AsyncWeb3) -> List[RPCResponse]:
+            if len(requests) == 1:
+                return [await w3.provider.make_request(*requests[0])]
+            return list(await w3.provider.make_batch_request(requests))
+
+        try:
+            async with self._send_lock:
+                responses = await self.rpc.read(exchange)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            for call in calls:
+                if not call.future.done():
+                    call.future.set_exception(e)
+            return
+        metrics.rpc_batch_size.labels(chain=self.rpc.chain.name).observe(len(calls))
+        metrics.rpc_round_trips_saved.labels(chain=self.rpc.chain.name).inc(len(calls) - 1)
+        error: Optional[BaseException] = None
+        if len(responses) != len(calls):
+            error = RpcCallError("batch", f"{len(responses)} responses to {len(calls)} requests")
+        for i, call in enumerate(calls):
+            if call.future.done():  # reader cancelled
+                continue
+            if error is not None:
+                call.future.set_exception(error)
+            elif "error" in responses[i]:
+                call.future.set_exception(RpcCallError(call.method, responses[i]["error"]))
+            else:
+                call.future.set_result(responses[i].get("result"))
@@ -6,3 +6,12 @@ ERC20_TRANSFER_TOPIC: HexStr = HexStr(
     "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
 )
 ERC20_ZERO_ADDRESS: str = "0x0000000000000000000000000000000000000000"
+# Pseudo-token address of the native gas token (CoW Protocol convention)
+NATIVE_TOKEN_ADDRESS: str = "0xEeeeeEeeeEeEeeEeEeEeeEEEeeeeEeeeeeeeEEeE"
+# Liquorice Balance Manager, the spender of the allowances of the settlement keeper
+LIQUORICE_BALANCE_MANAGER_ADDRESS: str = "0x38E1E461dadA062C202Cb63b1AC8Be09b95340CD"
+
+
+def is_native_token(address: str) -> bool:
+    """Whether `address` is the native gas token pseudo-address."""
+    return address.lower() == NATIVE_TOKEN_ADDRESS.lower()
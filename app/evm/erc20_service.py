@@ -1,13 +1,22 @@
 import asyncio
+import math
+import os
+import time
+from dataclasses import dataclass
 from logging import getLogger
-from typing import Optional
+from typing import Any, List, Mapping, Optional
 
 from eth_typing import ChecksumAddress
-from web3 import AsyncWeb3
-from web3.contract import AsyncContract
+from web3 import Web3
 
+from app.evm.batching import RpcBatcher
+from app.evm.const import LIQUORICE_BALANCE_MANAGER_ADDRESS, is_native_token
+from app.evm.history import BALANCE_HISTORY_BLOCKS, BalanceHistory
+from app.evm.pool import RpcPool, RpcUnavailable
 from app.markets.markets import MarketState
+from app.metrics.metrics import metrics
 from app.schemas.chain import Chain
+from app.schemas.token import ERC20Token
 
 log = getLogger(__name__)
 
@@ -24,28 +33,87 @@ ERC20_ABI = [
 ]
 ERC20_UPDATE_INTERVAL = 60  # seconds, how often to update balances
 ERC20_MIN_UPDATE_DELAY = 1  # seconds, minimum delay between updates
+ERC20_REFRESH_MAX_BLOCKS = 240  # max adaptive stride of newHeads driven refreshes
+ERC20_REFRESH_MAX_BUSY = 0.5  # max share of time spent refreshing (newHeads driven)
+BLOCK_INTERVAL_EMA_ALPHA = 0.2  # weight of the latest head interval in the block time estimate
 
 
-class ERC20Service:
+@dataclass(slots=True)
+class BalanceRefreshConfig:
+    """newHeads driven balance refresh settings.
+
+    With `blocks` > 0 balances are also refreshed every `blocks` new blocks. The stride
+    adapts to the refresh duration (RPC latency): it grows so that refreshes take at most
+    `max_busy` of the time, up to `max_blocks`. Heads arriving while a refresh is in
+    flight are coalesced into it.
+
+    Between refreshes balances follow the transfer logs, `history_blocks` blocks of
+    them are kept to revert reorged transfers and to quote confirmed balances."""
+
+    blocks: int = 0
+    max_blocks: int = ERC20_REFRESH_MAX_BLOCKS
+    max_busy: float = ERC20_REFRESH_MAX_BUSY
+    history_blocks: int = BALANCE_HISTORY_BLOCKS
+
+    @classmethod
+    def from_env(cls) -> "BalanceRefreshConfig":
+        """Create from `ERC20_REFRESH_BLOCKS` (0, disabled by default),
+        `ERC20_REFRESH_MAX_BLOCKS`, `ERC20_REFRESH_MAX_BUSY` and
+        `ERC20_HISTORY_BLOCKS` env vars."""
+        return cls(
+            blocks=int(os.getenv("ERC20_REFRESH_BLOCKS", "0")),
+            max_blocks=int(os.getenv("ERC20_REFRESH_MAX_BLOCKS", str(ERC20_REFRESH_MAX_BLOCKS))),
+            max_busy=float(os.getenv("ERC20_REFRESH_MAX_BUSY", str(ERC20_REFRESH_MAX_BUSY))),
+            history_blocks=int(os.getenv("ERC20_HISTORY_BLOCKS", str(BALANCE_HISTORY_BLOCKS))),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether refreshes are driven by new heads."""
+        return self.blocks > 0
+
+
+class ERC20Service:  # pylint: disable=too-many-instance-attributes
     """Service for reading and updating ERC-20 token balances"""
 
     chain: Chain
-    w3: AsyncWeb3
+    rpc: RpcPool
+    reads: RpcBatcher  # batches the reads of a refresh into one round trip
+    spender: ChecksumAddress  # Balance Manager, whose allowances are tracked
+    history: BalanceHistory  # applies and reverts transfers between refreshes
     task: Optional[asyncio.Task]
     is_running: bool
     markets: MarketState
+    refresh_cfg: BalanceRefreshConfig
+    stride: int  # current newHeads refresh stride in blocks
+    block_interval: float  # estimated seconds per block, 0 until two heads are seen
+    refreshing: bool  # a balances refresh is in flight
     _immediate_read_requested: asyncio.Event
 
-    def __init__(self, chain: Chain, w3: AsyncWeb3, markets: MarketState) -> None:
+    def __init__(
+        self,
+        chain: Chain,
+        rpc: RpcPool,
+        markets: MarketState,
+        refresh_cfg: Optional[BalanceRefreshConfig] = None,
+    ) -> None:
         assert isinstance(chain, Chain), "Chain must be an instance of Chain"
         assert isinstance(markets, MarketState), "Markets must be an instance of MarketState"
         log.debug("Initializing ERC20Service for %s", chain.name)
         assert chain.active, "Chain must be active to create ERC20Service"
         self.chain = chain
-        self.w3 = w3
+        self.rpc = rpc
+        self.reads = RpcBatcher(rpc, rpc.cfg.batch_size)
+        self.spender = Web3.to_checksum_address(LIQUORICE_BALANCE_MANAGER_ADDRESS)
         self.markets = markets
         self.is_running = False
         self.task: Optional[asyncio.Task] = None
+        self.refresh_cfg = refresh_cfg or BalanceRefreshConfig()
+        self.history = BalanceHistory(chain, self.refresh_cfg.history_blocks)
+        self.stride = self.refresh_cfg.blocks
+        self.block_interval = 0.0
+        self.refreshing = False
+        self._last_head: Optional[tuple] = None  # (block number, time.monotonic())
         self._immediate_read_requested = asyncio.Event()
 
     def request_immediate_read(self) -> None:
@@ -56,14 +124,80 @@ class ERC20Service:
         log.info("Immediate token balances update requested for %s", self.chain.name)
         self._immediate_read_requested.set()
 
+    def on_transfer(self, log_receipt: Mapping[str, Any]) -> None:
+        """Called by ChainService with the `Transfer` logs of the settlement keeper.
+
+        Applies the transfer to the balance right away and requests a read to confirm
+        it. Transfers removed by a reorg are reverted without a read: the balances read
+        then would be of the same blocks."""
+        token = self.markets.get_token(log_receipt["address"], self.chain.id)
+        if token is None:
+            self.request_immediate_read()
+            return
+        if self.history.on_transfer(token, log_receipt) and not log_receipt.get("removed"):
+            self.request_immediate_read()
+
+    def on_new_head(self, block_number: int) -> None:
+        """Called by ChainService on every `newHeads` notification.
+
+        Tracks the head and the block time, and requests a refresh once balances are
+        `stride` blocks behind unless one is already in flight (it is coalesced)."""
+        chain = self.chain
+        chain.head_block = max(chain.head_block, block_number)
+        now = time.monotonic()
+        if self._last_head is not None and block_number > self._last_head[0]:
+            interval = (now - self._last_head[1]) / (block_number - self._last_head[0])
+            self.block_interval = (
+                interval
+                if not self.block_interval
+                else BLOCK_INTERVAL_EMA_ALPHA * interval
+                + (1 - BLOCK_INTERVAL_EMA_ALPHA) * self.block_interval
+            )
+        self._last_head = (block_number, now)
+        metrics.balances_age_blocks.labels(chain=chain.name).set(
+            chain.head_block - chain.balances_block
+        )
+        if (
+            self.refresh_cfg.enabled
+            and not self.refreshing
+            and chain.balances_block
+            and chain.head_block - chain.balances_block >= self.stride
+        ):
+            log.debug("Head %d: refreshing %s balances", block_number, chain.name)
+            self._immediate_read_requested.set()
+
+    def adapt_stride(self, duration: float) -> None:
+        """Set the newHeads refresh stride so that refreshes taking `duration` seconds
+        keep the RPC busy for at most `max_busy` of the time."""
+        cfg = self.refresh_cfg
+        if not cfg.enabled:
+            return
+        stride = cfg.blocks
+        if self.block_interval > 0:
+            stride = max(stride, math.ceil(duration / (cfg.max_busy * self.block_interval)))
+        stride = min(stride, max(cfg.max_blocks, cfg.blocks))
+        if stride != self.stride:
+            log.info("Balances refresh stride of %s: %d blocks", self.chain.name, stride)
+            self.stride = stride
+        metrics.balances_refresh_stride.labels(chain=self.chain.name).set(stride)
+
     async def get_token_raw_balance(
         self, token_address: ChecksumAddress, account_address: ChecksumAddress
     ) -> int:
-        """Get token balance for a specific account."""
+        """Get token balance for a specific account (from the fastest RPC endpoint),
+        batched with the other reads of the same tick. The native token pseudo-address
+        reads the native balance (`eth_getBalance`).
+
+        Raises:
+            RpcUnavailable: if no endpoint could serve the read, a failed contract call
+                reads as 0
+        """
         try:
-            contract: AsyncContract = self.w3.eth.contract(address=token_address, abi=ERC20_ABI)
-            raw_balance = await contract.functions.balanceOf(account_address).call()
-            return int(raw_balance)
+            if is_native_token(token_address):
+                return await self.reads.native_balance(account_address)
+            return await self.reads.balance_of(token_address, account_address)
+        except RpcUnavailable:
+            raise
         except Exception as e:  # pylint: disable=broad-exception-caught
             log.error(
                 "Error getting balance for token %s, account %s: %s",
@@ -73,6 +207,77 @@ class ERC20Service:
             )
             return 0
 
+    async def get_token_raw_allowance(
+        self, token_address: ChecksumAddress, owner_address: ChecksumAddress
+    ) -> Optional[int]:
+        """Get the Balance Manager allowance of `owner_address` for a token, batched with
+        the balances. None for the native token (no allowance) and if the contract call
+        failed, the previous allowance is then kept.
+
+        Raises:
+            RpcUnavailable: if no endpoint could serve the read
+        """
+        if is_native_token(token_address):
+            return None
+        try:
+            return await self.reads.allowance(token_address, owner_address, self.spender)
+        except RpcUnavailable:
+            raise
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            log.error(
+                "Error getting allowance for token %s, owner %s: %s",
+                token_address,
+                owner_address,
+                e,
+            )
+            return None
+
+    def update_allowance_metrics(self, tokens: List[ERC20Token]) -> None:
+        """Export the allowance coverage of the balances of `tokens`."""
+        low = 0
+        for token in tokens:
+            if token.raw_allowance is None:
+                continue
+            low += token.raw_allowance < token.raw_balance
+            coverage = (
+                min(1.0, token.raw_allowance / token.raw_balance) if token.raw_balance else 1.0
+            )
+            metrics.token_allowance_coverage.labels(chain=self.chain.name, token=token.symbol).set(
+                coverage
+            )
+        metrics.tokens_allowance_low.labels(chain=self.chain.name).set(low)
+
+    def apply_refresh(
+        self,
+        block_number: int,
+        tokens: List[ERC20Token],
+        raw_balances: List[int],
+        raw_allowances: List[Optional[int]],
+    ) -> None:
+        """Update the market state with the balances and allowances read at `block_number`.
+
+        Called once all of them are read: a refresh aborted by RpcUnavailable keeps the
+        previous balances and their block."""
+        changed = 0
+        for token, raw_balance, raw_allowance in zip(tokens, raw_balances, raw_allowances):
+            log.debug("Token %s balance: %d", token.symbol, raw_balance)
+            previous = token.raw_balance
+            self.history.rebase(token, block_number, raw_balance)
+            changed += token.raw_balance != previous
+            if raw_allowance is not None:
+                token.raw_allowance = raw_allowance
+        self.update_allowance_metrics(tokens)
+        if self.chain.balances_restored:
+            log.info(
+                "Restored balances of %s reconciled: %d of %d changed",
+                self.chain.name,
+                changed,
+                len(tokens),
+            )
+            self.chain.balances_restored = False
+        self.chain.balances_block = block_number
+        self.chain.balances_updated_ts = time.time()
+
     async def run_loop(self) -> None:
         """Main loop to periodically read ERC-20 token balances and update market graph."""
         log.info("Starting ERC-20 balance update loop for %s", self.chain.name)
@@ -80,23 +285,30 @@ class ERC20Service:
         while self.is_running:
             try:
                 start_time = asyncio.get_event_loop().time()
-                block_number = await self.w3.eth.block_number
-                for token in self.markets.get_tokens_by_chain_id(self.chain.id):
-                    assert self.chain.skeeper_address
-                    raw_balance: int = await self.get_token_raw_balance(
-                        token.address, self.chain.skeeper_address
-                    )
-                    log.info(
-                        "Token %s balance for %s: %d",
-                        token.symbol,
-                        self.chain.skeeper_address,
-                        raw_balance,
-                    )
-                    # Update the market state with the new balance
-                    token.raw_balance = raw_balance
-                    token.last_updated_block = block_number
+                self.refreshing = True
+                tokens = list(self.markets.get_tokens_by_chain_id(self.chain.id))
+                assert self.chain.skeeper_address
+                skeeper = self.chain.skeeper_address
+                # issued in the same tick, the reads are sent as one batch
+                block_number, raw_balances, raw_allowances = await asyncio.gather(
+                    self.reads.block_number(),
+                    asyncio.gather(
+                        *(self.get_token_raw_balance(token.address, skeeper) for token in tokens)
+                    ),
+                    asyncio.gather(
+                        *(self.get_token_raw_allowance(token.address, skeeper) for token in tokens)
+                    ),
+                )
+                self.chain.head_block = max(self.chain.head_block, block_number)
+                self.apply_refresh(block_number, tokens, raw_balances, raw_allowances)
+                self.refreshing = False
+                log.info("Token balances of %s updated at block %d", self.chain.name, block_number)
                 update_duration = asyncio.get_event_loop().time() - start_time
                 log.debug("Balance update completed in %.2f seconds", update_duration)
+                metrics.balances_refresh_duration.labels(chain=self.chain.name).observe(
+                    update_duration
+                )
+                self.adapt_stride(update_duration)
                 sleep_time = max(ERC20_MIN_UPDATE_DELAY, ERC20_UPDATE_INTERVAL - update_duration)
 
                 # Wait for immediate update event or timeout for next periodic update
@@ -113,7 +325,16 @@ class ERC20Service:
                 log.info("Balance update loop cancelled for %s", self.chain.name)
                 self.is_running = False
                 break
+            except RpcUnavailable as e:
+                self.refreshing = False
+                log.warning(
+                    "Balances refresh of %s aborted, keeping previous balances: %s",
+                    self.chain.name,
+                    e,
+                )
+                await asyncio.sleep(ERC20_MIN_UPDATE_DELAY)
             except Exception as e:  # pylint: disable=broad-exception-caught
+                self.refreshing = False
                 log.error("Error in balance update loop for %s: %s", self.chain.name, e)
                 # Wait before retrying
                 await asyncio.sleep(ERC20_UPDATE_INTERVAL)
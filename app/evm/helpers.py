@@ -1,5 +1,6 @@
 """Helper functions for EVM-related operations."""
 
+import asyncio
 from uuid import UUID
 
 from eth_hash.auto import keccak
@@ -15,6 +16,15 @@ def encode_address(address: str) -> HexStr:
     return Web3.to_hex(Web3().codec.encode(["address"], [address]))
 
 
+async def cancel_and_wait(task: asyncio.Task) -> None:
+    """Cancel a background task and wait for it to finish."""
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
 def uuid_to_topic(rfq_id: UUID) -> HexBytes:
     """Convert a UUID to a keccak256 topic hash for event filtering.
 
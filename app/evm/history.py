@@ -0,0 +1,157 @@
+"""Reorg-aware token balances.
+
+`BalanceHistory` keeps the balances of the tokens of a chain consistent between
+balance reads with the `Transfer` logs of the settlement keeper:
+
+- a transfer log newer than the last balances read of its token is applied to
+  `ERC20Token.raw_balance` right away, older ones are already counted by the read;
+- a log notified again with `removed: true` (its block was reorged out) is reverted
+  from the balances if it was counted, without a balances read;
+- a balances read rebases the balances: the read value plus the transfers of the
+  blocks after it.
+
+Every change is also recorded in the block-indexed ring of the token
+(`ERC20Token.balance_history`, the last `blocks` blocks), from which the quoter
+reads the balance with N confirmations (`ERC20Token.raw_balance_confirmed()`)
+without any RPC call.
+"""
+
+from bisect import insort
+from collections import deque
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, Dict, List, Mapping, Tuple
+
+from hexbytes import HexBytes
+
+from app.metrics.metrics import metrics
+from app.schemas.chain import Chain
+from app.schemas.token import ERC20Token
+
+log = getLogger(__name__)
+
+BALANCE_HISTORY_BLOCKS = 128  # blocks of balance history kept per token, the max reorg depth
+
+
+@dataclass(slots=True)
+class Transfer:
+    """Transfer log counted in the balance of a token."""
+
+    token: ERC20Token
+    block: int
+    raw_delta: int  # signed change of the settlement keeper balance
+
+
+def log_key(log_receipt: Mapping[str, Any]) -> Tuple[bytes, int]:
+    """Identity of a log across its notifications: transaction hash and log index."""
+    return bytes(HexBytes(log_receipt["transactionHash"])), int(log_receipt["logIndex"])
+
+
+def transfer_delta(log_receipt: Mapping[str, Any], holder: str) -> int:
+    """Change of the `holder` balance by a `Transfer` log."""
+    topics = [bytes(HexBytes(topic)) for topic in log_receipt["topics"]]
+    holder_topic = bytes(HexBytes(holder)).rjust(32, b"\0")
+    data = bytes(HexBytes(log_receipt["data"]))
+    raw_amount = int.from_bytes(data, "big") if data else 0
+    return raw_amount * ((topics[2] == holder_topic) - (topics[1] == holder_topic))
+
+
+class BalanceHistory:
+    """Block-indexed token balances of a chain, see module docstring."""
+
+    chain: Chain
+    blocks: int
+    transfers: Dict[Tuple[bytes, int], Transfer]  # log key -> transfer counted
+
+    def __init__(self, chain: Chain, blocks: int = BALANCE_HISTORY_BLOCKS) -> None:
+        self.chain = chain
+        self.blocks = max(1, blocks)
+        self.transfers = {}
+
+    def on_transfer(self, token: ERC20Token, log_receipt: Mapping[str, Any]) -> bool:
+        """Apply a `Transfer` log of the settlement keeper to the token balance, or
+        revert it if it was removed by a reorg. Returns False for a log already handled
+        (e.g. notified to both subscriptions of a self-transfer) or not counted."""
+        assert self.chain.skeeper_address
+        key = log_key(log_receipt)
+        block = int(log_receipt["blockNumber"])
+        if log_receipt.get("removed"):
+            transfer = self.transfers.pop(key, None)
+            if transfer is None:
+                if block > token.last_updated_block:
+                    return False  # never counted
+                # counted by a read of the reorged blocks
+                transfer = Transfer(
+                    token, block, transfer_delta(log_receipt, self.chain.skeeper_address)
+                )
+            log.warning(
+                "Transfer of %s at block %d on %s removed by a reorg, reverting %d",
+                token.symbol,
+                block,
+                self.chain.name,
+                transfer.raw_delta,
+            )
+            metrics.transfers_reverted.labels(chain=self.chain.name).inc()
+            self.shift(token, block, -transfer.raw_delta, insert=False)
+            return True
+        if key in self.transfers:
+            return False
+        transfer = Transfer(token, block, transfer_delta(log_receipt, self.chain.skeeper_address))
+        self.transfers[key] = transfer
+        self.chain.head_block = max(self.chain.head_block, block)
+        if block > token.last_updated_block:
+            self.shift(token, block, transfer.raw_delta, insert=True)
+        self.prune(token)
+        return True
+
+    def shift(self, token: ERC20Token, block: int, raw_delta: int, insert: bool) -> None:
+        """Add `raw_delta` to the token balance and to its history from `block` on,
+        recording the balance at `block` if `insert`."""
+        token.raw_balance = max(0, token.raw_balance + raw_delta)
+        entries = [
+            (entry_block, max(0, raw_balance + raw_delta) if entry_block >= block else raw_balance)
+            for entry_block, raw_balance in token.balance_history
+        ]
+        if insert and all(entry_block != block for entry_block, _ in entries):
+            before = [raw_balance for entry_block, raw_balance in entries if entry_block < block]
+            insort(
+                entries, (block, max(0, before[-1] + raw_delta) if before else token.raw_balance)
+            )
+        token.balance_history = deque(entries)
+
+    def rebase(self, token: ERC20Token, block: int, raw_balance: int) -> None:
+        """Set the token balance read at `block`, keeping the transfers of later blocks."""
+        later: List[Transfer] = sorted(
+            (
+                transfer
+                for transfer in self.transfers.values()
+                if transfer.token is token and transfer.block > block
+            ),
+            key=lambda transfer: transfer.block,
+        )
+        entries = [entry for entry in token.balance_history if entry[0] < block]
+        entries.append((block, raw_balance))
+        for transfer in later:
+            raw_balance = max(0, raw_balance + transfer.raw_delta)
+            if entries[-1][0] == transfer.block:
+                entries[-1] = (transfer.block, raw_balance)
+            else:
+                entries.append((transfer.block, raw_balance))
+        token.balance_history = deque(entries)
+        token.raw_balance = raw_balance
+        token.last_updated_block = block
+        self.prune(token)
+
+    def prune(self, token: ERC20Token) -> None:
+        """Forget the token history older than `blocks` behind the head (keeping the
+        latest balance before it) and the transfers no reorg is expected to remove."""
+        oldest = self.chain.head_block - self.blocks
+        history = token.balance_history
+        while len(history) > 1 and history[1][0] <= oldest:
+            history.popleft()
+        if any(transfer.block <= oldest for transfer in self.transfers.values()):
+            self.transfers = {
+                key: transfer
+                for key, transfer in self.transfers.items()
+                if transfer.block > oldest
+            }
@@ -0,0 +1,416 @@
+"""Pool of RPC endpoints of a chain with latency based read routing and failover.
+
+Every endpoint keeps a persistent websocket connection which is probed with
+`eth_blockNumber` every `probe_interval` seconds. Reads go to the healthy endpoint
+with the lowest latency (EMA of probes and reads) and fail over to the next one on
+connection errors, timeouts and RPC errors. Subscriptions stay on the primary
+(first) endpoint; while it is down they move to the fastest healthy standby, whose
+connection is already open, and move back once the primary is healthy again.
+
+An endpoint is unhealthy after an error until its next successful probe, and while
+its head is more than `max_lag_blocks` behind the best head of the pool.
+
+By default reads share the endpoint connection with the subscriptions, so a burst
+of notifications delays reads and slow reads delay notifications. With
+`read_connections` > 0 every endpoint gets a dedicated subscription connection and
+that many read connections. Reads go to the least busy read connection and queue
+once all of them have `max_inflight` requests in flight; the timeout and the latency
+of a read start once it has a connection. The time reads wait for a connection and
+the time notifications wait to be handled are both measured.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+from web3 import AsyncWeb3
+from web3.exceptions import (
+    PersistentConnectionError,
+    ProviderConnectionError,
+    TimeExhausted,
+    Web3RPCError,
+)
+from web3.middleware import ExtraDataToPOAMiddleware
+from web3.providers.persistent import WebSocketProvider
+from websockets.exceptions import ConnectionClosed
+
+from app.evm.helpers import cancel_and_wait
+from app.metrics.metrics import metrics
+from app.schemas.chain import Chain
+
+log = getLogger(__name__)
+
+RPC_PROBE_INTERVAL = 5.0  # seconds between endpoint probes
+RPC_TIMEOUT = 10.0  # seconds before a read or a probe fails over
+RPC_MAX_LAG_BLOCKS = 5  # blocks an endpoint may trail the best head of the pool
+RPC_LATENCY_EMA_ALPHA = 0.2  # weight of the latest request in the latency estimate
+RPC_READ_CONNECTIONS = 0  # read connections per endpoint, 0 shares the subscription one
+RPC_MAX_INFLIGHT = 16  # requests in flight per read connection before reads queue
+RPC_BATCH_SIZE = 100  # max requests per JSON-RPC batch, providers reject larger ones
+RPC_MAX_PENDING_NOTIFICATIONS = 10_000  # receive times kept for the notification delay
+# Errors making a request fail over to the next endpoint, contract reverts do not
+RPC_ENDPOINT_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    ConnectionClosed,
+    PersistentConnectionError,
+    ProviderConnectionError,
+    TimeExhausted,
+    Web3RPCError,
+)
+
+T = TypeVar("T")
+
+
+class RpcUnavailable(Exception):
+    """No healthy endpoint could serve the request."""
+
+
+@dataclass(slots=True)
+class RpcPoolConfig:
+    """RPC endpoints pool settings."""
+
+    probe_interval: float = RPC_PROBE_INTERVAL
+    timeout: float = RPC_TIMEOUT
+    max_lag_blocks: int = RPC_MAX_LAG_BLOCKS
+    read_connections: int = RPC_READ_CONNECTIONS
+    max_inflight: int = RPC_MAX_INFLIGHT
+    batch_size: int = RPC_BATCH_SIZE
+
+    @classmethod
+    def from_env(cls) -> "RpcPoolConfig":
+        """Create from `RPC_PROBE_INTERVAL`, `RPC_TIMEOUT`, `RPC_MAX_LAG_BLOCKS`,
+        `RPC_READ_CONNECTIONS`, `RPC_MAX_INFLIGHT` and `RPC_BATCH_SIZE` env vars."""
+        return cls(
+            probe_interval=float(os.getenv("RPC_PROBE_INTERVAL", str(RPC_PROBE_INTERVAL))),
+            timeout=float(os.getenv("RPC_TIMEOUT", str(RPC_TIMEOUT))),
+            max_lag_blocks=int(os.getenv("RPC_MAX_LAG_BLOCKS", str(RPC_MAX_LAG_BLOCKS))),
+            read_connections=int(os.getenv("RPC_READ_CONNECTIONS", str(RPC_READ_CONNECTIONS))),
+            max_inflight=int(os.getenv("RPC_MAX_INFLIGHT", str(RPC_MAX_INFLIGHT))),
+            batch_size=int(os.getenv("RPC_BATCH_SIZE", str(RPC_BATCH_SIZE))),
+        )
+
+
+NotificationKey = Tuple[str, str, Optional[int]]
+
+
+def notification_key(subscription_id: str, result: Any) -> NotificationKey:
+    """Identity of a `logs` or `newHeads` notification, raw or formatted by web3:
+    subscription id, block hash and log index (None for heads)."""
+    block_hash = result.get("blockHash") or result.get("hash") or ""
+    block_hash = (
+        bytes(block_hash).hex() if isinstance(block_hash, bytes) else str(block_hash).lower()
+    )
+    log_index = result.get("logIndex")
+    if isinstance(log_index, str):
+        log_index = int(log_index, 16)
+    return subscription_id, block_hash.removeprefix("0x"), log_index
+
+
+class TimedWebSocketProvider(WebSocketProvider):
+    """WebSocketProvider recording when subscription notifications are received.
+
+    Receive times are keyed by `notification_key`, so notifications web3 drops or
+    that are never handled do not shift the delays of the others. The oldest ones
+    are forgotten beyond `RPC_MAX_PENDING_NOTIFICATIONS`."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.received: "OrderedDict[NotificationKey, float]" = OrderedDict()
+
+    async def _provider_specific_socket_reader(self) -> Any:
+        # only hook web3 offers on raw messages, before they are queued for handlers
+        response = await super()._provider_specific_socket_reader()
+        if isinstance(response, dict) and response.get("method") == "eth_subscription":
+            params: Dict[str, Any] = dict(response.get("params") or {})
+            result = params.get("result")
+            if isinstance(result, dict):
+                key = notification_key(str(params.get("subscription")), result)
+                self.received[key] = time.perf_counter()
+                if len(self.received) > RPC_MAX_PENDING_NOTIFICATIONS:
+                    self.received.popitem(last=False)
+        return response
+
+    def notification_delay(self, subscription_id: str, result: Any) -> Optional[float]:
+        """Seconds the notification waited since it was received, None if unknown."""
+        received = self.received.pop(notification_key(subscription_id, result), None)
+        return None if received is None else time.perf_counter() - received
+
+
+@dataclass(slots=True, eq=False)
+class RpcConnection:
+    """Read connection of an endpoint."""
+
+    w3: AsyncWeb3
+    inflight: int = 0
+
+
+@dataclass(slots=True)
+class RpcEndpoint:  # pylint: disable=too-many-instance-attributes
+    """RPC endpoint of a chain and its measured state."""
+
+    url: str
+    label: str  # metrics label, the URL host so that API keys in paths are not exported
+    w3: Optional[AsyncWeb3] = None  # subscription connection, None while disconnected
+    readers: List[RpcConnection] = field(default_factory=list)  # [w3] unless split
+    slots: Optional[asyncio.Semaphore] = None  # in-flight cap of the read connections if split
+    latency: float = 0.0  # seconds, EMA of successful requests, 0 until measured
+    head_block: int = 0
+    healthy: bool = False
+    errors: int = 0
+
+
+def endpoint_labels(urls: List[str]) -> List[str]:
+    """Metrics labels of endpoint URLs: host[:port], suffixed with `#i` if not unique."""
+    hosts = [urlparse(url).netloc.rsplit("@", 1)[-1] for url in urls]
+    return [host if hosts.count(host) == 1 else f"{host}#{i}" for i, host in enumerate(hosts)]
+
+
+class RpcPool:
+    """RPC endpoints of a chain, see module docstring."""
+
+    chain: Chain
+    cfg: RpcPoolConfig
+    endpoints: List[RpcEndpoint]
+    subscribed: Optional[RpcEndpoint]  # endpoint holding the subscriptions
+    failback: asyncio.Event  # set when subscriptions should move back to the primary
+
+    def __init__(self, chain: Chain, cfg: Optional[RpcPoolConfig] = None) -> None:
+        urls = chain.ws_rpc_urls or ([chain.ws_rpc_url] if chain.ws_rpc_url else [])
+        assert urls, f"Chain {chain.name} has no RPC endpoints"
+        self.chain = chain
+        self.cfg = cfg or RpcPoolConfig()
+        self.endpoints = [
+            RpcEndpoint(url=url, label=label) for url, label in zip(urls, endpoint_labels(urls))
+        ]
+        self.subscribed = None
+        self.failback = asyncio.Event()
+        self._changed = asyncio.Event()  # set whenever an endpoint becomes healthy
+        self._probe_task: Optional[asyncio.Task] = None
+
+    @property
+    def primary(self) -> RpcEndpoint:
+        """Preferred endpoint for subscriptions."""
+        return self.endpoints[0]
+
+    def ranked(self) -> List[RpcEndpoint]:
+        """Healthy connected endpoints, fastest first."""
+        return sorted(
+            (ep for ep in self.endpoints if ep.healthy and ep.w3 is not None),
+            key=lambda ep: ep.latency,
+        )
+
+    async def start(self) -> None:
+        """Connect all endpoints and start probing them."""
+        await asyncio.gather(*(self.probe(ep) for ep in self.endpoints))
+        self._probe_task = asyncio.create_task(self.probe_loop())
+
+    async def stop(self) -> None:
+        """Stop probing and close all connections."""
+        if self._probe_task is not None:
+            await cancel_and_wait(self._probe_task)
+            self._probe_task = None
+        await asyncio.gather(*(self.disconnect(ep) for ep in self.endpoints))
+
+    async def open_connection(
+        self, endpoint: RpcEndpoint, provider: WebSocketProvider
+    ) -> AsyncWeb3:
+        """Open a connection to the endpoint and check it serves the chain."""
+        w3 = AsyncWeb3(provider)
+        await w3.provider.connect()
+        try:
+            chain_id = await asyncio.wait_for(w3.eth.chain_id, self.cfg.timeout)
+            if chain_id != self.chain.id:
+                raise ValueError(f"{endpoint.label} serves chain {chain_id}")
+        except BaseException:
+            await w3.provider.disconnect()
+            raise
+        if self.chain.poa:
+            w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+        return w3
+
+    async def connect(self, endpoint: RpcEndpoint) -> None:
+        """Open the endpoint connections, the subscription one and the read ones if split."""
+        w3 = await self.open_connection(endpoint, TimedWebSocketProvider(endpoint.url))
+        readers = [w3]
+        if self.cfg.read_connections > 0:
+            opened = await asyncio.gather(
+                *(
+                    self.open_connection(endpoint, WebSocketProvider(endpoint.url))
+                    for _ in range(self.cfg.read_connections)
+                ),
+                return_exceptions=True,
+            )
+            readers = [conn for conn in opened if isinstance(conn, AsyncWeb3)]
+            if len(readers) < len(opened):
+                await asyncio.gather(*(conn.provider.disconnect() for conn in [w3, *readers]))
+                raise next(e for e in opened if isinstance(e, BaseException))
+        log.info(
+            "Connected to %s RPC endpoint %s (%d read connections)",
+            self.chain.name,
+            endpoint.label,
+            self.cfg.read_connections,
+        )
+        endpoint.w3 = w3
+        endpoint.readers = [RpcConnection(conn) for conn in readers]
+        if self.cfg.read_connections > 0:
+            endpoint.slots = asyncio.Semaphore(len(readers) * self.cfg.max_inflight)
+
+    async def disconnect(self, endpoint: RpcEndpoint) -> None:
+        """Close the endpoint connections, they are reopened by the next probe."""
+        connections = {id(conn.w3): conn.w3 for conn in endpoint.readers}
+        if endpoint.w3 is not None:
+            connections[id(endpoint.w3)] = endpoint.w3
+        endpoint.w3, endpoint.readers, endpoint.slots = None, [], None
+        endpoint.healthy = False
+        for w3 in connections.values():
+            try:
+                await w3.provider.disconnect()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                log.debug("Error closing %s connection: %s", endpoint.label, e)
+
+    async def call(self, endpoint: RpcEndpoint, op: Callable[[AsyncWeb3], Awaitable[T]]) -> T:
+        """Run `op` on the least busy read connection of the endpoint within `timeout`
+        and record its latency. With split connections it first waits for one with less
+        than `max_inflight` requests in flight, that wait is neither timed out nor part
+        of the latency."""
+        if not endpoint.readers:
+            raise ProviderConnectionError(f"{endpoint.label} is not connected")
+        if endpoint.slots is None:
+            return await self.timed_call(endpoint, endpoint.readers[0], op)
+        queued_at = time.perf_counter()
+        async with endpoint.slots:
+            metrics.rpc_read_queue.labels(chain=self.chain.name, endpoint=endpoint.label).observe(
+                time.perf_counter() - queued_at
+            )
+            conn = min(endpoint.readers, key=lambda c: c.inflight)
+            return await self.timed_call(endpoint, conn, op)
+
+    async def timed_call(
+        self, endpoint: RpcEndpoint, conn: RpcConnection, op: Callable[[AsyncWeb3], Awaitable[T]]
+    ) -> T:
+        """Run `op` on the connection within `timeout` and record its latency."""
+        conn.inflight += 1
+        try:
+            start = time.perf_counter()
+            result = await asyncio.wait_for(op(conn.w3), self.cfg.timeout)
+            self.record(endpoint, time.perf_counter() - start)
+            return result
+        finally:
+            conn.inflight -= 1
+
+    def record(self, endpoint: RpcEndpoint, duration: float) -> None:
+        """Account a successful request."""
+        endpoint.latency = (
+            duration
+            if not endpoint.latency
+            else RPC_LATENCY_EMA_ALPHA * duration + (1 - RPC_LATENCY_EMA_ALPHA) * endpoint.latency
+        )
+        labels = {"chain": self.chain.name, "endpoint": endpoint.label}
+        metrics.rpc_request_duration.labels(**labels).observe(duration)
+        metrics.rpc_endpoint_latency.labels(**labels).set(endpoint.latency)
+
+    def mark_failed(self, endpoint: RpcEndpoint, error: BaseException) -> None:
+        """Take the endpoint out of routing until its next successful probe."""
+        log.warning(
+            "RPC endpoint %s of %s failed: %s", endpoint.label, self.chain.name, repr(error)
+        )
+        endpoint.errors += 1
+        endpoint.healthy = False
+        labels = {"chain": self.chain.name, "endpoint": endpoint.label}
+        metrics.rpc_errors.labels(**labels).inc()
+        metrics.rpc_endpoint_healthy.labels(**labels).set(0)
+
+    async def probe(self, endpoint: RpcEndpoint) -> None:
+        """(Re)connect the endpoint if needed and measure its latency and head."""
+        try:
+            if endpoint.w3 is None:
+                await self.connect(endpoint)
+            endpoint.head_block = await self.call(endpoint, lambda w3: w3.eth.block_number)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.mark_failed(endpoint, e)
+            await self.disconnect(endpoint)
+            return
+        best_head = max(ep.head_block for ep in self.endpoints)
+        # known before the first balances refresh, restored balances age from it
+        self.chain.head_block = max(self.chain.head_block, best_head)
+        healthy = best_head - endpoint.head_block <= self.cfg.max_lag_blocks
+        if healthy and not endpoint.healthy:
+            log.info("RPC endpoint %s of %s is healthy", endpoint.label, self.chain.name)
+            self._changed.set()
+        elif not healthy and endpoint.healthy:
+            log.warning(
+                "RPC endpoint %s of %s lags %d blocks",
+                endpoint.label,
+                self.chain.name,
+                best_head - endpoint.head_block,
+            )
+        endpoint.healthy = healthy
+        metrics.rpc_endpoint_healthy.labels(chain=self.chain.name, endpoint=endpoint.label).set(
+            int(healthy)
+        )
+
+    async def probe_loop(self) -> None:
+        """Probe all endpoints every `probe_interval` seconds."""
+        while True:
+            await asyncio.sleep(self.cfg.probe_interval)
+            await asyncio.gather(*(self.probe(ep) for ep in self.endpoints))
+            if self.subscribed is not None and self.subscribed is not self.primary:
+                if self.primary.healthy:
+                    self.failback.set()
+
+    async def read(self, op: Callable[[AsyncWeb3], Awaitable[T]]) -> T:
+        """Run `op` on the fastest healthy endpoint, failing over to the next ones.
+
+        Raises:
+            RpcUnavailable: if no endpoint could serve it
+        """
+        last_error: Optional[BaseException] = None
+        for endpoint in self.ranked():
+            try:
+                return await self.call(endpoint, op)
+            except RPC_ENDPOINT_ERRORS as e:
+                self.mark_failed(endpoint, e)
+                last_error = e
+        raise RpcUnavailable(
+            f"No healthy RPC endpoint of {self.chain.name}, last error: {last_error!r}"
+        )
+
+    async def background(self, op: Callable[[AsyncWeb3], Awaitable[T]], timeout: float) -> T:
+        """Run a low priority `op` (e.g. a transaction trace) on the least busy read
+        connection of the fastest healthy endpoint within `timeout`. Unlike `read()` it
+        takes no read slot, does not fail over and neither records its latency nor takes
+        a failing endpoint out of routing, so slow or unsupported requests leave the
+        routing of reads alone.
+
+        Raises:
+            RpcUnavailable: if no endpoint is healthy
+        """
+        ranked = [ep for ep in self.ranked() if ep.readers]
+        if not ranked:
+            raise RpcUnavailable(f"No healthy RPC endpoint of {self.chain.name}")
+        conn = min(ranked[0].readers, key=lambda c: c.inflight)
+        conn.inflight += 1
+        try:
+            return await asyncio.wait_for(op(conn.w3), timeout)
+        finally:
+            conn.inflight -= 1
+
+    async def subscription_endpoint(self) -> RpcEndpoint:
+        """Wait for an endpoint to hold subscriptions: the primary if healthy,
+        otherwise the fastest healthy standby."""
+        while True:
+            endpoint: Optional[RpcEndpoint] = self.primary
+            if not self.primary.healthy or self.primary.w3 is None:
+                endpoint = next(iter(self.ranked()), None)
+            if endpoint is not None:
+                self.subscribed = endpoint
+                self.failback.clear()
+                return endpoint
+            self._changed.clear()
+            await self._changed.wait()
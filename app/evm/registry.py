@@ -87,29 +87,36 @@ class ChainRegistry:
             return False
 
     def from_env(self) -> None:
-        """Enrich a ChainRegistry with data from env variables, especially RPC nodes URLs."""
+        """Enrich a ChainRegistry with data from env variables, especially RPC nodes URLs.
+
+        `*_WS_URL` may list comma-separated endpoints, the first one is the primary."""
         assert (
             self.chains
         ), "ChainRegistry must be initialized with chains before calling from_env()"
         log.debug("Enriching ChainRegistry with environment variables")
         for chain in self.chains:
             chain.ws_rpc_url = ""  # Default to empty string
+            chain.ws_rpc_urls = []
             chain.skeeper_address = None
             for chain_short_name in chain.short_names:
                 ws_rpc_env_var = f"{chain_short_name.upper()}{CHAIN_WS_URL_ENV_POSTFIX}"
-                ws_rpc_url = os.getenv(ws_rpc_env_var)
-                if ws_rpc_url:
-                    if not self._is_valid_ws_url(ws_rpc_url):
-                        raise ValueError(
-                            f"Invalid WebSocket URL in {ws_rpc_env_var}: {ws_rpc_url}"
-                        )
+                ws_rpc_urls = [
+                    url.strip() for url in os.getenv(ws_rpc_env_var, "").split(",") if url.strip()
+                ]
+                if ws_rpc_urls:
+                    for ws_rpc_url in ws_rpc_urls:
+                        if not self._is_valid_ws_url(ws_rpc_url):
+                            raise ValueError(
+                                f"Invalid WebSocket URL in {ws_rpc_env_var}: {ws_rpc_url}"
+                            )
                     log.info(
-                        "Setting RPC URL for chain %s(%s): %s",
+                        "Setting RPC URLs for chain %s(%s): %s",
                         chain.short_names[0],
                         chain.id,
-                        ws_rpc_url,
+                        ", ".join(ws_rpc_urls),
                     )
-                    chain.ws_rpc_url = ws_rpc_url
+                    chain.ws_rpc_url = ws_rpc_urls[0]
+                    chain.ws_rpc_urls = ws_rpc_urls
 
                 skeeper_env_var = f"{chain_short_name.upper()}{SKEEPER_ENV_POSTFIX}"
                 skeeper_address = os.getenv(skeeper_env_var)
@@ -2,21 +2,27 @@
 
 import asyncio
 from logging import getLogger
-from typing import List, Optional
+from typing import List, Optional, cast
 
-from web3 import AsyncWeb3
-from web3.middleware import ExtraDataToPOAMiddleware
-from web3.providers.persistent import WebSocketProvider
+from hexbytes import HexBytes
+from web3.types import LogReceipt
 from web3.utils.subscriptions import (
+    EthSubscription,
     LogsSubscription,
     LogsSubscriptionContext,
+    NewHeadsSubscription,
+    NewHeadsSubscriptionContext,
 )
 
-from app.evm.const import ERC20_TRANSFER_TOPIC
-from app.evm.erc20_service import ERC20Service
-from app.evm.helpers import encode_address
+from app.evm.const import ERC20_TRANSFER_TOPIC, is_native_token
+from app.evm.erc20_service import BalanceRefreshConfig, ERC20Service
+from app.evm.helpers import cancel_and_wait, encode_address
+from app.evm.pool import RpcEndpoint, RpcPool, RpcPoolConfig, TimedWebSocketProvider
 from app.evm.registry import ChainRegistry
+from app.evm.settlement import SettlementTracker
+from app.evm.traces import Fill, TraceConfig, TraceWorker
 from app.markets.markets import MarketState
+from app.metrics.metrics import metrics
 
 from ..schemas.chain import Chain
 
@@ -28,10 +34,27 @@ class ChainServiceMgr:  # pylint: disable=too-few-public-methods
 
     services: List["ChainService"] = []
     markets: MarketState
+    refresh_cfg: BalanceRefreshConfig
+    rpc_cfg: RpcPoolConfig
+    settlements: Optional[SettlementTracker]
+    trace_cfg: TraceConfig
 
-    def __init__(self, chain_registry: ChainRegistry, markets: MarketState) -> None:
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        chain_registry: ChainRegistry,
+        markets: MarketState,
+        refresh_cfg: Optional[BalanceRefreshConfig] = None,
+        rpc_cfg: Optional[RpcPoolConfig] = None,
+        *,
+        settlements: Optional[SettlementTracker] = None,
+        trace_cfg: Optional[TraceConfig] = None,
+    ) -> None:
         self.chain_registry = chain_registry
         self.markets = markets
+        self.refresh_cfg = refresh_cfg or BalanceRefreshConfig()
+        self.rpc_cfg = rpc_cfg or RpcPoolConfig()
+        self.settlements = settlements
+        self.trace_cfg = trace_cfg or TraceConfig()
         self.services: List["ChainService"] = []
         for chain in self.chain_registry.chains:
             if chain.active:
@@ -62,7 +85,7 @@ class ChainServiceMgr:  # pylint: disable=too-few-public-methods
         log.info("All ChainServices have been stopped.")
 
 
-class ChainService:
+class ChainService:  # pylint: disable=too-many-instance-attributes
     """Service for managing blockchain event listeners and processing."""
 
     chain: Chain
@@ -72,6 +95,8 @@ class ChainService:
     conn_closed = asyncio.Event
     watchdog_task = Optional[asyncio.Task]
     erc20_service: Optional[ERC20Service]
+    pool: Optional[RpcPool]
+    traces: Optional[TraceWorker]  # traces settlement transactions, if enabled
 
     def __init__(self, mgr: ChainServiceMgr, chain: Chain):
         self.mgr = mgr
@@ -84,24 +109,74 @@ class ChainService:
         self.task: Optional[asyncio.Task] = None
         self.subscription_handler_task: Optional[asyncio.Task] = None
         self.erc20_service = None
+        self.pool = None
+        self.traces = None
 
     async def log_handler(
         self,
         handler_context: LogsSubscriptionContext,
     ) -> None:
-        """Handle logs from the subscription manager to catch potential balance changes."""
+        """Handle the token transfer logs of the settlement keeper to follow its balances."""
         assert self.chain is not None, "Chain must be set before handling logs"
         assert (
             self.erc20_service is not None
         ), "ERC20Service must be initialized before handling logs"
-        log_receipt = handler_context.result
+        self.observe_notification_delay(handler_context)
+        log_receipt = cast(LogReceipt, handler_context.result)
         log.debug("Log receipt: %s chain: %s", log_receipt, self.chain.name)
-        self.erc20_service.request_immediate_read()
+        self.erc20_service.on_transfer(log_receipt)
+
+    async def settlement_handler(self, handler_context: LogsSubscriptionContext) -> None:
+        """Handle settlement contract logs to match them with the quotes sent."""
+        assert self.mgr.settlements is not None, "Settlements must be tracked to handle them"
+        self.observe_notification_delay(handler_context)
+        log_receipt = cast(LogReceipt, handler_context.result)
+        quote = self.mgr.settlements.on_log(self.chain.id, log_receipt)
+        if quote is not None and self.traces is not None:
+            self.traces.submit("0x" + bytes(HexBytes(log_receipt["transactionHash"])).hex())
+
+    def on_fills(self, tx_hash: str, fills: List[Fill]) -> None:
+        """Account the settlement keeper fills of a traced settlement transaction."""
+        for fill in fills:
+            token = self.mgr.markets.get_token(fill.token, self.chain.id)
+            symbol = token.symbol if token is not None else fill.token
+            amount = (
+                token.raw_to_decimal(fill.raw_amount) if token is not None else fill.raw_amount
+            )
+            side = "in" if fill.recipient == self.chain.skeeper_address else "out"
+            log.info(
+                "Settlement %s on %s: %s %s %s", tx_hash, self.chain.name, side, amount, symbol
+            )
+            metrics.settlement_fills.labels(chain=self.chain.name, token=symbol, side=side).inc(
+                float(amount)
+            )
+
+    async def head_handler(self, handler_context: NewHeadsSubscriptionContext) -> None:
+        """Handle new block headers to drive balance refreshes."""
+        assert (
+            self.erc20_service is not None
+        ), "ERC20Service must be initialized before handling heads"
+        self.observe_notification_delay(handler_context)
+        self.erc20_service.on_new_head(handler_context.result["number"])
+
+    def observe_notification_delay(
+        self, handler_context: LogsSubscriptionContext | NewHeadsSubscriptionContext
+    ) -> None:
+        """Record how long the notification waited for its handler."""
+        provider = getattr(handler_context.async_w3, "provider", None)
+        if isinstance(provider, TimedWebSocketProvider):
+            delay = provider.notification_delay(
+                handler_context.subscription.id, handler_context.result
+            )
+            if delay is not None:
+                metrics.rpc_notification_queue.labels(chain=self.chain.name).observe(delay)
 
     def build_tokens_subscription_filter_with_handlers(self, chain) -> List[LogsSubscription]:
-        """Build a filter for ERC20 token transfers."""
+        """Build a filter for ERC20 token transfers (the native token has no logs)."""
         result = []
         for token in chain.tokens:
+            if is_native_token(token.address):
+                continue
             for address_to_monitor in [chain.skeeper_address]:
                 # monitor transfers TO the address of interest
                 result.append(
@@ -130,27 +205,105 @@ class ChainService:
         return result
 
     async def connect_web3_subscribe_and_process(self) -> None:
-        """Example of using a context manager for subscription."""
-        async with AsyncWeb3(WebSocketProvider(self.chain.ws_rpc_url)) as w3:
-            chain_id = await w3.eth.chain_id
-            assert self.chain == self.mgr.chain_registry.get_chain_by_id(chain_id)
-            log.info("Connected to chain ID: %s %s", chain_id, self.chain.name)
-            if self.chain.poa:
-                log.info("Using POA middleware for chain %s", self.chain.name)
-                w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-
-            await w3.subscription_manager.subscribe(
-                self.build_tokens_subscription_filter_with_handlers(self.chain)
-            )
-            self.subscription_handler_task = asyncio.create_task(
-                w3.subscription_manager.handle_subscriptions()
+        """Connect the chain RPC pool, read balances through it and keep the
+        subscriptions on the primary endpoint, failing over to a standby."""
+        self.pool = RpcPool(self.chain, self.mgr.rpc_cfg)
+        await self.pool.start()
+        self.erc20_service = ERC20Service(
+            self.chain, self.pool, self.mgr.markets, self.mgr.refresh_cfg
+        )
+        await self.erc20_service.start()
+        if self.mgr.trace_cfg.enabled and self.mgr.settlements is not None:
+            assert self.chain.skeeper_address
+            erc20_service = self.erc20_service
+            self.traces = TraceWorker(
+                self.pool,
+                self.chain.skeeper_address,
+                self.mgr.trace_cfg,
+                self.on_fills,
+                busy=lambda: erc20_service.refreshing,
             )
-            log.info("Web3 subscription manager started for %s", self.chain.name)
-            self.erc20_service = ERC20Service(self.chain, w3, self.mgr.markets)
-            await self.erc20_service.start()
-            await self.subscription_handler_task
-            log.info("Subscription ended, closing connection.")
+            await self.traces.start()
+        try:
+            subscribed: Optional[RpcEndpoint] = None
+            while True:
+                endpoint = await self.pool.subscription_endpoint()
+                if subscribed is not None:
+                    log.warning(
+                        "Moving %s subscriptions from %s to %s",
+                        self.chain.name,
+                        subscribed.label,
+                        endpoint.label,
+                    )
+                    metrics.rpc_subscription_failovers.labels(chain=self.chain.name).inc()
+                    # Transfers may have been missed while switching
+                    self.erc20_service.request_immediate_read()
+                subscribed = endpoint
+                try:
+                    await self.subscribe_and_process(endpoint)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    self.pool.mark_failed(endpoint, e)
+                    await self.pool.disconnect(endpoint)
+        finally:
+            log.info("Subscription ended, closing connections.")
+            if self.traces is not None:
+                await self.traces.stop()
             await self.erc20_service.stop()
+            await self.pool.stop()
+
+    async def subscribe_and_process(self, endpoint: RpcEndpoint) -> None:
+        """Subscribe on the endpoint connection and handle notifications until the
+        connection fails or the pool asks to move back to the primary endpoint."""
+        assert self.pool is not None and endpoint.w3 is not None
+        w3 = endpoint.w3
+        subscriptions: List[EthSubscription] = list(
+            self.build_tokens_subscription_filter_with_handlers(self.chain)
+        )
+        if self.mgr.refresh_cfg.enabled:
+            log.info(
+                "Refreshing %s balances every %d new blocks",
+                self.chain.name,
+                self.mgr.refresh_cfg.blocks,
+            )
+            subscriptions.append(NewHeadsSubscription(handler=self.head_handler))
+        if self.mgr.settlements is not None:
+            subscriptions.append(
+                LogsSubscription(
+                    address=self.chain.liquorice_settlement_address,
+                    handler=self.settlement_handler,
+                )
+            )
+        provider = getattr(w3, "provider", None)
+        if isinstance(provider, TimedWebSocketProvider):
+            provider.received.clear()
+        await w3.subscription_manager.subscribe(subscriptions)
+        current_task = asyncio.current_task()
+        if current_task is not None and current_task.cancelling():
+            # asyncio.wait_for (web3 requests) may lose a cancellation racing a response
+            raise asyncio.CancelledError
+        self.subscription_handler_task = asyncio.create_task(
+            w3.subscription_manager.handle_subscriptions()
+        )
+        log.info("Web3 subscription manager started for %s on %s", self.chain.name, endpoint.label)
+        failback = asyncio.create_task(self.pool.failback.wait())
+        try:
+            await asyncio.wait(
+                (self.subscription_handler_task, failback), return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            failback.cancel()
+            if not self.subscription_handler_task.done():
+                self.subscription_handler_task.cancel()
+        if failback.done() and not failback.cancelled():
+            log.info("Primary RPC endpoint of %s is back", self.chain.name)
+            try:
+                await w3.subscription_manager.unsubscribe_all()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                log.debug("Error unsubscribing from %s: %s", endpoint.label, e)
+        else:
+            # raises the error that ended it, if any
+            self.subscription_handler_task.result()
+            raise ConnectionError("Subscription handler ended")
 
     async def start(self) -> None:
         """Start all chain service workers."""
@@ -165,9 +318,5 @@ class ChainService:
         """Stop all chain service workers."""
         self.is_running = False
         assert self.task is not None, "Task must be set before stopping"
-        self.task.cancel()
-        try:
-            await self.task
-        except asyncio.CancelledError:
-            pass
+        await cancel_and_wait(self.task)
         self.task = None
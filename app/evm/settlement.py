@@ -0,0 +1,162 @@
+"""Settlement tracking of the quotes sent.
+
+`SettlementTracker` indexes the quotes sent on every chain by the topic of their RFQ
+id (`uuid_to_topic`, the indexed `rfqId` of Liquorice settlement events).
+`ChainService` subscribes to the logs of the chain settlement contract and hands them
+to `on_log()`: a log carrying the topic of an outstanding quote settles it with one
+dict lookup per topic, releases its balance reservation and records the quote to
+settlement latency. Logs are matched by topic only, whatever the event signature.
+
+Quotes not settled by their expiry (plus `SETTLEMENT_GRACE` seconds for the log to
+arrive) are evicted by `expire()`, as are the earliest expiring ones beyond
+`max_pending` per chain, so the index stays bounded. With `reserve` the quoted
+amount is reserved on the quote token (`ERC20Token.raw_reserved`) while the quote is
+outstanding, so it is not quoted again.
+"""
+
+import asyncio
+import heapq
+import os
+import time
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from uuid import UUID
+
+from hexbytes import HexBytes
+
+from app.evm.helpers import uuid_to_topic
+from app.metrics.metrics import metrics
+from app.protocols.liquorice.internal import Rfq
+from app.schemas.token import ERC20Token
+
+log = getLogger(__name__)
+
+SETTLEMENT_GRACE = 30.0  # seconds past the quote expiry a settlement log may arrive
+SETTLEMENT_MAX_PENDING = 100_000  # outstanding quotes indexed per chain
+SETTLEMENT_SWEEP_INTERVAL = 1.0  # seconds between expired quotes evictions
+
+
+@dataclass(slots=True)
+class SettlementConfig:
+    """Settlement tracking settings."""
+
+    reserve: bool = False
+    max_pending: int = SETTLEMENT_MAX_PENDING
+
+    @classmethod
+    def from_env(cls) -> "SettlementConfig":
+        """Create from `SETTLEMENT_RESERVE_QUOTES` (`true` reserves quoted amounts,
+        disabled by default) and `SETTLEMENT_MAX_PENDING` env vars."""
+        return cls(
+            reserve=os.getenv("SETTLEMENT_RESERVE_QUOTES", "false").lower() == "true",
+            max_pending=int(os.getenv("SETTLEMENT_MAX_PENDING", str(SETTLEMENT_MAX_PENDING))),
+        )
+
+
+@dataclass(slots=True)
+class PendingQuote:
+    """Quote sent and waiting for its settlement."""
+
+    rfq_id: str
+    labels: Tuple[int, str, str, str]  # rfqs_waiting chain_id, solver, base and quote token
+    quote_token: ERC20Token
+    raw_reserved: int
+    sent_ts: float  # time.time() the quote was sent
+    expiry: float  # unix time the quote expires
+
+
+def rfq_topic(rfq_id: str) -> bytes:
+    """Settlement event topic of an RFQ id."""
+    return bytes(uuid_to_topic(UUID(rfq_id)))
+
+
+class SettlementTracker:
+    """Matches settlement logs to the quotes sent, see module docstring."""
+
+    cfg: SettlementConfig
+    pending: Dict[int, Dict[bytes, PendingQuote]]  # chain id -> RFQ id topic -> quote
+    expiries: Dict[int, List[Tuple[float, bytes]]]  # chain id -> heap of (expiry, topic)
+
+    def __init__(self, cfg: Optional[SettlementConfig] = None) -> None:
+        self.cfg = cfg or SettlementConfig()
+        self.pending = {}
+        self.expiries = {}
+
+    def quote_sent(self, rfq: Rfq, quote_token: ERC20Token, raw_amount: int, expiry: int) -> None:
+        """Index a quote sent for `rfq`, reserving `raw_amount` of `quote_token`."""
+        pending = self.pending.setdefault(rfq.chain_id, {})
+        expiries = self.expiries.setdefault(rfq.chain_id, [])
+        topic = rfq_topic(rfq.rfq_id)
+        previous = pending.pop(topic, None)
+        if previous is not None:  # quoted again, the last quote wins
+            self.release(previous)
+        quote = PendingQuote(
+            rfq_id=rfq.rfq_id,
+            labels=(
+                rfq.chain_id,
+                metrics.solver_label(rfq.solver),
+                rfq.base_token,
+                rfq.quote_token,
+            ),
+            quote_token=quote_token,
+            raw_reserved=raw_amount if self.cfg.reserve else 0,
+            sent_ts=time.time(),
+            expiry=float(expiry),
+        )
+        pending[topic] = quote
+        heapq.heappush(expiries, (quote.expiry, topic))
+        quote_token.raw_reserved += quote.raw_reserved
+        metrics.rfqs_waiting.labels(*quote.labels).inc()
+        while len(pending) > self.cfg.max_pending:
+            self.evict(rfq.chain_id, *heapq.heappop(expiries))
+
+    def release(self, quote: PendingQuote) -> None:
+        """Release the reservation of a quote no longer outstanding."""
+        quote.quote_token.raw_reserved = max(
+            0, quote.quote_token.raw_reserved - quote.raw_reserved
+        )
+        metrics.rfqs_waiting.labels(*quote.labels).dec()
+
+    def on_log(self, chain_id: int, log_receipt: Mapping[str, Any]) -> Optional[PendingQuote]:
+        """Settle the outstanding quote whose RFQ id topic the log carries, if any."""
+        pending = self.pending.get(chain_id)
+        if not pending or log_receipt.get("removed"):
+            return None
+        for topic in log_receipt.get("topics", [])[1:]:
+            quote = pending.pop(bytes(HexBytes(topic)), None)
+            if quote is not None:
+                self.release(quote)
+                latency = time.time() - quote.sent_ts
+                metrics.settlement_latency.labels(chain_id=chain_id).observe(latency)
+                metrics.quotes_settled.labels(chain_id=chain_id).inc()
+                log.info("Quote for RFQ %s settled after %.1fs", quote.rfq_id, latency)
+                return quote
+        return None
+
+    def evict(self, chain_id: int, expiry: float, topic: bytes) -> Optional[PendingQuote]:
+        """Evict the quote of an entry popped from the expiry heap of a chain, None if
+        the entry is stale (the quote was settled or quoted again since)."""
+        pending = self.pending[chain_id]
+        quote = pending.get(topic)
+        if quote is None or quote.expiry != expiry:
+            return None
+        del pending[topic]
+        self.release(quote)
+        metrics.quotes_expired.labels(chain_id=chain_id).inc()
+        return quote
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Evict the quotes past their expiry and grace period, returns their number."""
+        deadline = (time.time() if now is None else now) - SETTLEMENT_GRACE
+        expired = 0
+        for chain_id, expiries in self.expiries.items():
+            while expiries and expiries[0][0] < deadline:
+                expired += self.evict(chain_id, *heapq.heappop(expiries)) is not None
+        return expired
+
+    async def run(self) -> None:
+        """Evict expired quotes every `SETTLEMENT_SWEEP_INTERVAL` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(SETTLEMENT_SWEEP_INTERVAL)
+            self.expire()
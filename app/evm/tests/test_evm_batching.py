@@ -0,0 +1,74 @@
+"""Tests for JSON-RPC batching of EVM reads against a fake node."""
+
+import asyncio
+
+import pytest
+from web3 import Web3
+
+from app.evm.batching import RpcBatcher, RpcCallError, hex_to_int
+from app.evm.pool import RpcPool, RpcPoolConfig, RpcUnavailable
+from app.sim.chain_bench import SIM_SKEEPER, synthetic_chain
+from app.sim.rpc import FakeRpcNode
+
+SIM_SPENDER = Web3.to_checksum_address("0x" + "5" * 40)
+
+
+@pytest.fixture
+async def node():
+    node = FakeRpcNode(31337, block_number=42)
+    await node.start()
+    yield node
+    await node.stop()
+
+
+@pytest.fixture
+async def pool(node):
+    pool = RpcPool(synthetic_chain(2, node.url), RpcPoolConfig(probe_interval=60))
+    await pool.start()
+    yield pool
+    await pool.stop()
+
+
+def test_hex_to_int():
+    assert hex_to_int("0x2a") == 42
+    assert hex_to_int("0x" + "00" * 31 + "07") == 7
+    for value in ("0x", None, 7):
+        with pytest.raises(ValueError):
+            hex_to_int(value)
+
+
+async def test_reads_of_a_tick_share_one_batch(node, pool):
+    tokens = pool.chain.tokens
+    node.set_balance(tokens[0].address, SIM_SKEEPER, 5)
+    node.set_allowance(tokens[0].address, SIM_SKEEPER, SIM_SPENDER, 3)
+    batcher = RpcBatcher(pool)
+    results = await asyncio.gather(
+        batcher.block_number(),
+        batcher.balance_of(tokens[0].address, SIM_SKEEPER),
+        batcher.balance_of(tokens[1].address, SIM_SKEEPER),
+        batcher.allowance(tokens[0].address, SIM_SKEEPER, SIM_SPENDER),
+        # the fake node reverts unknown calls, only that read fails
+        batcher.request("eth_call", [{"to": tokens[0].address, "data": "0x18160ddd"}, "latest"]),
+        return_exceptions=True,
+    )
+    assert results[:4] == [42, 5, 0, 3]
+    assert isinstance(results[4], RpcCallError)
+    assert node.calls["batch"] == 1
+    # reads of a later tick go in the next batch
+    assert await batcher.block_number() == 42
+    assert node.calls["batch"] == 1
+
+
+async def test_single_requests_without_batching(node, pool):
+    batcher = RpcBatcher(pool, max_batch=1)
+    assert await asyncio.gather(batcher.block_number(), batcher.block_number()) == [42, 42]
+    assert "batch" not in node.calls
+
+
+async def test_failed_batch_fails_its_reads(node, pool):
+    batcher = RpcBatcher(pool)
+    await pool.stop()
+    results = await asyncio.gather(
+        batcher.block_number(), batcher.block_number(), return_exceptions=True
+    )
+    assert all(isinstance(result, RpcUnavailable) for result in results)
@@ -0,0 +1,250 @@
+"""Tests for ERC20Service newHeads driven balance refreshes."""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from prometheus_client import REGISTRY
+from web3 import Web3
+
+from app.evm.const import LIQUORICE_BALANCE_MANAGER_ADDRESS, NATIVE_TOKEN_ADDRESS
+from app.evm.erc20_service import BalanceRefreshConfig, ERC20Service
+from app.evm.pool import RpcPool, RpcPoolConfig, RpcUnavailable
+from app.evm.registry import ChainRegistry
+from app.evm.service import ChainServiceMgr
+from app.markets.markets import MarketState
+from app.schemas.token import ERC20Token
+from app.sim.chain_bench import SIM_SKEEPER, synthetic_chain, wait_for
+from app.sim.rpc import FakeRpcNode
+
+
+@pytest.fixture
+def service() -> ERC20Service:
+    chain = synthetic_chain(1, "ws://127.0.0.1:1")
+    return ERC20Service(
+        chain, Mock(cfg=RpcPoolConfig()), MarketState(), BalanceRefreshConfig(blocks=2)
+    )
+
+
+def test_refresh_config_from_env(monkeypatch):
+    for name in (
+        "ERC20_REFRESH_BLOCKS",
+        "ERC20_REFRESH_MAX_BLOCKS",
+        "ERC20_REFRESH_MAX_BUSY",
+        "ERC20_HISTORY_BLOCKS",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    assert not BalanceRefreshConfig.from_env().enabled
+    monkeypatch.setenv("ERC20_REFRESH_BLOCKS", "3")
+    monkeypatch.setenv("ERC20_REFRESH_MAX_BLOCKS", "30")
+    monkeypatch.setenv("ERC20_REFRESH_MAX_BUSY", "0.25")
+    monkeypatch.setenv("ERC20_HISTORY_BLOCKS", "64")
+    cfg = BalanceRefreshConfig.from_env()
+    assert cfg == BalanceRefreshConfig(blocks=3, max_blocks=30, max_busy=0.25, history_blocks=64)
+    assert cfg.enabled
+
+
+def test_new_head_requests_refresh_every_stride(service):
+    requested = service._immediate_read_requested  # pylint: disable=protected-access
+    service.on_new_head(100)
+    assert service.chain.head_block == 100
+    assert not requested.is_set()  # balances were never read, the loop reads them anyway
+    service.chain.balances_block = 100
+    service.on_new_head(101)
+    assert not requested.is_set()
+    service.on_new_head(102)
+    assert requested.is_set()
+
+
+def test_new_head_coalesced_into_refresh_in_flight(service):
+    requested = service._immediate_read_requested  # pylint: disable=protected-access
+    service.chain.balances_block = 100
+    service.refreshing = True
+    service.on_new_head(110)
+    assert not requested.is_set()
+    service.refreshing = False
+    service.on_new_head(111)
+    assert requested.is_set()
+
+
+def test_new_head_disabled():
+    chain = synthetic_chain(1, "ws://127.0.0.1:1")
+    service = ERC20Service(chain, Mock(cfg=RpcPoolConfig()), MarketState())
+    chain.balances_block = 100
+    service.on_new_head(200)
+    assert chain.head_block == 200
+    assert not service._immediate_read_requested.is_set()  # pylint: disable=protected-access
+
+
+def test_adapt_stride(service):
+    service.adapt_stride(10.0)
+    assert service.stride == 2  # block time unknown yet
+    service.block_interval = 0.25
+    service.adapt_stride(0.1)
+    assert service.stride == 2
+    # 1s refreshes with 0.25s blocks keep the RPC half busy every 8 blocks
+    service.adapt_stride(1.0)
+    assert service.stride == 8
+    service.adapt_stride(1000.0)
+    assert service.stride == service.refresh_cfg.max_blocks
+
+
+def test_block_interval_estimate(service, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.evm.erc20_service.time.monotonic", lambda: now[0])
+    service.on_new_head(1)
+    assert service.block_interval == 0
+    now[0] += 2.0
+    service.on_new_head(3)
+    assert service.block_interval == pytest.approx(1.0)
+    now[0] += 2.0
+    service.on_new_head(4)
+    assert service.block_interval == pytest.approx(1.2)
+
+
+async def test_balances_refreshed_by_new_heads():
+    node = FakeRpcNode(31337, block_number=10)
+    url = await node.start()
+    chain = synthetic_chain(2, url)
+    registry = ChainRegistry()
+    registry.chains.append(chain)
+    registry.chain_by_id[chain.id] = chain
+    markets = MarketState()
+    markets.graph.add_edge(chain.tokens[0], chain.tokens[1], weight=1.0)
+    token = chain.tokens[0]
+    node.set_balance(token.address, SIM_SKEEPER, 1)
+    cs_mgr = ChainServiceMgr(registry, markets, BalanceRefreshConfig(blocks=2))
+    try:
+        await cs_mgr.run()
+        await wait_for(lambda: token.raw_balance == 1, timeout=5)
+        await wait_for(lambda: "newHeads" in {s.kind for s in node.subscriptions.values()}, 5)
+        # no Transfer log, only new heads reveal the change
+        node.set_balance(token.address, SIM_SKEEPER, 2)
+        await node.mine(1)
+        await asyncio.sleep(0.1)
+        assert token.raw_balance == 1
+        await node.mine(1)
+        await wait_for(lambda: token.raw_balance == 2, timeout=5)
+        assert token.last_updated_block == 12
+    finally:
+        await cs_mgr.shutdown()
+        await node.stop()
+
+
+async def test_refresh_aborted_when_rpc_unavailable():
+    chain = synthetic_chain(3, "ws://127.0.0.1:1")
+    markets = MarketState()
+    markets.graph.add_edge(chain.tokens[0], chain.tokens[1], weight=1.0)
+    markets.graph.add_edge(chain.tokens[1], chain.tokens[2], weight=1.0)
+    for token in chain.tokens:
+        token.raw_balance, token.last_updated_block = 5, 10
+    chain.balances_block = 10
+    service = ERC20Service(chain, Mock(cfg=RpcPoolConfig()), markets)
+    service.reads = Mock()
+    service.reads.block_number = AsyncMock(return_value=11)
+    # the first balance is read, the endpoint fails for the others
+    service.reads.balance_of = AsyncMock(
+        side_effect=[7, RpcUnavailable("no endpoint"), RpcUnavailable("no endpoint")]
+    )
+    await service.start()
+    try:
+        await wait_for(lambda: service.reads.balance_of.await_count >= 3, timeout=5)
+        await asyncio.sleep(0.01)
+    finally:
+        await service.stop()
+    # the refresh is not applied partially and balances are not zeroed
+    assert [token.raw_balance for token in chain.tokens] == [5, 5, 5]
+    assert {token.last_updated_block for token in chain.tokens} == {10}
+    assert chain.balances_block == 10
+    assert not service.refreshing
+
+
+async def test_refresh_reads_sent_as_one_batch():
+    node = FakeRpcNode(31337, block_number=10)
+    url = await node.start()
+    chain = synthetic_chain(20, url)
+    chain.name = "Batched"
+    markets = MarketState()
+    for base, quote in zip(chain.tokens, chain.tokens[1:]):
+        markets.graph.add_edge(base, quote, weight=1.0)
+    for i, token in enumerate(chain.tokens):
+        node.set_balance(token.address, SIM_SKEEPER, i)
+    chain.balances_restored = True  # from a checkpoint, reconciled by the refresh
+    pool = RpcPool(chain, RpcPoolConfig(probe_interval=60, batch_size=8))
+    await pool.start()
+    service = ERC20Service(chain, pool, markets)
+    saved = REGISTRY.get_sample_value("rpc_round_trips_saved_total", {"chain": "Batched"}) or 0
+    try:
+        await service.start()
+        await wait_for(lambda: chain.balances_block == 10, timeout=5)
+    finally:
+        await service.stop()
+        await pool.stop()
+        await node.stop()
+    assert [token.raw_balance for token in chain.tokens] == list(range(20))
+    assert not chain.balances_restored
+    # block number, 20 balances and 20 allowances: 5 batches of 8 and a single request
+    assert node.calls["batch"] == 5
+    assert node.calls["eth_call"] == 40
+    saved_now = REGISTRY.get_sample_value("rpc_round_trips_saved_total", {"chain": "Batched"})
+    assert saved_now == saved + 35
+
+
+async def test_native_token_balance_read_with_get_balance():
+    node = FakeRpcNode(31337, block_number=10)
+    url = await node.start()
+    chain = synthetic_chain(1, url)
+    native = ERC20Token(
+        name="Native",
+        symbol="ETH",
+        chain=chain,
+        address=Web3.to_checksum_address(NATIVE_TOKEN_ADDRESS),
+    )
+    chain.tokens.append(native)
+    markets = MarketState()
+    markets.graph.add_edge(chain.tokens[0], native, weight=1.0)
+    node.set_balance(chain.tokens[0].address, SIM_SKEEPER, 3)
+    node.set_balance(NATIVE_TOKEN_ADDRESS, SIM_SKEEPER, 5 * 10**18)
+    pool = RpcPool(chain, RpcPoolConfig(probe_interval=60))
+    await pool.start()
+    service = ERC20Service(chain, pool, markets)
+    try:
+        await service.start()
+        await wait_for(lambda: chain.balances_block == 10, timeout=5)
+    finally:
+        await service.stop()
+        await pool.stop()
+        await node.stop()
+    assert (chain.tokens[0].raw_balance, native.raw_balance) == (3, 5 * 10**18)
+    assert native.raw_allowance is None  # no allowance on the native token
+    # in the same batch, no failing balanceOf or allowance on the pseudo-address
+    assert (node.calls["batch"], node.calls["eth_call"], node.calls["eth_getBalance"]) == (1, 2, 1)
+
+
+async def test_allowances_read_with_balances():
+    node = FakeRpcNode(31337, block_number=10)
+    url = await node.start()
+    chain = synthetic_chain(2, url)
+    chain.name = "Allowances"
+    markets = MarketState()
+    markets.graph.add_edge(chain.tokens[0], chain.tokens[1], weight=1.0)
+    spender = LIQUORICE_BALANCE_MANAGER_ADDRESS
+    for token in chain.tokens:
+        node.set_balance(token.address, SIM_SKEEPER, 100)
+    node.set_allowance(chain.tokens[0].address, SIM_SKEEPER, spender, 40)
+    pool = RpcPool(chain, RpcPoolConfig(probe_interval=60))
+    await pool.start()
+    service = ERC20Service(chain, pool, markets)
+    try:
+        await service.start()
+        await wait_for(lambda: chain.balances_block == 10, timeout=5)
+    finally:
+        await service.stop()
+        await pool.stop()
+        await node.stop()
+    assert [token.raw_available for token in chain.tokens] == [40, 100]
+    assert chain.tokens[1].raw_allowance == 2**256 - 1
+    assert node.calls["batch"] == 1
+    labels = {"chain": "Allowances", "token": chain.tokens[0].symbol}
+    assert REGISTRY.get_sample_value("token_allowance_coverage_ratio", labels) == 0.4
+    assert REGISTRY.get_sample_value("tokens_allowance_low", {"chain": "Allowances"}) == 1
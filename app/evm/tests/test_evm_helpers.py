@@ -1,10 +1,11 @@
+import asyncio
 from uuid import UUID
 
 import pytest
 from eth_typing import ChecksumAddress, HexStr
 from hexbytes import HexBytes
 
-from app.evm.helpers import encode_address, uuid_to_topic
+from app.evm.helpers import cancel_and_wait, encode_address, uuid_to_topic
 
 
 @pytest.mark.parametrize(
@@ -55,3 +56,11 @@ def test_uuid_to_topic():
     assert event_rfq_id == HexBytes(
         "0x5205ecfc2e68786dcf34fffa27fb32e55f3c1c740959eb95c8b37ad61504a5c8"
     )
+
+
+async def test_cancel_and_wait() -> None:
+    """The task is cancelled and finished when the helper returns."""
+    task = asyncio.create_task(asyncio.sleep(60))
+    await asyncio.sleep(0)
+    await cancel_and_wait(task)
+    assert task.cancelled()
@@ -0,0 +1,146 @@
+"""Tests for reorg-aware token balances."""
+
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.evm.erc20_service import BalanceRefreshConfig
+from app.evm.history import BalanceHistory, transfer_delta
+from app.evm.registry import ChainRegistry
+from app.evm.service import ChainServiceMgr
+from app.markets.markets import MarketState
+from app.sim.chain_bench import SIM_SKEEPER, synthetic_chain, wait_for
+from app.sim.rpc import TRANSFER_TOPIC, FakeRpcNode, topic_address
+
+OTHER = "0x" + "22" * 20
+
+
+def transfer_log(
+    token, block: int, amount: int, incoming: bool = True, index: int = 0, removed: bool = False
+) -> dict:
+    sender, recipient = (OTHER, SIM_SKEEPER) if incoming else (SIM_SKEEPER, OTHER)
+    return {
+        "address": token.address,
+        "topics": [TRANSFER_TOPIC, topic_address(sender), topic_address(recipient)],
+        "data": "0x" + amount.to_bytes(32, "big").hex(),
+        "blockNumber": block,
+        "transactionHash": "0x" + block.to_bytes(32, "big").hex(),
+        "logIndex": index,
+        "removed": removed,
+    }
+
+
+@pytest.fixture
+def history() -> BalanceHistory:
+    chain = synthetic_chain(1, "ws://127.0.0.1:1")
+    chain.head_block = 100
+    history = BalanceHistory(chain, blocks=10)
+    history.rebase(chain.tokens[0], 100, 1000)
+    return history
+
+
+def test_transfer_delta():
+    token = synthetic_chain(1, "ws://127.0.0.1:1").tokens[0]
+    assert transfer_delta(transfer_log(token, 1, 5), SIM_SKEEPER) == 5
+    assert transfer_delta(transfer_log(token, 1, 5, incoming=False), SIM_SKEEPER) == -5
+
+
+def test_transfers_applied_once(history):
+    token = history.chain.tokens[0]
+    assert history.on_transfer(token, transfer_log(token, 101, 50))
+    assert not history.on_transfer(token, transfer_log(token, 101, 50))  # notified twice
+    assert history.on_transfer(token, transfer_log(token, 102, 20, incoming=False))
+    assert token.raw_balance == 1030
+    assert list(token.balance_history) == [(100, 1000), (101, 1050), (102, 1030)]
+    # counted by the read of block 100 already
+    assert history.on_transfer(token, transfer_log(token, 99, 7))
+    assert token.raw_balance == 1030
+
+
+def test_removed_transfers_reverted(history):
+    token = history.chain.tokens[0]
+    reverted = REGISTRY.get_sample_value("transfers_reverted_total", {"chain": "Simulated"}) or 0
+    history.on_transfer(token, transfer_log(token, 101, 50))
+    history.on_transfer(token, transfer_log(token, 102, 20))
+    assert history.on_transfer(token, transfer_log(token, 101, 50, removed=True))
+    assert token.raw_balance == 1020
+    assert list(token.balance_history) == [(100, 1000), (101, 1000), (102, 1020)]
+    # removed before it was ever seen
+    assert not history.on_transfer(token, transfer_log(token, 103, 5, removed=True))
+    # counted only by the read of the reorged block 100
+    assert history.on_transfer(token, transfer_log(token, 100, 10, removed=True))
+    assert token.raw_balance == 1010
+    assert list(token.balance_history) == [(100, 990), (101, 990), (102, 1010)]
+    assert (
+        REGISTRY.get_sample_value("transfers_reverted_total", {"chain": "Simulated"})
+        == reverted + 2
+    )
+
+
+def test_read_rebases_later_transfers(history):
+    token = history.chain.tokens[0]
+    history.on_transfer(token, transfer_log(token, 101, 50))
+    history.on_transfer(token, transfer_log(token, 103, 20))
+    # a read of block 102 counts the first transfer, not the second
+    history.rebase(token, 102, 1060)
+    assert (token.raw_balance, token.last_updated_block) == (1080, 102)
+    assert list(token.balance_history) == [(100, 1000), (101, 1050), (102, 1060), (103, 1080)]
+
+
+def test_confirmed_balance(history):
+    token = history.chain.tokens[0]
+    history.on_transfer(token, transfer_log(token, 101, 50))
+    history.on_transfer(token, transfer_log(token, 102, 20, incoming=False))
+    assert token.raw_balance_confirmed(0) == 1030
+    # head 102: the incoming transfer of block 101 has 1 confirmation only
+    assert token.raw_balance_confirmed(2) == 1000
+    assert token.raw_balance_confirmed(1) == 1030  # outgoing transfers count right away
+    history.chain.head_block = 103
+    assert token.raw_balance_confirmed(2) == 1030
+    assert token.raw_balance_confirmed(50) == 1000  # the oldest balance known
+    token.raw_reserved, token.raw_allowance = 5, 1010
+    assert (token.raw_available_confirmed(0), token.raw_available_confirmed(5)) == (1005, 995)
+
+
+def test_history_pruned(history):
+    token = history.chain.tokens[0]
+    for block in range(101, 131):
+        history.on_transfer(token, transfer_log(token, block, 1))
+    assert history.chain.head_block == 130
+    # the last balance before the 10 blocks kept is the base of the oldest view
+    assert [block for block, _ in token.balance_history] == list(range(120, 131))
+    assert sorted(transfer.block for transfer in history.transfers.values()) == list(
+        range(121, 131)
+    )
+
+
+async def test_reorged_transfer_reverted_without_read():
+    node = FakeRpcNode(31337, block_number=10)
+    url = await node.start()
+    chain = synthetic_chain(2, url)
+    registry = ChainRegistry()
+    registry.chains.append(chain)
+    registry.chain_by_id[chain.id] = chain
+    markets = MarketState()
+    markets.graph.add_edge(chain.tokens[0], chain.tokens[1], weight=1.0)
+    token = chain.tokens[0]
+    node.set_balance(token.address, SIM_SKEEPER, 100)
+    cs_mgr = ChainServiceMgr(registry, markets, BalanceRefreshConfig())
+    try:
+        await cs_mgr.run()
+        await wait_for(lambda: token.raw_balance == 100, timeout=5)
+        await wait_for(lambda: len(node.subscriptions) == 4, timeout=5)
+        await node.mine(1)
+        assert await node.transfer(token.address, OTHER, SIM_SKEEPER, 50) == 1
+        # applied right away, then confirmed by a read
+        await wait_for(lambda: token.last_updated_block == 11, timeout=5)
+        assert token.raw_balance == 150
+        reads = node.calls["eth_blockNumber"]
+        assert await node.reorg(10) == 1
+        await wait_for(lambda: token.raw_balance == 100, timeout=5)
+        await asyncio.sleep(0.1)
+        assert node.calls["eth_blockNumber"] == reads
+    finally:
+        await cs_mgr.shutdown()
+        await node.stop()
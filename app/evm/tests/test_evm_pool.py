@@ -0,0 +1,245 @@
+"""Tests for the RPC endpoints pool against fake JSON-RPC nodes."""
+
+import asyncio
+import time
+
+import pytest
+from hexbytes import HexBytes
+from prometheus_client import REGISTRY
+
+from app.evm.erc20_service import BalanceRefreshConfig
+from app.evm.pool import (
+    RpcPool,
+    RpcPoolConfig,
+    RpcUnavailable,
+    TimedWebSocketProvider,
+    endpoint_labels,
+    notification_key,
+)
+from app.evm.registry import ChainRegistry
+from app.evm.service import ChainServiceMgr
+from app.markets.markets import MarketState
+from app.sim.chain_bench import SIM_CHAIN_ID, SIM_SKEEPER, synthetic_chain, wait_for
+from app.sim.rpc import FakeRpcNode
+
+FAST_PROBES = RpcPoolConfig(probe_interval=0.05, timeout=1.0, max_lag_blocks=5)
+
+
+@pytest.fixture
+async def nodes():
+    nodes = [
+        FakeRpcNode(SIM_CHAIN_ID, block_number=100, latency=0.03),
+        FakeRpcNode(SIM_CHAIN_ID, block_number=100),
+    ]
+    for node in nodes:
+        await node.start()
+    yield nodes
+    for node in nodes:
+        await node.stop()
+
+
+def rpc_errors(chain: str, endpoint: str) -> float:
+    return (
+        REGISTRY.get_sample_value("rpc_errors_total", {"chain": chain, "endpoint": endpoint})
+        or 0.0
+    )
+
+
+def test_endpoint_labels():
+    assert endpoint_labels(["wss://a.io/v3/key", "wss://user:pw@b.io:8546"]) == [
+        "a.io",
+        "b.io:8546",
+    ]
+    assert endpoint_labels(["wss://a.io/1", "wss://a.io/2"]) == ["a.io#0", "a.io#1"]
+
+
+async def test_reads_routed_to_fastest_endpoint(nodes):
+    chain = synthetic_chain(1, nodes[0].url)
+    chain.ws_rpc_urls = [node.url for node in nodes]
+    pool = RpcPool(chain, FAST_PROBES)
+    await pool.start()
+    try:
+        assert [ep.healthy for ep in pool.endpoints] == [True, True]
+        assert pool.ranked()[0] is pool.endpoints[1]
+        calls = nodes[0].calls.get("eth_blockNumber", 0)
+        for _ in range(5):
+            assert await pool.read(lambda w3: w3.eth.block_number) == 100
+        assert nodes[0].calls.get("eth_blockNumber", 0) - calls <= 1  # at most a probe
+    finally:
+        await pool.stop()
+
+
+async def test_read_fails_over_and_endpoint_recovers(nodes):
+    chain = synthetic_chain(1, nodes[0].url)
+    chain.ws_rpc_urls = [node.url for node in nodes]
+    pool = RpcPool(chain, FAST_PROBES)
+    await pool.start()
+    try:
+        fast = pool.endpoints[1]
+        errors = rpc_errors(chain.name, fast.label)
+        await nodes[1].drop_connections()
+        assert await pool.read(lambda w3: w3.eth.block_number) == 100
+        assert not fast.healthy
+        assert rpc_errors(chain.name, fast.label) > errors
+        await wait_for(lambda: fast.healthy, timeout=5)  # reconnected by the probes
+        await nodes[0].stop()
+        await nodes[1].stop()
+        with pytest.raises(RpcUnavailable):
+            await pool.read(lambda w3: w3.eth.block_number)
+    finally:
+        await pool.stop()
+
+
+async def test_lagging_endpoint_unhealthy(nodes):
+    nodes[1].block_number = 90
+    chain = synthetic_chain(1, nodes[0].url)
+    chain.ws_rpc_urls = [node.url for node in nodes]
+    pool = RpcPool(chain, FAST_PROBES)
+    await pool.start()
+    try:
+        await wait_for(lambda: not pool.endpoints[1].healthy, timeout=5)
+        assert pool.ranked() == [pool.endpoints[0]]
+        await nodes[1].mine(8)
+        await wait_for(lambda: pool.endpoints[1].healthy, timeout=5)
+    finally:
+        await pool.stop()
+
+
+async def test_wrong_chain_endpoint_unhealthy(nodes):
+    other = FakeRpcNode(1, block_number=100)
+    await other.start()
+    chain = synthetic_chain(1, nodes[1].url)
+    chain.ws_rpc_urls = [nodes[1].url, other.url]
+    pool = RpcPool(chain, FAST_PROBES)
+    await pool.start()
+    try:
+        assert pool.endpoints[1].w3 is None
+        assert pool.ranked() == [pool.endpoints[0]]
+    finally:
+        await pool.stop()
+        await other.stop()
+
+
+async def test_subscriptions_fail_over_to_standby_and_back(nodes):
+    primary, standby = nodes
+    chain = synthetic_chain(2, primary.url)
+    chain.ws_rpc_urls = [primary.url, standby.url]
+    registry = ChainRegistry()
+    registry.chains.append(chain)
+    registry.chain_by_id[chain.id] = chain
+    markets = MarketState()
+    markets.graph.add_edge(chain.tokens[0], chain.tokens[1], weight=1.0)
+    token = chain.tokens[0]
+    cs_mgr = ChainServiceMgr(registry, markets, BalanceRefreshConfig(), FAST_PROBES)
+    try:
+        await cs_mgr.run()
+        await wait_for(lambda: len(primary.subscriptions) == 4, timeout=5)
+        assert not standby.subscriptions
+        port = int(primary.url.rsplit(":", 1)[1])
+        await primary.stop()
+        await wait_for(lambda: len(standby.subscriptions) == 4, timeout=5)
+        # Transfers are delivered by the standby
+        await standby.transfer(token.address, chain.liquorice_settlement_address, SIM_SKEEPER, 7)
+        await wait_for(lambda: token.raw_balance == 7, timeout=5)
+        # and the subscriptions move back once the primary is reachable again
+        await primary.start(port=port)
+        await wait_for(lambda: len(primary.subscriptions) == 4, timeout=5)
+        await wait_for(lambda: not standby.subscriptions, timeout=5)
+    finally:
+        await cs_mgr.shutdown()
+
+
+def histogram_count(name: str, labels: dict) -> float:
+    return REGISTRY.get_sample_value(f"{name}_count", labels) or 0.0
+
+
+def test_pool_config_from_env(monkeypatch):
+    monkeypatch.delenv("RPC_READ_CONNECTIONS", raising=False)
+    monkeypatch.delenv("RPC_MAX_INFLIGHT", raising=False)
+    assert RpcPoolConfig.from_env().read_connections == 0
+    monkeypatch.setenv("RPC_READ_CONNECTIONS", "3")
+    monkeypatch.setenv("RPC_MAX_INFLIGHT", "4")
+    cfg = RpcPoolConfig.from_env()
+    assert (cfg.read_connections, cfg.max_inflight) == (3, 4)
+
+
+async def test_shared_connection_by_default(nodes):
+    chain = synthetic_chain(1, nodes[1].url)
+    pool = RpcPool(chain, FAST_PROBES)
+    await pool.start()
+    try:
+        endpoint = pool.endpoints[0]
+        assert len(nodes[1].connections) == 1
+        assert [conn.w3 for conn in endpoint.readers] == [endpoint.w3]
+        assert endpoint.slots is None  # reads on the shared connection are not capped
+    finally:
+        await pool.stop()
+    await wait_for(lambda: not nodes[1].connections, timeout=5)
+
+
+async def test_reads_spread_over_read_connections(nodes):
+    node = nodes[0]  # 30ms latency
+    chain = synthetic_chain(1, node.url)
+    chain.name = "ReadSplit"
+    cfg = RpcPoolConfig(probe_interval=60, timeout=0.2, read_connections=2, max_inflight=1)
+    pool = RpcPool(chain, cfg)
+    await pool.start()
+    try:
+        endpoint = pool.endpoints[0]
+        assert len(node.connections) == 3
+        assert endpoint.w3 not in [conn.w3 for conn in endpoint.readers]
+        labels = {"chain": "ReadSplit", "endpoint": endpoint.label}
+        queued = histogram_count("rpc_read_queue_seconds", labels)
+        # two reads run at once, the others wait longer than the timeout for a connection
+        results = await asyncio.gather(
+            *(pool.read(lambda w3: w3.eth.block_number) for _ in range(16))
+        )
+        assert results == [100] * 16
+        assert endpoint.healthy and endpoint.errors == 0
+        assert endpoint.latency < 0.2
+        assert histogram_count("rpc_read_queue_seconds", labels) - queued == 16
+        assert all(conn.inflight == 0 for conn in endpoint.readers)
+    finally:
+        await pool.stop()
+    await wait_for(lambda: not node.connections, timeout=5)
+
+
+def test_notification_delay_keyed_by_notification():
+    provider = TimedWebSocketProvider("ws://127.0.0.1:1")
+    block_hash = "0x" + "ab" * 32
+    raw_logs = [{"blockHash": block_hash, "logIndex": hex(i)} for i in range(3)]
+    for raw in raw_logs:
+        provider.received[notification_key("0x1", raw)] = time.perf_counter() - 1.0
+    provider.received[notification_key("0x2", {"hash": block_hash})] = time.perf_counter()
+    # the first log was dropped, the others still find their own receive time
+    formatted = {"blockHash": HexBytes(block_hash), "logIndex": 2}
+    delay = provider.notification_delay("0x1", formatted)
+    assert delay is not None and delay >= 1.0
+    assert provider.notification_delay("0x1", formatted) is None
+    delay = provider.notification_delay("0x2", {"hash": HexBytes(block_hash)})
+    assert delay is not None and delay < 1.0
+    assert len(provider.received) == 2
+
+
+async def test_notifications_on_dedicated_connection(nodes):
+    node = nodes[1]
+    chain = synthetic_chain(2, node.url)
+    chain.name = "NotifySplit"
+    registry = ChainRegistry()
+    registry.chains.append(chain)
+    registry.chain_by_id[chain.id] = chain
+    markets = MarketState()
+    markets.graph.add_edge(chain.tokens[0], chain.tokens[1], weight=1.0)
+    token = chain.tokens[0]
+    cfg = RpcPoolConfig(probe_interval=0.05, timeout=1.0, read_connections=2)
+    cs_mgr = ChainServiceMgr(registry, markets, BalanceRefreshConfig(), cfg)
+    try:
+        await cs_mgr.run()
+        await wait_for(lambda: len(node.subscriptions) == 4, timeout=5)
+        assert len(node.connections) == 3
+        assert len({sub.ws for sub in node.subscriptions.values()}) == 1
+        await node.transfer(token.address, chain.liquorice_settlement_address, SIM_SKEEPER, 5)
+        await wait_for(lambda: token.raw_balance == 5, timeout=5)
+        assert histogram_count("rpc_notification_queue_seconds", {"chain": "NotifySplit"}) >= 1
+    finally:
+        await cs_mgr.shutdown()
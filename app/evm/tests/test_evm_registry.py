@@ -138,6 +138,26 @@ def test_from_env_inactive_when_missing_ws_urls():
         assert arb_chain.ws_rpc_url == "ws://arbitrum.example.com"
 
 
+def test_from_env_multiple_ws_urls():
+    """Test comma-separated WebSocket URLs make the RPC pool, the first one is primary."""
+    registry = ChainRegistry.from_chains_inventory()
+    envs = {**ENVS, "ARB_WS_URL": "wss://primary.example.com, wss://standby.example.com/key"}
+    with patch.dict(os.environ, envs, clear=True):
+        registry.from_env()
+        arb_chain = registry.get_chain_by_id(42161)
+        assert arb_chain is not None
+        assert arb_chain.ws_rpc_url == "wss://primary.example.com"
+        assert arb_chain.ws_rpc_urls == [
+            "wss://primary.example.com",
+            "wss://standby.example.com/key",
+        ]
+        assert arb_chain.active is True
+    envs["ARB_WS_URL"] = "wss://primary.example.com,http://standby.example.com"
+    with patch.dict(os.environ, envs, clear=True):
+        with pytest.raises(ValueError, match="Invalid WebSocket URL"):
+            registry.from_env()
+
+
 def test_from_env_invalid_ws_urls(registry_from_inventory: ChainRegistry):
     """Test loading invalid WebSocket URL from environment."""
     INCORRECT_ENVS = ENVS.copy()
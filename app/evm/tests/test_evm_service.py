@@ -7,6 +7,7 @@ import pytest
 from web3.main import to_checksum_address
 from web3.utils.subscriptions import LogsSubscription
 
+from app.evm.const import NATIVE_TOKEN_ADDRESS
 from app.evm.registry import ChainRegistry
 from app.evm.service import ChainService, ChainServiceMgr
 from app.markets.markets import MarketState
@@ -89,23 +90,10 @@ def mock_async_web3_cls(mock_chain: Chain):
             self._event_count = 0
             self._max_events = 10
             self.eth = AsyncMock()
-
-            async def get_chain_id() -> int:
-                return mock_chain.id
-
-            self.eth.chain_id = get_chain_id()
             self.subscription_manager = MockSubscriptionManager()
             self.middleware_onion = AsyncMock()
             self.middleware_onion.inject = AsyncMock()
 
-        async def __aenter__(self):
-            """Async context manager entry."""
-            return self
-
-        async def __aexit__(self, exc_type, exc_val, exc_tb):
-            """Async context manager exit."""
-            return None
-
     return MockAsyncWeb3
 
 
@@ -145,6 +133,22 @@ async def test_build_subscription_filters(mock_chain_service: ChainService):
     assert all(isinstance(f, LogsSubscription) for f in filters)
 
 
+@pytest.mark.asyncio
+async def test_build_subscription_filters_skip_native_token(mock_chain_service: ChainService):
+    """The native token pseudo-address emits no Transfer logs."""
+    chain = mock_chain_service.chain
+    chain.tokens.append(
+        ERC20Token(
+            name="Native",
+            symbol="GAS123",
+            chain=chain,
+            address=to_checksum_address(NATIVE_TOKEN_ADDRESS),
+        )
+    )
+    filters = mock_chain_service.build_tokens_subscription_filter_with_handlers(chain)
+    assert len(filters) == 6
+
+
 @pytest.mark.asyncio
 async def test_chain_service_start_stop(mock_chain_service: ChainService):
     """Test starting and stopping chain service."""
@@ -188,26 +192,49 @@ async def test_log_handler(mock_chain_service: ChainService):
         "data": "0x",
     }
 
+    on_transfer = Mock()
+    assert mock_chain_service.erc20_service is not None
+    mock_chain_service.erc20_service.on_transfer = on_transfer  # type: ignore[method-assign]
     await mock_chain_service.log_handler(context)
-    # No assertion needed as we're just testing it doesn't raise
+    on_transfer.assert_called_once_with(context.result)
 
 
 @pytest.mark.asyncio
 async def test_chain_service_connect_web3_subscribe_and_process(
     mock_chain: Chain, mock_async_web3_cls
 ):
-    """Test chain service using eth-tester provider without modifying ChainService."""
-    with patch("app.evm.service.AsyncWeb3", mock_async_web3_cls):
-        registry = ChainRegistry()
-        registry.chains.append(mock_chain)
-        registry.chain_by_id[mock_chain.id] = mock_chain
-        manager = ChainServiceMgr(registry, MarketState())
-        chain_service = ChainService(manager, mock_chain)
-
-        # Create a mock ERC20Service instance
-        mock_erc20_service = AsyncMock()
-        mock_erc20_service.start = AsyncMock()
-        mock_erc20_service.stop = AsyncMock()
-        with patch("app.evm.service.ERC20Service", return_value=mock_erc20_service):
-            await chain_service.connect_web3_subscribe_and_process()
-            mock_erc20_service.start.assert_called_once()
+    """Test chain service subscribes on the pool endpoint and resubscribes when it ends."""
+    registry = ChainRegistry()
+    registry.chains.append(mock_chain)
+    registry.chain_by_id[mock_chain.id] = mock_chain
+    manager = ChainServiceMgr(registry, MarketState())
+    chain_service = ChainService(manager, mock_chain)
+
+    endpoint = Mock(label="test", w3=mock_async_web3_cls())
+    mock_pool = Mock()
+    mock_pool.start = AsyncMock()
+    mock_pool.stop = AsyncMock()
+    mock_pool.disconnect = AsyncMock()
+    mock_pool.subscription_endpoint = AsyncMock(return_value=endpoint)
+    mock_pool.failback = asyncio.Event()
+    mock_erc20_service = AsyncMock()
+    mock_erc20_service.start = AsyncMock()
+    mock_erc20_service.stop = AsyncMock()
+    mock_erc20_service.request_immediate_read = Mock()
+    with (
+        patch("app.evm.service.RpcPool", return_value=mock_pool),
+        patch("app.evm.service.ERC20Service", return_value=mock_erc20_service),
+    ):
+        task = asyncio.create_task(chain_service.connect_web3_subscribe_and_process())
+        async with asyncio.timeout(5):
+            while mock_pool.subscription_endpoint.await_count < 2:
+                await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    mock_erc20_service.start.assert_called_once()
+    # the ended subscription handler fails the endpoint, missed transfers are read
+    mock_pool.mark_failed.assert_called_once()
+    mock_erc20_service.request_immediate_read.assert_called_once()
+    mock_erc20_service.stop.assert_called_once()
+    mock_pool.stop.assert_called_once()
@@ -0,0 +1,150 @@
+"""Tests for SettlementTracker quote to settlement matching."""
+
+import time
+import uuid
+
+from eth_utils import keccak
+from prometheus_client import REGISTRY
+
+from app.evm.registry import ChainRegistry
+from app.evm.service import ChainServiceMgr
+from app.evm.settlement import (
+    SETTLEMENT_GRACE,
+    SettlementConfig,
+    SettlementTracker,
+    rfq_topic,
+)
+from app.markets.markets import MarketState
+from app.protocols.liquorice.internal import Rfq
+from app.sim.chain_bench import SIM_SETTLEMENT, SIM_SKEEPER, synthetic_chain, wait_for
+from app.sim.rpc import FakeRpcNode
+
+EVENT_TOPIC = "0x" + "ab" * 32  # any settlement event signature
+
+
+def make_rfq(chain, expiry: int = 0) -> Rfq:
+    base, quote = chain.tokens[0].address, chain.tokens[1].address
+    return Rfq(
+        chain_id=chain.id,
+        solver="test_settlement",
+        solver_rfq_id=str(uuid.uuid4()),
+        rfq_id=str(uuid.uuid4()),
+        nonce=bytes(32),
+        base_token=base,
+        quote_token=quote,
+        trader=SIM_SKEEPER,
+        effective_trader=SIM_SKEEPER,
+        expiry=expiry,
+    )
+
+
+def settlement_log(rfq: Rfq, removed: bool = False) -> dict:
+    return {"topics": [EVENT_TOPIC, "0x" + rfq_topic(rfq.rfq_id).hex()], "removed": removed}
+
+
+def waiting(rfq: Rfq) -> float:
+    labels = {
+        "chain_id": str(rfq.chain_id),
+        "solver": "test_settlement",
+        "base_token": rfq.base_token,
+        "quote_token": rfq.quote_token,
+    }
+    return REGISTRY.get_sample_value("rfqs_waiting", labels) or 0.0
+
+
+def test_settlement_config_from_env(monkeypatch):
+    monkeypatch.delenv("SETTLEMENT_RESERVE_QUOTES", raising=False)
+    assert not SettlementConfig.from_env().reserve
+    monkeypatch.setenv("SETTLEMENT_RESERVE_QUOTES", "true")
+    monkeypatch.setenv("SETTLEMENT_MAX_PENDING", "10")
+    assert SettlementConfig.from_env() == SettlementConfig(reserve=True, max_pending=10)
+
+
+def test_rfq_topic():
+    rfq_id = "d9c5f1a0-0c5c-4b5e-9d3a-0f6f0d6c6a11"
+    # keccak of the indexed `string rfqId` of the event
+    assert rfq_topic(rfq_id) == keccak(text=rfq_id)
+
+
+def test_settlement_releases_reservation():
+    chain = synthetic_chain(2, "ws://127.0.0.1:1")
+    token = chain.tokens[1]
+    token.raw_balance = 100
+    tracker = SettlementTracker(SettlementConfig(reserve=True))
+    rfq = make_rfq(chain, expiry=int(time.time()) + 60)
+    before = waiting(rfq)
+    settled = REGISTRY.get_sample_value("quotes_settled_total", {"chain_id": "31337"}) or 0
+    tracker.quote_sent(rfq, token, 40, rfq.expiry)
+    assert (token.raw_reserved, token.raw_available) == (40, 60)
+    assert waiting(rfq) == before + 1
+    # removed (reorged) logs and logs of other chains do not settle
+    assert tracker.on_log(chain.id, settlement_log(rfq, removed=True)) is None
+    assert tracker.on_log(1, settlement_log(rfq)) is None
+    quote = tracker.on_log(chain.id, settlement_log(rfq))
+    assert quote is not None and quote.rfq_id == rfq.rfq_id
+    assert (token.raw_reserved, token.raw_available) == (0, 100)
+    assert waiting(rfq) == before
+    assert REGISTRY.get_sample_value("quotes_settled_total", {"chain_id": "31337"}) == settled + 1
+    assert tracker.on_log(chain.id, settlement_log(rfq)) is None  # settled once
+
+
+def test_no_reservation_by_default():
+    chain = synthetic_chain(2, "ws://127.0.0.1:1")
+    tracker = SettlementTracker()
+    rfq = make_rfq(chain, expiry=int(time.time()) + 60)
+    tracker.quote_sent(rfq, chain.tokens[1], 40, rfq.expiry)
+    assert chain.tokens[1].raw_reserved == 0
+    assert tracker.on_log(chain.id, settlement_log(rfq)) is not None
+
+
+def test_expired_quotes_evicted():
+    chain = synthetic_chain(2, "ws://127.0.0.1:1")
+    token = chain.tokens[1]
+    tracker = SettlementTracker(SettlementConfig(reserve=True))
+    rfqs = [make_rfq(chain) for _ in range(3)]
+    for expiry, rfq in enumerate(rfqs, start=100):
+        tracker.quote_sent(rfq, token, 1, expiry)
+    tracker.on_log(chain.id, settlement_log(rfqs[0]))
+    assert tracker.expire(now=102 + SETTLEMENT_GRACE) == 1  # the settled one is skipped
+    assert list(tracker.pending[chain.id]) == [rfq_topic(rfqs[2].rfq_id)]
+    assert token.raw_reserved == 1
+    assert tracker.expire(now=200 + SETTLEMENT_GRACE) == 1
+    assert not tracker.pending[chain.id] and not tracker.expiries[chain.id]
+    assert token.raw_reserved == 0
+
+
+def test_pending_quotes_bounded():
+    chain = synthetic_chain(2, "ws://127.0.0.1:1")
+    tracker = SettlementTracker(SettlementConfig(max_pending=2))
+    rfqs = [make_rfq(chain) for _ in range(3)]
+    for expiry, rfq in zip((300, 100, 200), rfqs):
+        tracker.quote_sent(rfq, chain.tokens[1], 1, expiry)
+    # the quote expiring first makes room
+    assert set(tracker.pending[chain.id]) == {rfq_topic(rfqs[0].rfq_id), rfq_topic(rfqs[2].rfq_id)}
+
+
+async def test_settlement_logs_subscribed():
+    node = FakeRpcNode(31337, block_number=10)
+    url = await node.start()
+    chain = synthetic_chain(2, url)
+    registry = ChainRegistry()
+    registry.chains.append(chain)
+    registry.chain_by_id[chain.id] = chain
+    markets = MarketState()
+    markets.graph.add_edge(chain.tokens[0], chain.tokens[1], weight=1.0)
+    tracker = SettlementTracker()
+    rfq = make_rfq(chain, expiry=int(time.time()) + 60)
+    tracker.quote_sent(rfq, chain.tokens[1], 1, rfq.expiry)
+    cs_mgr = ChainServiceMgr(registry, markets, settlements=tracker)
+    try:
+        await cs_mgr.run()
+        await wait_for(
+            lambda: {SIM_SETTLEMENT.lower()} in [s.addresses for s in node.subscriptions.values()],
+            5,
+        )
+        log_entry = settlement_log(rfq)
+        assert await node.emit_log(SIM_SETTLEMENT, log_entry["topics"], "0x") == 1
+        await wait_for(lambda: not tracker.pending[chain.id], timeout=5)
+    finally:
+        await cs_mgr.shutdown()
+        await node.stop()
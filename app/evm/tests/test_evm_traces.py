@@ -0,0 +1,185 @@
+"""Tests for settlement transaction traces."""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from prometheus_client import REGISTRY
+from web3 import Web3
+from web3.exceptions import Web3RPCError
+
+from app.evm.const import ERC20_TRANSFER_TOPIC
+from app.evm.pool import RpcPool, RpcPoolConfig
+from app.evm.registry import ChainRegistry
+from app.evm.service import ChainServiceMgr
+from app.evm.traces import Fill, TraceConfig, TraceWorker, extract_fills
+from app.markets.markets import MarketState
+from app.sim.chain_bench import SIM_SKEEPER, synthetic_chain, wait_for
+from app.sim.rpc import FakeRpcNode, topic_address
+
+TOKEN = "0x" + "11" * 20
+OTHER = "0x" + "22" * 20
+OTHER_CHECKSUM = Web3.to_checksum_address(OTHER)
+TX_HASH = "0x" + "ab" * 32
+
+
+def transfer_log(sender: str, recipient: str, amount: int) -> dict:
+    return {
+        "address": TOKEN,
+        "topics": [ERC20_TRANSFER_TOPIC, topic_address(sender), topic_address(recipient)],
+        "data": "0x" + amount.to_bytes(32, "big").hex(),
+    }
+
+
+TRACE = {
+    "logs": [transfer_log(OTHER, SIM_SKEEPER, 5)],
+    "calls": [
+        {"logs": [transfer_log(SIM_SKEEPER, OTHER, 3)]},
+        {"logs": [transfer_log(OTHER, OTHER, 7)]},  # not ours
+        {"error": "execution reverted", "logs": [transfer_log(SIM_SKEEPER, OTHER, 9)]},
+    ],
+}
+
+
+def traces_count(status: str) -> float:
+    return REGISTRY.get_sample_value("traces_total", {"chain": "Traced", "status": status}) or 0
+
+
+@pytest.fixture
+def rpc():
+    chain = synthetic_chain(1, "ws://127.0.0.1:1")
+    chain.name = "Traced"
+    rpc = Mock(chain=chain)
+    rpc.background = AsyncMock(return_value={"jsonrpc": "2.0", "id": 1, "result": TRACE})
+    return rpc
+
+
+def test_trace_config_from_env(monkeypatch):
+    monkeypatch.delenv("RPC_TRACES", raising=False)
+    assert not TraceConfig.from_env().enabled
+    monkeypatch.setenv("RPC_TRACES", "true")
+    monkeypatch.setenv("RPC_TRACE_QUEUE_SIZE", "10")
+    monkeypatch.setenv("RPC_TRACE_CONCURRENCY", "2")
+    monkeypatch.setenv("RPC_TRACE_TIMEOUT", "5")
+    monkeypatch.setenv("RPC_TRACE_CACHE_SIZE", "20")
+    assert TraceConfig.from_env() == TraceConfig(True, 10, 2, 5.0, 20)
+
+
+def test_extract_fills():
+    skeeper, token, other = SIM_SKEEPER, TOKEN.lower(), OTHER.lower()
+    fills = extract_fills(TRACE, skeeper)
+    assert [(f.sender.lower(), f.recipient.lower(), f.raw_amount) for f in fills] == [
+        (other, skeeper.lower(), 5),
+        (skeeper.lower(), other, 3),
+    ]
+    assert {fill.token.lower() for fill in fills} == {token}
+
+
+async def test_traced_once_and_cached(rpc):
+    received = []
+    worker = TraceWorker(
+        rpc, SIM_SKEEPER, TraceConfig(enabled=True), lambda *a: received.append(a)
+    )
+    traced, cached = traces_count("traced"), traces_count("cached")
+    await worker.start()
+    try:
+        # a transaction settling two quotes is traced once
+        assert worker.submit(TX_HASH) and worker.submit(TX_HASH.upper().replace("0X", "0x"))
+        await wait_for(lambda: received, timeout=5)
+        assert worker.submit(TX_HASH)
+    finally:
+        await worker.stop()
+    assert rpc.background.await_count == 1
+    assert len(received) == 2 and all(fills == received[0][1] for _, fills in received)
+    assert isinstance(received[0][1][0], Fill)
+    assert (traces_count("traced"), traces_count("cached")) == (traced + 1, cached + 1)
+
+
+async def test_queue_bounded_and_cache_evicted(rpc):
+    received = []
+    cfg = TraceConfig(enabled=True, queue_size=2, cache_size=1)
+    worker = TraceWorker(rpc, SIM_SKEEPER, cfg, lambda *a: received.append(a))
+    dropped = traces_count("dropped")
+    hashes = ["0x" + f"{i:064x}" for i in range(3)]
+    assert [worker.submit(tx_hash) for tx_hash in hashes] == [True, True, False]
+    assert traces_count("dropped") == dropped + 1
+    await worker.start()
+    try:
+        await wait_for(lambda: len(received) == 2, timeout=5)
+    finally:
+        await worker.stop()
+    assert list(worker.cache) == [hashes[1]]
+
+
+async def test_traces_wait_for_balance_refreshes(rpc):
+    refreshing = [True]
+    received = []
+    worker = TraceWorker(
+        rpc,
+        SIM_SKEEPER,
+        TraceConfig(enabled=True),
+        lambda *a: received.append(a),
+        busy=lambda: refreshing[0],
+    )
+    await worker.start()
+    try:
+        worker.submit(TX_HASH)
+        await asyncio.sleep(0.1)
+        assert not rpc.background.await_count
+        refreshing[0] = False
+        await wait_for(lambda: received, timeout=5)
+    finally:
+        await worker.stop()
+
+
+async def test_trace_failure_leaves_endpoint_healthy():
+    node = FakeRpcNode(31337, block_number=10)
+    url = await node.start()
+    chain = synthetic_chain(1, url)
+    chain.name = "Traced"
+    pool = RpcPool(chain, RpcPoolConfig(probe_interval=60))
+    await pool.start()
+    on_fills = Mock()
+    worker = TraceWorker(pool, SIM_SKEEPER, TraceConfig(enabled=True), on_fills)
+    failed = traces_count("failed")
+    try:
+        # the fake node has no debug API
+        with pytest.raises(Web3RPCError):
+            await worker.trace(TX_HASH)
+        await worker.start()
+        worker.submit(TX_HASH)
+        await wait_for(lambda: traces_count("failed") == failed + 1, timeout=5)
+        assert pool.endpoints[0].healthy and not pool.endpoints[0].errors
+        assert not on_fills.called
+    finally:
+        await worker.stop()
+        await pool.stop()
+        await node.stop()
+
+
+def test_fills_accounted_per_token_and_side():
+    chain = synthetic_chain(2, "ws://127.0.0.1:1")
+    chain.name = "Traced"
+    registry = ChainRegistry()
+    registry.chains.append(chain)
+    markets = MarketState()
+    markets.graph.add_edge(chain.tokens[0], chain.tokens[1], weight=1.0)
+    service = ChainServiceMgr(registry, markets).services[0]
+    token = chain.tokens[0]
+    labels = {"chain": "Traced", "token": token.symbol}
+    before = {
+        side: REGISTRY.get_sample_value("settlement_fills_total", {**labels, "side": side}) or 0
+        for side in ("in", "out")
+    }
+    service.on_fills(
+        TX_HASH,
+        [
+            Fill(token.address, OTHER_CHECKSUM, SIM_SKEEPER, 2 * 10**18),
+            Fill(token.address, SIM_SKEEPER, OTHER_CHECKSUM, 10**18),
+        ],
+    )
+    after = {
+        side: REGISTRY.get_sample_value("settlement_fills_total", {**labels, "side": side})
+        for side in ("in", "out")
+    }
+    assert after == {"in": before["in"] + 2, "out": before["out"] + 1}
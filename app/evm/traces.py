@@ -0,0 +1,222 @@
+"""Settlement transaction traces.
+
+`TraceWorker` traces the settlement transactions of the quotes sent with
+`debug_traceTransaction` (`callTracer` with logs) and extracts the ERC-20 fills
+that moved tokens to or from the settlement keeper: the exact executed amounts,
+without reading balances. Tracing is expensive and not offered by every provider,
+so it is opt-in (`RPC_TRACES`), bounded and low priority:
+
+- transactions wait in a queue of at most `queue_size`, newer ones are dropped
+  while it is full;
+- at most `concurrency` traces of a chain are in flight, each starts only while no
+  balances refresh is in flight and goes through `RpcPool.background()`, which
+  takes no read slot and leaves the routing of reads alone;
+- the fills of the last `cache_size` traced transactions are cached by hash, a
+  transaction settling several quotes is traced once.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, Callable, List, Mapping, Optional, Set
+
+from eth_typing import ChecksumAddress
+from web3 import AsyncWeb3, Web3
+from web3.types import RPCEndpoint, RPCResponse
+
+from app.evm.batching import RpcCallError
+from app.evm.const import ERC20_TRANSFER_TOPIC
+from app.evm.helpers import cancel_and_wait
+from app.evm.pool import RpcPool
+from app.metrics.metrics import metrics
+
+log = getLogger(__name__)
+
+TRACE_QUEUE_SIZE = 100  # settlement transactions waiting to be traced per chain
+TRACE_CONCURRENCY = 1  # traces in flight per chain
+TRACE_TIMEOUT = 30.0  # seconds before a trace is given up
+TRACE_CACHE_SIZE = 1000  # traced transactions whose fills are kept
+TRACE_BUSY_POLL = 0.05  # seconds between checks of a balances refresh in flight
+TRACE_OPTIONS = {"tracer": "callTracer", "tracerConfig": {"withLog": True}}
+
+
+@dataclass(slots=True)
+class TraceConfig:
+    """Settlement transaction traces settings, disabled by default."""
+
+    enabled: bool = False
+    queue_size: int = TRACE_QUEUE_SIZE
+    concurrency: int = TRACE_CONCURRENCY
+    timeout: float = TRACE_TIMEOUT
+    cache_size: int = TRACE_CACHE_SIZE
+
+    @classmethod
+    def from_env(cls) -> "TraceConfig":
+        """Create from `RPC_TRACES` (`true` enables traces), `RPC_TRACE_QUEUE_SIZE`,
+        `RPC_TRACE_CONCURRENCY`, `RPC_TRACE_TIMEOUT` and `RPC_TRACE_CACHE_SIZE` env vars."""
+        return cls(
+            enabled=os.getenv("RPC_TRACES", "false").lower() == "true",
+            queue_size=int(os.getenv("RPC_TRACE_QUEUE_SIZE", str(TRACE_QUEUE_SIZE))),
+            concurrency=int(os.getenv("RPC_TRACE_CONCURRENCY", str(TRACE_CONCURRENCY))),
+            timeout=float(os.getenv("RPC_TRACE_TIMEOUT", str(TRACE_TIMEOUT))),
+            cache_size=int(os.getenv("RPC_TRACE_CACHE_SIZE", str(TRACE_CACHE_SIZE))),
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Fill:
+    """ERC-20 transfer of a settlement to or from the settlement keeper."""
+
+    token: ChecksumAddress
+    sender: ChecksumAddress
+    recipient: ChecksumAddress
+    raw_amount: int
+
+
+def extract_fills(trace: Mapping[str, Any], holder: str) -> List[Fill]:
+    """ERC-20 `Transfer` logs of a `callTracer` trace from or to `holder`.
+    Logs of reverted calls (and of their sub-calls) are skipped."""
+    holder = holder.lower()
+    fills = []
+    frames = [trace]
+    while frames:
+        frame = frames.pop()
+        if frame.get("error"):
+            continue
+        for entry in frame.get("logs") or []:
+            topics = [topic.lower() for topic in entry.get("topics") or []]
+            if len(topics) != 3 or topics[0] != ERC20_TRANSFER_TOPIC:
+                continue
+            sender, recipient = "0x" + topics[1][-40:], "0x" + topics[2][-40:]
+            if holder not in (sender, recipient):
+                continue
+            data = entry.get("data") or "0x"
+            fills.append(
+                Fill(
+                    token=Web3.to_checksum_address(entry["address"]),
+                    sender=Web3.to_checksum_address(sender),
+                    recipient=Web3.to_checksum_address(recipient),
+                    raw_amount=int(data, 16) if len(data) > 2 else 0,
+                )
+            )
+        frames.extend(reversed(frame.get("calls") or []))
+    return fills
+
+
+class TraceWorker:  # pylint: disable=too-many-instance-attributes
+    """Traces settlement transactions of a chain in the background, see module."""
+
+    rpc: RpcPool
+    holder: ChecksumAddress
+    cfg: TraceConfig
+    on_fills: Callable[[str, List[Fill]], None]  # called with the fills of a transaction
+    busy: Callable[[], bool]  # whether a balances refresh is in flight
+    queue: asyncio.Queue[str]
+    cache: OrderedDict[str, List[Fill]]  # tx hash -> fills, least recently traced first
+    task: Optional[asyncio.Task]
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        rpc: RpcPool,
+        holder: ChecksumAddress,
+        cfg: TraceConfig,
+        on_fills: Callable[[str, List[Fill]], None],
+        *,
+        busy: Callable[[], bool] = lambda: False,
+    ) -> None:
+        self.rpc = rpc
+        self.holder = holder
+        self.cfg = cfg
+        self.on_fills = on_fills
+        self.busy = busy
+        self.queue = asyncio.Queue(max(1, cfg.queue_size))
+        self.cache = OrderedDict()
+        self.task = None
+        self._queued: Set[str] = set()
+
+    def count(self, status: str) -> None:
+        """Account a settlement transaction in `traces_total`."""
+        metrics.traces_total.labels(chain=self.rpc.chain.name, status=status).inc()
+
+    def submit(self, tx_hash: str) -> bool:
+        """Queue a settlement transaction to be traced, the fills of an already traced
+        one are handed over right away. Returns False if the queue is full."""
+        tx_hash = tx_hash.lower()
+        fills = self.cache.get(tx_hash)
+        if fills is not None:
+            self.count("cached")
+            self.on_fills(tx_hash, fills)
+            return True
+        if tx_hash in self._queued:
+            return True
+        try:
+            self.queue.put_nowait(tx_hash)
+        except asyncio.QueueFull:
+            log.warning("Traces queue of %s full, dropping %s", self.rpc.chain.name, tx_hash)
+            self.count("dropped")
+            return False
+        self._queued.add(tx_hash)
+        return True
+
+    async def trace(self, tx_hash: str) -> List[Fill]:
+        """Fills of the settlement keeper in a transaction.
+
+        Raises:
+            Web3RPCError: if the node failed to trace it (e.g. `debug` API disabled)
+            RpcCallError: on an error response web3 did not raise for
+            RpcUnavailable: if no endpoint is healthy
+        """
+
+        async def request(w3: AsyncWeb3) -> RPCResponse:
+            response: RPCResponse = await w3.provider.make_request(
+                RPCEndpoint("debug_traceTransaction"), [tx_hash, TRACE_OPTIONS]
+            )
+            return response
+
+        response = await self.rpc.background(request, self.cfg.timeout)
+        if "error" in response:
+            raise RpcCallError("debug_traceTransaction", response["error"])
+        return extract_fills(response["result"], self.holder)
+
+    async def work(self) -> None:
+        """Trace queued transactions one at a time until cancelled."""
+        while True:
+            tx_hash = await self.queue.get()
+            try:
+                while self.busy():
+                    await asyncio.sleep(TRACE_BUSY_POLL)
+                start = time.perf_counter()
+                fills = await self.trace(tx_hash)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                log.warning("Failed to trace %s on %s: %r", tx_hash, self.rpc.chain.name, e)
+                self.count("failed")
+                continue
+            finally:
+                self._queued.discard(tx_hash)
+                self.queue.task_done()
+            metrics.trace_duration.labels(chain=self.rpc.chain.name).observe(
+                time.perf_counter() - start
+            )
+            self.count("traced")
+            self.cache[tx_hash] = fills
+            while len(self.cache) > self.cfg.cache_size:
+                self.cache.popitem(last=False)
+            self.on_fills(tx_hash, fills)
+
+    async def run(self) -> None:
+        """Run `concurrency` tracing workers until cancelled."""
+        await asyncio.gather(*(self.work() for _ in range(max(1, self.cfg.concurrency))))
+
+    async def start(self) -> None:
+        """Start tracing queued transactions."""
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop tracing, queued transactions are dropped."""
+        if self.task is not None:
+            await cancel_and_wait(self.task)
+            self.task = None
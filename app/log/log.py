@@ -1,12 +1,32 @@
+"""Logging setup.
+
+Records are handed over to a background writer thread through a bounded queue
+(`AsyncLogHandler`), so formatting and writing to stdout never block the event loop.
+Repetitive records below WARNING are rate limited per logger and message template
+and sampled once over the limit (`RateLimitFilter`). Dropped records are counted
+in the `log_records_dropped_total` metric.
+"""
+
+import copy
 import logging
 import os
+import queue
+import sys
 import time
-from typing import Any, Dict
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+from app.metrics.metrics import metrics
 
 DEFAULT_LOG_FMT: Dict[str, Any] = {
     "format": "%(asctime)s.%(msecs)03dZ %(name)s %(levelname)s: %(message)s",
     "datefmt": "%Y-%m-%dT%H:%M:%S",
 }
+LOG_QUEUE_SIZE = 10000  # records buffered for the writer thread, newer ones are dropped
+LOG_RATE_LIMIT = 10.0  # records per second per logger and message template
+LOG_RATE_BURST = 50  # records per logger and message template passed before limiting
+LOG_SAMPLE = 100  # over the limit, pass 1 of LOG_SAMPLE records
+LOG_RATE_MAX_KEYS = 10000  # rate limiter buckets, reset when exceeded
 
 DEFAULT_UVICORN_LOG_CFG: Dict[str, Any] = {
     "version": 1,
@@ -16,7 +36,7 @@ DEFAULT_UVICORN_LOG_CFG: Dict[str, Any] = {
     "handlers": {
         "default": {
             "formatter": "default",
-            "class": "logging.StreamHandler",
+            "()": "app.log.log.build_log_handler",
             "stream": "ext://sys.stdout",
             "level": "DEBUG",
         },
@@ -35,6 +55,118 @@ DEFAULT_UVICORN_LOG_CFG: Dict[str, Any] = {
     "disable_existing_loggers": False,
 }
 
+dropped_queue_full = metrics.log_records_dropped_total.labels(reason="queue_full")
+dropped_rate_limited = metrics.log_records_dropped_total.labels(reason="rate_limited")
+
+
+class LogfmtFormatter(logging.Formatter):
+    """Compact structured `key=value` format, e.g.
+    `ts=2025-08-01T12:00:00.123Z lvl=INFO logger=app.quoter msg="Sending quote"`."""
+
+    def __init__(self) -> None:
+        super().__init__(datefmt=DEFAULT_LOG_FMT["datefmt"])
+
+    @staticmethod
+    def quote(value: str) -> str:
+        """Quote a value if it contains spaces, quotes or `=`."""
+        if value and not any(c in value for c in ' "=\n'):
+            return value
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+    def format(self, record: logging.LogRecord) -> str:
+        ts = f"{self.formatTime(record, self.datefmt)}.{int(record.msecs):03d}Z"
+        line = (
+            f"ts={ts} lvl={record.levelname} logger={record.name}"
+            f" msg={self.quote(record.getMessage())}"
+        )
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line += f" exc={self.quote(record.exc_text)}"
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per (logger, message template) for records below WARNING.
+
+    Each template may log `burst` records at once and `rate` records per second
+    on average. Over the limit only every `sample`-th record passes."""
+
+    def __init__(
+        self, rate: float = LOG_RATE_LIMIT, burst: int = LOG_RATE_BURST, sample: int = LOG_SAMPLE
+    ) -> None:
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample = sample
+        # key -> [tokens, last refill time.monotonic(), records over the limit]
+        self.buckets: Dict[Tuple[str, Any], List[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= LOG_RATE_MAX_KEYS:
+                self.buckets.clear()
+            bucket = self.buckets[key] = [float(self.burst), now, 0]
+        tokens = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True
+        bucket[0] = tokens
+        bucket[2] += 1
+        if self.sample and bucket[2] % self.sample == 0:
+            return True
+        dropped_rate_limited.inc()
+        return False
+
+
+class BlockingQueueListener(QueueListener):
+    """Queue listener which waits for room in a full queue to enqueue its stop sentinel."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)  # type: ignore[attr-defined]
+
+
+class AsyncLogHandler(QueueHandler):
+    """Enqueues records for a background `QueueListener` thread writing them to `handler`.
+
+    Records are enqueued as is and formatted in the writer thread, so don't log
+    objects which are mutated right after. When the queue is full records are dropped."""
+
+    def __init__(self, handler: logging.Handler, queue_size: int = LOG_QUEUE_SIZE) -> None:
+        super().__init__(queue.Queue(queue_size))
+        self.handler = handler
+        self.listener = BlockingQueueListener(self.queue, handler, respect_handler_level=True)
+        self.listener.start()
+        self.running = True
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
+        """Set the formatter of the wrapped handler (formatting happens in the writer thread)."""
+        super().setFormatter(fmt)
+        self.handler.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_queue_full.inc()
+
+    def close(self) -> None:
+        """Flush queued records and stop the writer thread."""
+        if self.running:
+            self.running = False
+            self.listener.stop()
+        self.handler.close()
+        super().close()
+
 
 def get_log_level() -> Any:
     """Get the log level from the environment variable or use the default."""
@@ -45,9 +177,41 @@ def get_log_level() -> Any:
         raise ValueError(f"Invalid log level: {log_level}") from e
 
 
+def get_log_formatter() -> logging.Formatter:
+    """Get the formatter set by `LOG_FORMAT` env var: `text` (default) or `logfmt`."""
+    if os.environ.get("LOG_FORMAT", "text").lower() == "logfmt":
+        return LogfmtFormatter()
+    return logging.Formatter(DEFAULT_LOG_FMT["format"], DEFAULT_LOG_FMT["datefmt"])
+
+
+def build_log_handler(stream: TextIO = sys.stdout) -> logging.Handler:
+    """Build the stream handler configured by env vars.
+
+    `LOG_ASYNC` (on by default) writes through a background thread with up to
+    `LOG_QUEUE_SIZE` queued records. `LOG_RATE_LIMIT` records per second,
+    `LOG_RATE_BURST` and `LOG_SAMPLE` configure rate limiting, `LOG_RATE_LIMIT=0` disables it.
+    """
+    handler: logging.Handler = logging.StreamHandler(stream)
+    if os.environ.get("LOG_ASYNC", "1").lower() in ("1", "true", "yes"):
+        handler = AsyncLogHandler(
+            handler, queue_size=int(os.environ.get("LOG_QUEUE_SIZE", str(LOG_QUEUE_SIZE)))
+        )
+    rate = float(os.environ.get("LOG_RATE_LIMIT", str(LOG_RATE_LIMIT)))
+    if rate > 0:
+        handler.addFilter(
+            RateLimitFilter(
+                rate=rate,
+                burst=int(os.environ.get("LOG_RATE_BURST", str(LOG_RATE_BURST))),
+                sample=int(os.environ.get("LOG_SAMPLE", str(LOG_SAMPLE))),
+            )
+        )
+    handler.setFormatter(get_log_formatter())
+    return handler
+
+
 def setup_logging(**kwargs) -> None:
     """Configure logging with level taken from environment."""
-    config = DEFAULT_LOG_FMT.copy()
+    config: Dict[str, Any] = {"handlers": [build_log_handler()]}
     config["level"] = get_log_level()
     config.update(kwargs)
 
@@ -59,7 +223,9 @@ def setup_logging(**kwargs) -> None:
 
 def get_uvicorn_log_config() -> Dict[str, Any]:
     """Get Uvicorn log configuration depending on ENV settings."""
-    config = DEFAULT_UVICORN_LOG_CFG.copy()
+    config = copy.deepcopy(DEFAULT_UVICORN_LOG_CFG)
     config["root"]["level"] = get_log_level()
     config["handlers"]["default"]["level"] = get_log_level()
+    if os.environ.get("LOG_FORMAT", "text").lower() == "logfmt":
+        config["formatters"]["default"] = {"()": "app.log.log.LogfmtFormatter"}
     return config
@@ -0,0 +1,95 @@
+"""Tests for the asynchronous logging pipeline."""
+
+import io
+import logging
+import queue
+import threading
+import time
+from typing import cast
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY
+
+from app.log.log import (
+    DEFAULT_UVICORN_LOG_CFG,
+    AsyncLogHandler,
+    LogfmtFormatter,
+    RateLimitFilter,
+    get_uvicorn_log_config,
+)
+
+
+def make_record(msg: str, *args, level: int = logging.INFO, name: str = "test"):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def dropped(reason: str) -> float:
+    return REGISTRY.get_sample_value("log_records_dropped_total", {"reason": reason}) or 0.0
+
+
+def test_rate_limit_filter_burst_and_sampling():
+    flt = RateLimitFilter(rate=1, burst=3, sample=5)
+    dropped_before = dropped("rate_limited")
+    with patch("app.log.log.time.monotonic", return_value=100.0) as monotonic:
+        passed = [flt.filter(make_record("balance %d", i)) for i in range(13)]
+        # burst, then every 5th record over the limit
+        assert passed == [True] * 3 + [False] * 4 + [True] + [False] * 4 + [True]
+        # other templates and loggers have their own buckets
+        assert flt.filter(make_record("other %d", 1))
+        assert flt.filter(make_record("balance %d", 1, name="other"))
+        # warnings are never limited
+        assert flt.filter(make_record("balance %d", 1, level=logging.WARNING))
+        # tokens refill with time
+        monotonic.return_value = 102.0
+        assert flt.filter(make_record("balance %d", 1))
+        assert flt.filter(make_record("balance %d", 1))
+        assert not flt.filter(make_record("balance %d", 1))
+    assert dropped("rate_limited") - dropped_before == 9
+
+
+def test_async_handler_writes_from_thread():
+    stream = io.StringIO()
+    handler = AsyncLogHandler(logging.StreamHandler(stream))
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    for i in range(3):
+        handler.handle(make_record("line %d", i))
+    handler.close()
+    assert stream.getvalue() == "INFO line 0\nINFO line 1\nINFO line 2\n"
+    handler.close()  # idempotent
+
+
+def test_async_handler_drops_when_queue_is_full():
+    release = threading.Event()
+    emitted = []
+
+    class BlockingHandler(logging.Handler):
+        def emit(self, record):
+            release.wait()
+            emitted.append(record.getMessage())
+
+    handler = AsyncLogHandler(BlockingHandler(), queue_size=2)
+    dropped_before = dropped("queue_full")
+    records = cast(queue.Queue, handler.queue)
+    handler.handle(make_record("first"))
+    while not records.empty():  # wait for the writer to pick it up and block
+        time.sleep(0.001)
+    for i in range(5):
+        handler.handle(make_record("queued %d", i))
+    release.set()
+    handler.close()
+    assert emitted == ["first", "queued 0", "queued 1"]
+    assert dropped("queue_full") - dropped_before == 3
+
+
+def test_logfmt_formatter():
+    line = LogfmtFormatter().format(make_record('quote "%s" sent', "x=1"))
+    assert line.endswith(' lvl=INFO logger=test msg="quote \\"x=1\\" sent"')
+    assert line.startswith("ts=") and line.split()[0].endswith("Z")
+    assert LogfmtFormatter().format(make_record("ok")).endswith("msg=ok")
+
+
+def test_uvicorn_log_config(monkeypatch):
+    monkeypatch.setenv("LOG_FORMAT", "logfmt")
+    config = get_uvicorn_log_config()
+    assert config["formatters"]["default"] == {"()": "app.log.log.LogfmtFormatter"}
+    assert DEFAULT_UVICORN_LOG_CFG["formatters"]["default"] != config["formatters"]["default"]
@@ -6,29 +6,51 @@ for handling NMF protocol connections.
 
 import asyncio
 import logging
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 import uvicorn
 from fastapi import FastAPI
 
 from app.config.maker import MakerConfig
+from app.evm.erc20_service import ERC20_UPDATE_INTERVAL, BalanceRefreshConfig
+from app.evm.pool import RpcPoolConfig
 from app.evm.registry import ChainRegistry
 from app.evm.service import ChainServiceMgr
+from app.evm.settlement import SettlementConfig, SettlementTracker
+from app.evm.traces import TraceConfig
 from app.log.log import get_uvicorn_log_config, setup_logging
+from app.markets.checkpoint import CheckpointConfig, MarketsCheckpointer
+from app.markets.feed import LevelsFeed, levels_source_from_env
 from app.markets.markets import MarketState
-from app.metrics.health import CounterHealthChecker, HealthService
-from app.metrics.metrics import metrics, metrics_router
+from app.metrics.health import (
+    BalancesHealthChecker,
+    HealthService,
+    LiquoriceHealthChecker,
+    LoopLagHealthChecker,
+    TimestampHealthChecker,
+)
+from app.metrics.loop import LoopMonitor
+from app.metrics.metrics import metrics_router, start_metrics_server_from_env
+from app.metrics.profiler import Profiler
 from app.protocols.liquorice.client import LiquoriceClient
 from app.protocols.liquorice.signer import Web3Signer
-from app.quoter.quoter import LiquoriceQuoter
+from app.quoter.quoter import (
+    LiquoriceQuoter,
+    confirmations_from_env,
+    max_balance_age_blocks_from_env,
+)
+from app.quoter.recorder import FlightRecorder
 
 setup_logging()
 log = logging.getLogger(__name__)
 
 
 @asynccontextmanager
-async def lifespan(_app: FastAPI):
+async def lifespan(_app: FastAPI):  # pylint: disable=too-many-locals,too-many-statements
     """Application lifespan context manager for initializing services."""
+    log.info("Starting event loop monitor...")
+    loop_monitor_task = asyncio.create_task(loop_monitor.run())  # long-lived coroutine
+    start_metrics_server_from_env()
     log.info("Initializing chain registry...")
     chain_rg = ChainRegistry.from_chains_inventory()
     log.info("Chain registry initialized")
@@ -41,7 +63,25 @@ async def lifespan(_app: FastAPI):
     liquorice_signer = Web3Signer(chain_rg, cfg_maker.signer_priv_key)
     log.info("Liquorice Signer initialized with account: %s", liquorice_signer.account.address)
     markets = MarketState()
-    cs_mgr = ChainServiceMgr(chain_rg, markets)
+    log.info("Starting price levels feed...")
+    levels_feed = LevelsFeed(markets.levels, levels_source_from_env())
+    levels_feed_task = asyncio.create_task(levels_feed.run())  # long-lived coroutine
+    checkpoint_cfg = CheckpointConfig.from_env()
+    checkpointer = MarketsCheckpointer(markets, chain_rg.chains, checkpoint_cfg)
+    log.info("Restoring market state checkpoint...")
+    await checkpointer.load()
+    checkpoint_task = asyncio.create_task(checkpointer.run())  # long-lived coroutine
+    refresh_cfg = BalanceRefreshConfig.from_env()
+    settlements = SettlementTracker(SettlementConfig.from_env())
+    settlements_task = asyncio.create_task(settlements.run())  # long-lived coroutine
+    cs_mgr = ChainServiceMgr(
+        chain_rg,
+        markets,
+        refresh_cfg,
+        RpcPoolConfig.from_env(),
+        settlements=settlements,
+        trace_cfg=TraceConfig.from_env(),
+    )
     log.info("Starting intent gateway...")
     chain_svc_mgr_task = asyncio.create_task(cs_mgr.run())  # long-lived coroutine
     log.info("Starting Liquorice client...")
@@ -50,32 +90,61 @@ async def lifespan(_app: FastAPI):
         liq_client.run()
     )  # long-lived coroutine for Liquorice client
     log.info("Starting Quoter service...")
-    quoter = LiquoriceQuoter(liq_client.out_rfqs, liq_client.in_quotes, markets, liquorice_signer)
+    quoter = LiquoriceQuoter(
+        liq_client.out_rfqs,
+        liq_client.in_quotes,
+        markets,
+        liquorice_signer,
+        recorder=rfq_recorder,
+        max_balance_age_blocks=max_balance_age_blocks_from_env(),
+        max_restored_age_blocks=checkpoint_cfg.max_age_blocks,
+        settlements=settlements,
+        confirmations=confirmations_from_env(),
+    )
     quoter_task = asyncio.create_task(quoter.run())  # long-lived coroutine for Quoter
+    health_svc.add_checker(TimestampHealthChecker(lambda: quoter.last_quote_ts, 60), name="rfq")
+    health_svc.add_checker(LiquoriceHealthChecker(liq_client), name="liquorice")
+    for chain in chain_rg.chains:
+        if chain.active:
+            health_svc.add_checker(
+                BalancesHealthChecker(
+                    chain,
+                    max_age=2 * ERC20_UPDATE_INTERVAL,
+                    max_blocks=refresh_cfg.max_blocks * 2 if refresh_cfg.enabled else None,
+                ),
+                name=f"balances_{chain.short_names[0]}",
+            )
     log.info("Intent gateway started successfully")
     try:
         yield
     finally:
         logging.info("Shutting down ChainServiceManager...")
         await cs_mgr.shutdown()  # graceful stop
+        checkpoint_task.cancel()  # writes a last checkpoint
+        with suppress(asyncio.CancelledError):
+            await checkpoint_task
         chain_svc_mgr_task.cancel()
         liquorice_client_task.cancel()
         quoter_task.cancel()
+        settlements_task.cancel()
+        levels_feed_task.cancel()
+        loop_monitor_task.cancel()
         try:
             await chain_svc_mgr_task
             await liquorice_client_task
             await quoter_task
+            await settlements_task
+            await levels_feed_task
+            await loop_monitor_task
         except asyncio.CancelledError:
             pass
 
 
+loop_monitor = LoopMonitor.from_env()
+rfq_recorder = FlightRecorder.from_env()
+profiler = Profiler.from_env(rfqs_count=lambda: rfq_recorder.count)
 health_svc = HealthService()
-health_svc.add_checker(
-    CounterHealthChecker(
-        metrics.rfqs_total, interval=60, label_key="status", label_values=["QUOTE_SENT"]
-    ),
-    name="rfq",
-)
+health_svc.add_checker(LoopLagHealthChecker(loop_monitor), name="event_loop")
 
 app = FastAPI(
     title="Intent Gateway",
@@ -86,6 +155,9 @@ app = FastAPI(
 
 app.include_router(health_svc.router)
 app.include_router(metrics_router)
+app.include_router(loop_monitor.router)
+app.include_router(rfq_recorder.router)
+app.include_router(profiler.router)
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,217 @@
+"""Market state checkpoints for a fast warm start.
+
+`MarketsCheckpointer` periodically writes the token balances of every chain (and the
+price levels snapshot version) to a compact local JSON file::
+
+    {"v": 1, "ts": 1700000000.0, "levels_version": 42,
+     "chains": {"42161": {"block": 250000000, "head": 250000002,
+                          "tokens": [["0xaf88...", "1000000", 250000000, "500000"], ...]}}}
+
+with one `[token address, raw balance, block, raw allowance]` entry per token (the
+allowance is null while unknown, and optional in older checkpoints). On startup `load()`
+restores the balances before the chain services connect and marks the chains
+`balances_restored`: they are usable for quoting while their block is at most
+`max_age_blocks` behind the chain head, and the first full refresh of the chain
+(started right away by `ERC20Service`) reconciles them with the chain in the
+background. Files are written atomically (temporary file and rename) off the loop.
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.schemas.chain import Chain
+
+from .levels import LevelsSnapshot
+from .markets import MarketState
+
+log = getLogger(__name__)
+
+CHECKPOINT_FORMAT_VERSION = 1
+CHECKPOINT_INTERVAL = 30.0  # seconds between checkpoints
+CHECKPOINT_MAX_AGE_BLOCKS = 300  # blocks restored balances may trail the head and be quoted
+
+
+@dataclass(slots=True)
+class CheckpointConfig:
+    """Market state checkpoint settings, disabled without `path`."""
+
+    path: Optional[str] = None
+    interval: float = CHECKPOINT_INTERVAL
+    max_age_blocks: int = CHECKPOINT_MAX_AGE_BLOCKS
+
+    @classmethod
+    def from_env(cls) -> "CheckpointConfig":
+        """Create from `MARKETS_CHECKPOINT` (file path, unset disables checkpoints),
+        `MARKETS_CHECKPOINT_INTERVAL` and `MARKETS_CHECKPOINT_MAX_AGE_BLOCKS` env vars."""
+        return cls(
+            path=os.getenv("MARKETS_CHECKPOINT") or None,
+            interval=float(os.getenv("MARKETS_CHECKPOINT_INTERVAL", str(CHECKPOINT_INTERVAL))),
+            max_age_blocks=int(
+                os.getenv("MARKETS_CHECKPOINT_MAX_AGE_BLOCKS", str(CHECKPOINT_MAX_AGE_BLOCKS))
+            ),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether checkpoints are written and loaded."""
+        return bool(self.path)
+
+
+def write_file(path: str, data: bytes) -> None:
+    """Replace `path` with `data` atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_file(path: str) -> Optional[bytes]:
+    """Content of `path`, None if it does not exist."""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def parse_token_entry(item: List[Any]) -> Tuple[int, int, Optional[int]]:
+    """Raw balance, block and raw allowance of a checkpointed token entry, see module."""
+    _, raw_balance, block, *allowance = item
+    raw_allowance = allowance[0] if allowance else None
+    return int(raw_balance), int(block), None if raw_allowance is None else int(raw_allowance)
+
+
+class MarketsCheckpointer:
+    """Writes and restores market state checkpoints, see module docstring."""
+
+    markets: MarketState
+    chains: Iterable[Chain]
+    cfg: CheckpointConfig
+
+    def __init__(self, markets: MarketState, chains: Iterable[Chain], cfg: CheckpointConfig):
+        self.markets = markets
+        self.chains = chains
+        self.cfg = cfg
+
+    def dump(self) -> Dict[str, Any]:
+        """Checkpoint of the chains whose balances were read at least once."""
+        chains: Dict[str, Any] = {}
+        for chain in self.chains:
+            if not chain.active or not chain.balances_block:
+                continue
+            chains[str(chain.id)] = {
+                "block": chain.balances_block,
+                "head": chain.head_block,
+                "tokens": [
+                    # balances above 2**53 do not survive JSON readers as numbers
+                    [
+                        token.address,
+                        str(token.raw_balance),
+                        token.last_updated_block,
+                        None if token.raw_allowance is None else str(token.raw_allowance),
+                    ]
+                    for token in self.markets.get_tokens_by_chain_id(chain.id)
+                    if token.last_updated_block
+                ],
+            }
+        return {
+            "v": CHECKPOINT_FORMAT_VERSION,
+            "ts": time.time(),
+            "levels_version": self.markets.levels.snapshot.version,
+            "chains": chains,
+        }
+
+    def restore(self, data: Dict[str, Any]) -> int:
+        """Apply a checkpoint to chains not read yet, returns the number of restored
+        token balances. Tokens unknown to the markets graph are skipped.
+
+        Raises:
+            ValueError: if the checkpoint is malformed or of another format version
+        """
+        if data.get("v") != CHECKPOINT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {data.get('v')!r}")
+        # parsed entirely before anything is applied
+        try:
+            entries = []
+            for chain in self.chains:
+                entry = data["chains"].get(str(chain.id))
+                if not chain.active or entry is None or chain.balances_block:
+                    continue
+                balances = [
+                    (self.markets.get_token(item[0], chain.id), parse_token_entry(item))
+                    for item in entry["tokens"]
+                ]
+                entries.append((chain, int(entry["block"]), int(entry["head"]), balances))
+            levels_version = int(data["levels_version"])
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError(f"Malformed checkpoint: {e!r}") from e
+        restored = 0
+        for chain, balances_block, head_block, balances in entries:
+            for token, state in balances:
+                if token is not None:
+                    token.raw_balance, token.last_updated_block, token.raw_allowance = state
+                    restored += 1
+            chain.balances_block = balances_block
+            chain.head_block = max(chain.head_block, head_block)
+            chain.balances_restored = True
+        levels = self.markets.levels
+        if levels.snapshot.version < levels_version:
+            # keep snapshot versions increasing across restarts
+            levels.snapshot = LevelsSnapshot(version=levels_version, pairs=levels.snapshot.pairs)
+        return restored
+
+    async def load(self) -> int:
+        """Restore the checkpoint file if any, returns the number of restored balances.
+        A missing or unreadable checkpoint is logged and ignored."""
+        if not self.cfg.path:
+            return 0
+        try:
+            raw = await asyncio.to_thread(read_file, self.cfg.path)
+            if raw is None:
+                log.info("No market state checkpoint at %s", self.cfg.path)
+                return 0
+            data = json.loads(raw)
+            if not isinstance(data, dict):
+                raise ValueError("Checkpoint must be a JSON object")
+            restored = self.restore(data)
+        except (OSError, ValueError) as e:
+            log.error("Ignoring market state checkpoint %s: %s", self.cfg.path, e)
+            return 0
+        log.info(
+            "Restored %d token balances from %s (written %.0fs ago)",
+            restored,
+            self.cfg.path,
+            time.time() - float(data.get("ts", 0)),
+        )
+        return restored
+
+    async def save(self) -> None:
+        """Write the checkpoint file."""
+        if not self.cfg.path:
+            return
+        data = json.dumps(self.dump(), separators=(",", ":")).encode()
+        await asyncio.to_thread(write_file, self.cfg.path, data)
+        log.debug("Market state checkpoint written to %s (%d bytes)", self.cfg.path, len(data))
+
+    async def run(self) -> None:
+        """Write a checkpoint every `interval` seconds until cancelled, and a last one
+        when cancelled."""
+        if not self.cfg.path:
+            return
+        try:
+            while True:
+                await asyncio.sleep(self.cfg.interval)
+                try:
+                    await self.save()
+                except OSError as e:
+                    log.error("Failed to write market state checkpoint: %s", e)
+        finally:
+            try:
+                await asyncio.shield(self.save())
+            except (OSError, asyncio.CancelledError) as e:
+                log.error("Failed to write the last market state checkpoint: %r", e)
@@ -0,0 +1,102 @@
+"""Cumulative depth curves for O(log n) depth-aware pricing.
+
+A curve is a piecewise-linear function stored as two sorted integer arrays:
+`xs[i]` is the cumulative amount of the input token consumed by the first `i` levels
+and `ys[i]` the cumulative amount of the output token they yield (`xs[0] == ys[0] == 0`).
+Amounts are fixed-point integers with `CURVE_DECIMALS` decimals, independent of token decimals.
+Both arrays are sorted, so the inverse curve is the same points swapped.
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from decimal import Decimal, localcontext
+from typing import Iterable, Optional, Tuple
+
+CURVE_DECIMALS = 18
+CURVE_SCALE = 10**CURVE_DECIMALS
+
+
+def decimals_scale(decimals: int) -> int:
+    """`10**decimals` for `decimals` >= 0."""
+    scale: int = 10**decimals
+    return scale
+
+
+def raw_to_curve(raw_amount: int, decimals: int) -> int:
+    """Convert raw token amount to curve fixed-point units (rounding down)."""
+    if decimals <= CURVE_DECIMALS:
+        return raw_amount * decimals_scale(CURVE_DECIMALS - decimals)
+    return raw_amount // decimals_scale(decimals - CURVE_DECIMALS)
+
+
+def curve_to_raw(curve_amount: int, decimals: int, round_up: bool = False) -> int:
+    """Convert curve fixed-point units to raw token amount (rounding down by default)."""
+    if decimals <= CURVE_DECIMALS:
+        scale = decimals_scale(CURVE_DECIMALS - decimals)
+        return -(-curve_amount // scale) if round_up else curve_amount // scale
+    return curve_amount * decimals_scale(decimals - CURVE_DECIMALS)
+
+
+@dataclass(frozen=True, slots=True)
+class DepthCurve:
+    """Cumulative depth curve, see module docstring.
+
+    `round_up` makes interpolated outputs round up instead of down, which is what
+    an inverse curve needs: the input required for a given output must never be undersold."""
+
+    xs: Tuple[int, ...]
+    ys: Tuple[int, ...]
+    round_up: bool = False
+
+    @classmethod
+    def from_levels(cls, levels: Iterable[Tuple[Decimal, Decimal]]) -> "DepthCurve":
+        """Build from incremental `(amount, price)` levels in decimal units.
+
+        Each level consumes `amount` of the input token and yields `amount * price`
+        of the output token. Cumulative sums are exact, rounded down only once per point.
+        """
+        xs = [0]
+        ys = [0]
+        with localcontext() as ctx:
+            ctx.prec = 100  # enough to keep 256-bit fixed-point amounts exact
+            cum_x = Decimal(0)
+            cum_y = Decimal(0)
+            for amount, price in levels:
+                cum_x += amount
+                cum_y += amount * price
+                xs.append(int(cum_x.scaleb(CURVE_DECIMALS)))
+                ys.append(int(cum_y.scaleb(CURVE_DECIMALS)))
+        return cls(xs=tuple(xs), ys=tuple(ys))
+
+    def inverse(self) -> "DepthCurve":
+        """Curve mapping output amounts back to the required input amounts (rounded up)."""
+        return DepthCurve(xs=self.ys, ys=self.xs, round_up=not self.round_up)
+
+    @property
+    def depth(self) -> int:
+        """Maximum input amount the curve can absorb."""
+        return self.xs[-1]
+
+    @property
+    def best_rate(self) -> float:
+        """Output per input of the first (best) level, 0.0 for an empty curve."""
+        if len(self.xs) < 2:
+            return 0.0
+        return self.ys[1] / self.xs[1]
+
+    def evaluate(self, x: int) -> Optional[int]:
+        """Output amount for input amount `x` (rounded down unless `round_up`).
+
+        Returns:
+            Output amount or None if `x` exceeds the curve depth
+        """
+        xs = self.xs
+        if x > xs[-1] or x < 0:
+            return None
+        i = bisect_left(xs, x)
+        if xs[i] == x:
+            return self.ys[i]
+        x0, y0 = xs[i - 1], self.ys[i - 1]
+        if self.round_up:
+            return y0 - (-(x - x0) * (self.ys[i] - y0) // (xs[i] - x0))
+        return y0 + (x - x0) * (self.ys[i] - y0) // (xs[i] - x0)
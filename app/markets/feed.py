@@ -0,0 +1,208 @@
+"""Streaming price levels ingestion feeding the `LevelsCache`.
+
+Sources put raw updates into a queue, `LevelsFeed` drains it, coalesces everything
+that is already queued into one snapshot version and publishes it.
+Update format is one JSON object per line, see `PairLevels.from_dict`.
+"""
+
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from logging import getLogger
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from app.metrics.metrics import metrics
+
+from .levels import LevelsCache, PairLevels
+
+LEVELS_SOURCE_ENV = "LEVELS_SOURCE"
+LEVELS_FILE_POLL_INTERVAL = 0.1  # seconds, how often to poll the tailed file for new lines
+
+log = getLogger(__name__)
+
+RawUpdate = Tuple[float, Union[str, bytes]]  # (time.monotonic() of receipt, raw JSON line)
+
+
+class LevelsSource(ABC):
+    """Base class of price levels sources. Subclasses fill `queue` from `run()`."""
+
+    queue: asyncio.Queue[RawUpdate]
+
+    def __init__(self) -> None:
+        self.queue = asyncio.Queue()
+
+    def put_line(self, line: Union[str, bytes]) -> None:
+        """Enqueue one raw update line stamped with its receipt time."""
+        if line.strip():
+            self.queue.put_nowait((time.monotonic(), line))
+
+    @abstractmethod
+    async def run(self) -> None:
+        """Produce updates until cancelled."""
+
+
+class PusherSource(LevelsSource):
+    """In-process source, updates are pushed by the caller."""
+
+    def push(self, update: Union[str, bytes]) -> None:
+        """Push a raw JSON update."""
+        self.put_line(update)
+
+    async def run(self) -> None:
+        """Nothing to do, updates are pushed directly into the queue."""
+        await asyncio.Event().wait()
+
+
+class FileTailSource(LevelsSource):
+    """Follows a local file with one JSON update per line (reopens it when truncated)."""
+
+    def __init__(self, path: str, poll_interval: float = LEVELS_FILE_POLL_INTERVAL) -> None:
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+
+    def read_appended(self, position: int) -> Tuple[int, bytes]:
+        """Bytes appended to the file after `position` and the position they start at,
+        0 if the file was truncated below `position`. Blocking, run in a thread."""
+        size = os.stat(self.path).st_size
+        if size < position:
+            position = 0
+        if size == position:
+            return position, b""
+        with open(self.path, "rb") as f:
+            f.seek(position)
+            return position, f.read(size - position)
+
+    async def run(self) -> None:
+        """Read existing lines, then poll for appended ones."""
+        position = 0
+        partial = b""
+        while True:
+            try:
+                start, chunk = await asyncio.to_thread(self.read_appended, position)
+                if start < position:
+                    log.info("Levels file %s truncated, reading from start", self.path)
+                    partial = b""
+                position = start + len(chunk)
+                *lines, partial = (partial + chunk).split(b"\n")
+                for line in lines:
+                    self.put_line(line)
+            except FileNotFoundError:
+                position, partial = 0, b""
+            await asyncio.sleep(self.poll_interval)
+
+
+class SocketSource(LevelsSource):
+    """Local TCP or unix socket server accepting newline-delimited JSON updates."""
+
+    def __init__(self, host: Optional[str] = None, port: int = 0, path: Optional[str] = None):
+        super().__init__()
+        assert path or host, "Either unix socket path or TCP host must be set"
+        self.host = host
+        self.port = port
+        self.path = path
+        self.server: Optional[asyncio.Server] = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                self.put_line(line)
+        finally:
+            writer.close()
+
+    async def start(self) -> asyncio.Server:
+        """Start listening (idempotent)."""
+        if self.server is None:
+            if self.path:
+                self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+            else:
+                self.server = await asyncio.start_server(self._handle, self.host, self.port)
+            log.info("Price levels socket source listening on %s", self.server.sockets[0])
+        return self.server
+
+    async def run(self) -> None:
+        """Serve connections until cancelled."""
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+
+def levels_source_from_url(url: str) -> LevelsSource:
+    """Build a source from its URL.
+
+    Supported: `file:/path/levels.jsonl`, `tcp://127.0.0.1:9100`, `unix:/path/levels.sock`,
+    `push:` (in-process).
+
+    Raises:
+        ValueError: on unsupported URL
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "file" and parsed.path:
+        return FileTailSource(parsed.path)
+    if parsed.scheme == "tcp" and parsed.hostname and parsed.port:
+        return SocketSource(host=parsed.hostname, port=parsed.port)
+    if parsed.scheme == "unix" and parsed.path:
+        return SocketSource(path=parsed.path)
+    if parsed.scheme == "push":
+        return PusherSource()
+    raise ValueError(f"Unsupported price levels source: {url}")
+
+
+def levels_source_from_env() -> LevelsSource:
+    """Build a source from `LEVELS_SOURCE` env var, in-process pusher by default."""
+    url = os.getenv(LEVELS_SOURCE_ENV)
+    if not url:
+        log.warning("%s env var is not set, no price levels will be ingested", LEVELS_SOURCE_ENV)
+        return PusherSource()
+    return levels_source_from_url(url)
+
+
+class LevelsFeed:
+    """Consumes a `LevelsSource` and publishes versioned snapshots into a `LevelsCache`."""
+
+    cache: LevelsCache
+    source: LevelsSource
+
+    def __init__(self, cache: LevelsCache, source: LevelsSource) -> None:
+        self.cache = cache
+        self.source = source
+
+    def _drain(self, first: RawUpdate) -> List[Tuple[float, PairLevels]]:
+        """Parse the first and all already queued updates, the last update of a pair wins."""
+        pending: Dict[Tuple[int, str, str], Tuple[float, PairLevels]] = {}
+        raw_updates = [first]
+        while not self.source.queue.empty():
+            raw_updates.append(self.source.queue.get_nowait())
+        for received_at, raw in raw_updates:
+            try:
+                pair = PairLevels.from_json(raw, received_at)
+            except ValueError as e:
+                log.error("Invalid price levels update: %s", e)
+                metrics.levels_updates_total.labels(status="INVALID").inc()
+                continue
+            pending[pair.key] = (received_at, pair)
+            metrics.levels_updates_total.labels(status="OK").inc()
+        return list(pending.values())
+
+    def apply(self, first: RawUpdate) -> None:
+        """Publish a new snapshot with the first and all already queued updates."""
+        updates = self._drain(first)
+        if not updates:
+            return
+        snapshot = self.cache.publish(pair for _, pair in updates)
+        visible_at = time.monotonic()
+        for received_at, _ in updates:
+            metrics.levels_update_latency.observe(visible_at - received_at)
+        metrics.levels_snapshot_version.set(snapshot.version)
+        log.debug("Price levels snapshot v%d published, %d pairs", snapshot.version, len(updates))
+
+    async def run(self) -> None:
+        """Run the source and publish its updates until cancelled."""
+        source_task = asyncio.create_task(self.source.run())
+        try:
+            while True:
+                self.apply(await self.source.queue.get())
+        finally:
+            source_task.cancel()
@@ -0,0 +1,195 @@
+"""Versioned price levels cache.
+
+Levels are published as immutable snapshots: every update builds a new
+`LevelsSnapshot` and swaps the reference held by `LevelsCache`. Readers (the quoter)
+grab `cache.snapshot` once and work with a consistent view without any locking.
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from .curves import DepthCurve, curve_to_raw, raw_to_curve
+
+PairKey = Tuple[int, str, str]  # (chain_id, base token address, quote token address), lowercase
+
+
+def pair_key(chain_id: int, base_token: str, quote_token: str) -> PairKey:
+    """Build a case-insensitive snapshot key for a token pair."""
+    return chain_id, base_token.lower(), quote_token.lower()
+
+
+@dataclass(frozen=True, slots=True)
+class PriceLevel:
+    """A single price level: `amount` of base token offered at `price` quote per base."""
+
+    amount: Decimal
+    price: Decimal
+
+
+@dataclass(frozen=True, slots=True)
+class PairLevels:
+    """Price levels of one pair, ordered from the best to the worst price.
+
+    Amounts are incremental, i.e. the second level is only reached
+    after the first one is fully consumed. `curve` is the cumulative depth curve
+    precomputed from the levels (base token in, quote token out) and `inverse_curve`
+    its inverse (quote token out, base token in) for exact-out RFQs."""
+
+    chain_id: int
+    base_token: str
+    quote_token: str
+    levels: Tuple[PriceLevel, ...]
+    curve: DepthCurve
+    inverse_curve: DepthCurve
+    received_at: float = field(default=0.0, compare=False)  # time.monotonic() of receipt
+
+    @property
+    def key(self) -> PairKey:
+        """Snapshot key of the pair."""
+        return pair_key(self.chain_id, self.base_token, self.quote_token)
+
+    @classmethod
+    def build(  # pylint: disable=too-many-arguments  # the fields not derived from levels
+        cls,
+        chain_id: int,
+        base_token: str,
+        quote_token: str,
+        levels: Tuple[PriceLevel, ...],
+        *,
+        received_at: Optional[float] = None,
+    ) -> "PairLevels":
+        """Build with the depth curves precomputed from `levels`."""
+        curve = DepthCurve.from_levels((lvl.amount, lvl.price) for lvl in levels)
+        return cls(
+            chain_id=chain_id,
+            base_token=base_token,
+            quote_token=quote_token,
+            levels=levels,
+            curve=curve,
+            inverse_curve=curve.inverse(),
+            received_at=time.monotonic() if received_at is None else received_at,
+        )
+
+    def quote_for_base(
+        self, base_raw_amount: int, base_decimals: int, quote_decimals: int
+    ) -> Optional[int]:
+        """Raw quote token amount for selling `base_raw_amount` of base token, O(log n).
+
+        Returns:
+            Raw quote token amount (rounded down) or None if levels are not deep enough
+        """
+        quote_amount = self.curve.evaluate(raw_to_curve(base_raw_amount, base_decimals))
+        if quote_amount is None:
+            return None
+        return curve_to_raw(quote_amount, quote_decimals)
+
+    def base_for_quote(
+        self, quote_raw_amount: int, base_decimals: int, quote_decimals: int
+    ) -> Optional[int]:
+        """Raw base token amount required to buy `quote_raw_amount` of quote token, O(log n).
+
+        Returns:
+            Raw base token amount (rounded up) or None if levels are not deep enough
+        """
+        base_amount = self.inverse_curve.evaluate(raw_to_curve(quote_raw_amount, quote_decimals))
+        if base_amount is None:
+            return None
+        return curve_to_raw(base_amount, base_decimals, round_up=True)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], received_at: Optional[float] = None) -> "PairLevels":
+        """Build from a decoded update message.
+
+        Expected format::
+
+            {"chainId": 42161, "baseToken": "0x...", "quoteToken": "0x...",
+             "levels": [["1000", "0.9998"], ["5000", "0.9995"]]}
+
+        where each level is `[base amount, price]` in human (decimal) units.
+
+        Raises:
+            ValueError: if the message is malformed
+        """
+        try:
+            chain_id = data["chainId"]
+            if not isinstance(chain_id, int) or isinstance(chain_id, bool):
+                raise ValueError("chainId must be an integer")
+            base_token = data["baseToken"]
+            quote_token = data["quoteToken"]
+            if not isinstance(base_token, str) or not isinstance(quote_token, str):
+                raise ValueError("baseToken and quoteToken must be strings")
+            levels = tuple(
+                PriceLevel(amount=Decimal(str(amount)), price=Decimal(str(price)))
+                for amount, price in data["levels"]
+            )
+        except (KeyError, TypeError, InvalidOperation) as e:
+            raise ValueError(f"Malformed price levels update: {e!r}") from e
+        if any(not lvl.amount.is_finite() or lvl.amount <= 0 for lvl in levels):
+            raise ValueError("Level amounts must be positive")
+        if any(not lvl.price.is_finite() or lvl.price <= 0 for lvl in levels):
+            raise ValueError("Level prices must be positive")
+        return cls.build(chain_id, base_token, quote_token, levels, received_at=received_at)
+
+    @classmethod
+    def from_json(
+        cls, raw: Union[str, bytes], received_at: Optional[float] = None
+    ) -> "PairLevels":
+        """Build from a raw JSON update message, see `from_dict`."""
+        data = json.loads(raw)
+        if not isinstance(data, dict):
+            raise ValueError("Price levels update must be a JSON object")
+        return cls.from_dict(data, received_at)
+
+
+@dataclass(frozen=True, slots=True)
+class LevelsSnapshot:
+    """Immutable view of all pairs' price levels."""
+
+    version: int = 0
+    pairs: Mapping[PairKey, PairLevels] = field(default_factory=lambda: MappingProxyType({}))
+
+    def get(self, chain_id: int, base_token: str, quote_token: str) -> Optional[PairLevels]:
+        """Get price levels of a pair if known."""
+        return self.pairs.get(pair_key(chain_id, base_token, quote_token))
+
+
+LevelsListener = Callable[[LevelsSnapshot, List[PairLevels]], None]
+
+
+class LevelsCache:
+    """Holder of the latest `LevelsSnapshot`.
+
+    Only the owner (`LevelsFeed`) publishes, readers just read `snapshot`.
+    Listeners are notified synchronously with the new snapshot and the updated pairs."""
+
+    snapshot: LevelsSnapshot
+    listeners: List[LevelsListener]
+
+    def __init__(self) -> None:
+        self.snapshot = LevelsSnapshot()
+        self.listeners = []
+
+    def add_listener(self, listener: LevelsListener) -> None:
+        """Register a callback invoked after each publish."""
+        self.listeners.append(listener)
+
+    def publish(self, updates: Iterable[PairLevels]) -> LevelsSnapshot:
+        """Build a new snapshot with `updates` applied and make it visible atomically.
+
+        Pairs updated with empty levels are removed from the snapshot."""
+        pairs = dict(self.snapshot.pairs)
+        updates = list(updates)
+        for pair in updates:
+            if pair.levels:
+                pairs[pair.key] = pair
+            else:
+                pairs.pop(pair.key, None)
+        snapshot = LevelsSnapshot(version=self.snapshot.version + 1, pairs=MappingProxyType(pairs))
+        self.snapshot = snapshot
+        for listener in self.listeners:
+            listener(snapshot, updates)
+        return snapshot
@@ -1,3 +1,4 @@
+from logging import getLogger
 from typing import Generator, List, Optional
 
 import networkx as nx
@@ -5,15 +6,25 @@ import networkx as nx
 from app.evm.chains import arbitrum, ethereum
 from app.schemas.token import ERC20Token
 
+from .levels import LevelsCache, LevelsSnapshot, PairLevels
+
+log = getLogger(__name__)
+
 
 class MarketState:  # pylint: disable=too-few-public-methods
-    """Singleton class to hold the market state (prices) graph"""
+    """Singleton class to hold the market state (prices) graph and price levels cache.
+
+    Graph edges are directed (base token -> quote token) and weigh one hop each. Once price
+    levels are ingested they also carry the pair's best `rate` and `depth`."""
 
-    graph: nx.Graph
+    graph: nx.DiGraph
+    levels: LevelsCache
 
     def __init__(self) -> None:
         """Initialize a trivial single-weighted graph for stablecoin swaps 1:1"""
-        self.graph = nx.Graph()
+        self.levels = LevelsCache()
+        self.levels.add_listener(self.on_levels_published)
+        self.graph = nx.DiGraph()
         self.graph.add_edge(arbitrum.USDT, arbitrum.USDC, weight=1.0)
         self.graph.add_edge(arbitrum.USDC, arbitrum.USDT, weight=1.0)
         self.graph.add_edge(arbitrum.USDT, arbitrum.DAI, weight=1.0)
@@ -27,6 +38,29 @@ class MarketState:  # pylint: disable=too-few-public-methods
         self.graph.add_edge(ethereum.USDC, ethereum.DAI, weight=1.0)
         self.graph.add_edge(ethereum.DAI, ethereum.USDC, weight=1.0)
 
+    def on_levels_published(self, _snapshot: LevelsSnapshot, updates: List[PairLevels]) -> None:
+        """Update the edges of the updated pairs from their depth curves.
+
+        An edge carries the best (top level) rate and the depth of its pair, its weight stays
+        one hop: rates multiply along a path and are not a distance to minimize. Pairs left
+        without levels lose their edge, pairs of tokens unknown to the graph are skipped."""
+        for pair in updates:
+            base_token = self.get_token(pair.base_token, pair.chain_id)
+            quote_token = self.get_token(pair.quote_token, pair.chain_id)
+            if not base_token or not quote_token:
+                log.debug("Skipping levels of unknown pair %s", pair.key)
+                continue
+            if pair.levels:
+                self.graph.add_edge(
+                    base_token,
+                    quote_token,
+                    weight=1.0,
+                    rate=pair.curve.best_rate,
+                    depth=pair.curve.depth,
+                )
+            elif self.graph.has_edge(base_token, quote_token):
+                self.graph.remove_edge(base_token, quote_token)
+
     def get_tokens_by_chain_id(self, chain_id: int) -> Generator[ERC20Token, None, None]:
         """Generator that yields all tokens for a specific chain."""
         for node in self.graph.nodes():
@@ -45,7 +79,7 @@ class MarketState:  # pylint: disable=too-few-public-methods
         return None
 
     def shortest_path(self, source: ERC20Token, target: ERC20Token) -> Optional[List[ERC20Token]]:
-        """Find the shortest path between two tokens."""
+        """Find the path between two tokens with the fewest hops."""
         try:
             path = nx.shortest_path(self.graph, source=source, target=target, weight="weight")
             if isinstance(path, list) and all(isinstance(node, ERC20Token) for node in path):
@@ -0,0 +1,130 @@
+"""Tests for market state checkpoints."""
+
+import asyncio
+import json
+
+import pytest
+
+from app.markets.checkpoint import CheckpointConfig, MarketsCheckpointer
+from app.markets.levels import PairLevels
+from app.markets.markets import MarketState
+from app.schemas.chain import Chain
+from app.sim.chain_bench import synthetic_chain
+
+
+def market(chain: Chain) -> MarketState:
+    markets = MarketState()
+    for base, quote in zip(chain.tokens, chain.tokens[1:]):
+        markets.graph.add_edge(base, quote, weight=1.0)
+    return markets
+
+
+@pytest.fixture
+def cfg(tmp_path) -> CheckpointConfig:
+    return CheckpointConfig(path=str(tmp_path / "markets.ckpt"), interval=0.01)
+
+
+def test_checkpoint_config_from_env(monkeypatch):
+    monkeypatch.delenv("MARKETS_CHECKPOINT", raising=False)
+    assert not CheckpointConfig.from_env().enabled
+    monkeypatch.setenv("MARKETS_CHECKPOINT", "/tmp/markets.ckpt")
+    monkeypatch.setenv("MARKETS_CHECKPOINT_INTERVAL", "5")
+    monkeypatch.setenv("MARKETS_CHECKPOINT_MAX_AGE_BLOCKS", "50")
+    assert CheckpointConfig.from_env() == CheckpointConfig("/tmp/markets.ckpt", 5.0, 50)
+
+
+async def test_checkpoint_round_trip(cfg):
+    chain = synthetic_chain(3, "ws://127.0.0.1:1")
+    markets = market(chain)
+    for i, token in enumerate(chain.tokens):
+        token.raw_balance, token.last_updated_block = 10**30 + i, 100
+    chain.tokens[0].raw_allowance = 2**256 - 1
+    chain.balances_block, chain.head_block = 100, 102
+    levels = [("1000", "0.99")]
+    base, quote = chain.tokens[0].address, chain.tokens[1].address
+    markets.levels.publish(
+        [
+            PairLevels.from_dict(
+                {"chainId": chain.id, "baseToken": base, "quoteToken": quote, "levels": levels}
+            )
+        ]
+    )
+    await MarketsCheckpointer(markets, [chain], cfg).save()
+
+    # a restart: same tokens, nothing read yet
+    restarted = synthetic_chain(3, "ws://127.0.0.1:1")
+    restarted_markets = market(restarted)
+    assert await MarketsCheckpointer(restarted_markets, [restarted], cfg).load() == 3
+    assert [token.raw_balance for token in restarted.tokens] == [10**30, 10**30 + 1, 10**30 + 2]
+    assert {token.last_updated_block for token in restarted.tokens} == {100}
+    assert [token.raw_allowance for token in restarted.tokens] == [2**256 - 1, None, None]
+    assert (restarted.balances_block, restarted.head_block) == (100, 102)
+    assert restarted.balances_restored
+    assert restarted_markets.levels.snapshot.version == 1
+
+
+async def test_checkpoint_skips_unread_chains_and_unknown_tokens(cfg):
+    chain = synthetic_chain(3, "ws://127.0.0.1:1")
+    markets = market(chain)
+    checkpointer = MarketsCheckpointer(markets, [chain], cfg)
+    assert checkpointer.dump()["chains"] == {}  # never read, zeros are not checkpointed
+    for token in chain.tokens:
+        token.raw_balance, token.last_updated_block = 7, 100
+    chain.balances_block = 100
+    await checkpointer.save()
+
+    restarted = synthetic_chain(2, "ws://127.0.0.1:1")  # one token less
+    assert await MarketsCheckpointer(market(restarted), [restarted], cfg).load() == 2
+    # chains read since the start are not overwritten
+    read = synthetic_chain(3, "ws://127.0.0.1:1")
+    read.balances_block = 200
+    assert await MarketsCheckpointer(market(read), [read], cfg).load() == 0
+    assert not read.balances_restored
+
+
+@pytest.mark.parametrize(
+    "content",
+    [b"not json", b"[]", b'{"v": 99}', b'{"v": 1, "chains": {"31337": {"block": 1}}}'],
+)
+async def test_unusable_checkpoint_ignored(cfg, content):
+    with open(cfg.path, "wb") as f:
+        f.write(content)
+    chain = synthetic_chain(1, "ws://127.0.0.1:1")
+    assert await MarketsCheckpointer(market(chain), [chain], cfg).load() == 0
+    assert not chain.balances_restored and chain.balances_block == 0
+
+
+async def test_missing_checkpoint(cfg):
+    chain = synthetic_chain(1, "ws://127.0.0.1:1")
+    assert await MarketsCheckpointer(market(chain), [chain], cfg).load() == 0
+
+
+async def test_periodic_and_last_checkpoint(cfg):
+    chain = synthetic_chain(2, "ws://127.0.0.1:1")
+    markets = market(chain)
+    for token in chain.tokens:
+        token.raw_balance, token.last_updated_block = 1, 100
+    chain.balances_block = 100
+    task = asyncio.create_task(MarketsCheckpointer(markets, [chain], cfg).run())
+    await asyncio.sleep(0.05)
+    with open(cfg.path, "rb") as f:
+        assert json.loads(f.read())["chains"]["31337"]["block"] == 100
+    chain.tokens[0].raw_balance, chain.tokens[0].last_updated_block = 2, 101
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    with open(cfg.path, "rb") as f:
+        tokens = json.loads(f.read())["chains"]["31337"]["tokens"]
+    assert tokens[0] == [chain.tokens[0].address, "2", 101, None]
+
+
+async def test_checkpoint_without_allowances(cfg):
+    chain = synthetic_chain(2, "ws://127.0.0.1:1")
+    token = chain.tokens[0]
+    data = {
+        "v": 1,
+        "levels_version": 0,
+        "chains": {"31337": {"block": 100, "head": 100, "tokens": [[token.address, "7", 100]]}},
+    }
+    assert MarketsCheckpointer(market(chain), [chain], cfg).restore(data) == 1
+    assert (token.raw_balance, token.raw_allowance) == (7, None)
@@ -0,0 +1,81 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from app.markets.curves import DepthCurve, curve_to_raw, raw_to_curve
+
+
+def linear_walk(levels, x: Decimal) -> Decimal:
+    """Reference implementation walking the levels one by one."""
+    out = Decimal(0)
+    for amount, price in levels:
+        fill = min(x, amount)
+        out += fill * price
+        x -= fill
+    return out
+
+
+def test_empty_curve():
+    curve = DepthCurve.from_levels([])
+    assert curve.depth == 0
+    assert curve.best_rate == 0.0
+    assert curve.evaluate(0) == 0
+    assert curve.evaluate(1) is None
+
+
+def test_curve_points_and_interpolation():
+    curve = DepthCurve.from_levels([(Decimal(10), Decimal(2)), (Decimal(10), Decimal(1))])
+    assert curve.xs == (0, 10 * 10**18, 20 * 10**18)
+    assert curve.ys == (0, 20 * 10**18, 30 * 10**18)
+    assert curve.best_rate == 2.0
+    assert curve.depth == 20 * 10**18
+    assert curve.evaluate(0) == 0
+    assert curve.evaluate(5 * 10**18) == 10 * 10**18
+    assert curve.evaluate(10 * 10**18) == 20 * 10**18
+    assert curve.evaluate(15 * 10**18) == 25 * 10**18
+    assert curve.evaluate(20 * 10**18) == 30 * 10**18
+    assert curve.evaluate(20 * 10**18 + 1) is None
+    assert curve.evaluate(-1) is None
+
+
+def test_curve_matches_linear_walk_with_thousands_of_levels():
+    rnd = random.Random(42)
+    price = Decimal("3000")
+    levels = []
+    for _ in range(5000):
+        levels.append((Decimal(rnd.randint(1, 10**6)) / 1000, price))
+        price -= Decimal(rnd.randint(0, 100)) / 10000
+    curve = DepthCurve.from_levels(levels)
+    assert len(curve.xs) == 5001
+    for _ in range(200):
+        x = rnd.randint(0, curve.depth)
+        expected = linear_walk(levels, Decimal(x).scaleb(-18))
+        y = curve.evaluate(x)
+        assert y is not None
+        # interpolation rounds down by at most one unit of the curve precision
+        assert abs(Decimal(y).scaleb(-18) - expected) <= Decimal("1e-18")
+
+
+@pytest.mark.parametrize("decimals", [0, 6, 8, 18, 24])
+def test_raw_curve_conversions(decimals):
+    raw = 123456789 * 10**decimals
+    assert curve_to_raw(raw_to_curve(raw, decimals), decimals) == raw
+    assert curve_to_raw(raw_to_curve(raw, decimals) + 1, decimals, round_up=True) >= raw
+    assert raw_to_curve(10**decimals, decimals) == 10**18
+
+
+def test_inverse_curve_rounds_up():
+    curve = DepthCurve.from_levels([(Decimal(3), Decimal(1)), (Decimal(3), Decimal("0.5"))])
+    inverse = curve.inverse()
+    assert inverse.xs == curve.ys
+    assert inverse.ys == curve.xs
+    assert inverse.round_up
+    assert inverse.inverse() == curve
+    assert inverse.evaluate(4 * 10**18) == 5 * 10**18
+    assert inverse.evaluate(4 * 10**18 + 1) == 5 * 10**18 + 2
+    assert inverse.evaluate(45 * 10**17 + 1) is None
+    assert inverse.evaluate(1) == 1
+    x = inverse.evaluate(10**18 + 7)
+    assert x is not None
+    assert (curve.evaluate(x) or 0) >= 10**18 + 7
@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+import pytest
+
+from app.markets.feed import (
+    FileTailSource,
+    LevelsFeed,
+    LevelsSource,
+    PusherSource,
+    SocketSource,
+    levels_source_from_url,
+)
+from app.markets.levels import LevelsCache
+from app.metrics.metrics import metrics
+
+USDT = "0xFd086bC7CD5C481DCC9C85ebE478A1C0b69FCbb9"
+USDC = "0xaf88d065e77c8cC2239327C5EDb3A432268e5831"
+
+
+def update(price: str, base: str = USDT, quote: str = USDC) -> str:
+    return json.dumps(
+        {"chainId": 42161, "baseToken": base, "quoteToken": quote, "levels": [["100", price]]}
+    )
+
+
+async def wait_for_version(cache: LevelsCache, version: int) -> None:
+    async def _wait() -> None:
+        while cache.snapshot.version < version:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(_wait(), timeout=2)
+
+
+def best_price(cache: LevelsCache) -> str:
+    pair = cache.snapshot.get(42161, USDT, USDC)
+    assert pair is not None
+    return str(pair.levels[0].price)
+
+
+def latency_samples() -> list:
+    return next(iter(metrics.levels_update_latency.collect())).samples
+
+
+def test_levels_source_from_url():
+    assert isinstance(levels_source_from_url("file:/tmp/levels.jsonl"), FileTailSource)
+    tcp_source = levels_source_from_url("tcp://127.0.0.1:9100")
+    assert isinstance(tcp_source, SocketSource)
+    assert (tcp_source.host, tcp_source.port) == ("127.0.0.1", 9100)
+    unix_source = levels_source_from_url("unix:/tmp/levels.sock")
+    assert isinstance(unix_source, SocketSource)
+    assert unix_source.path == "/tmp/levels.sock"
+    assert isinstance(levels_source_from_url("push:"), PusherSource)
+    with pytest.raises(ValueError, match="Unsupported price levels source"):
+        levels_source_from_url("http://example.com")
+
+
+@pytest.mark.asyncio
+async def test_feed_coalesces_queued_updates():
+    cache = LevelsCache()
+    source = PusherSource()
+    feed = LevelsFeed(cache, source)
+    observed_before = latency_samples()
+    source.push(update("0.9"))
+    source.push("not json")
+    source.push(update("0.8"))
+    source.push(update("0.7", base=USDC, quote=USDT))
+
+    feed.apply(await source.queue.get())
+
+    snapshot = cache.snapshot
+    assert snapshot.version == 1
+    assert len(snapshot.pairs) == 2
+    pair = snapshot.get(42161, USDT, USDC)
+    assert pair is not None
+    assert str(pair.levels[0].price) == "0.8"
+    assert metrics.levels_snapshot_version._value.get() == 1  # pylint: disable=protected-access
+    assert latency_samples() != observed_before
+
+
+@pytest.mark.asyncio
+async def test_feed_from_tailed_file(tmp_path):
+    path = tmp_path / "levels.jsonl"
+    path.write_text(update("0.9") + "\n" + update("0.8")[:10])
+    cache = LevelsCache()
+    feed_task = asyncio.create_task(
+        LevelsFeed(cache, FileTailSource(str(path), poll_interval=0.01)).run()
+    )
+    try:
+        await wait_for_version(cache, 1)
+        assert best_price(cache) == "0.9"
+        # complete the partially written line
+        with path.open("a") as f:
+            f.write(update("0.8")[10:] + "\n")
+        await wait_for_version(cache, 2)
+        assert best_price(cache) == "0.8"
+        # truncation (rotation) starts reading from the beginning
+        path.write_text(update("0.7") + "\n")
+        await wait_for_version(cache, 3)
+        assert best_price(cache) == "0.7"
+    finally:
+        feed_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_feed_from_socket():
+    cache = LevelsCache()
+    source = SocketSource(host="127.0.0.1", port=0)
+    server = await source.start()
+    port = server.sockets[0].getsockname()[1]
+    feed_task = asyncio.create_task(LevelsFeed(cache, source).run())
+    try:
+        _, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write((update("0.95") + "\n").encode())
+        await writer.drain()
+        await wait_for_version(cache, 1)
+        assert best_price(cache) == "0.95"
+        writer.close()
+    finally:
+        feed_task.cancel()
+
+
+def test_levels_source_is_abstract():
+    with pytest.raises(TypeError):
+        LevelsSource()  # type: ignore[abstract]  # pylint: disable=abstract-class-instantiated
@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+import pytest
+
+from app.markets.levels import LevelsCache, PairLevels
+
+USDT = "0xFd086bC7CD5C481DCC9C85ebE478A1C0b69FCbb9"
+USDC = "0xaf88d065e77c8cC2239327C5EDb3A432268e5831"
+
+
+def make_pair(levels, chain_id=42161, base=USDT, quote=USDC) -> PairLevels:
+    return PairLevels.from_dict(
+        {"chainId": chain_id, "baseToken": base, "quoteToken": quote, "levels": levels}
+    )
+
+
+def test_pair_levels_from_json():
+    pair = PairLevels.from_json(
+        '{"chainId": 42161, "baseToken": "%s", "quoteToken": "%s", '
+        '"levels": [["100", "0.999"], [200, 0.998]]}' % (USDT, USDC)
+    )
+    assert pair.key == (42161, USDT.lower(), USDC.lower())
+    assert [(lvl.amount, lvl.price) for lvl in pair.levels] == [
+        (Decimal("100"), Decimal("0.999")),
+        (Decimal("200"), Decimal("0.998")),
+    ]
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        "[]",
+        '{"chainId": 1}',
+        '{"chainId": "1", "baseToken": "0x1", "quoteToken": "0x2", "levels": []}',
+        '{"chainId": 1, "baseToken": "0x1", "quoteToken": "0x2", "levels": [["1"]]}',
+        '{"chainId": 1, "baseToken": "0x1", "quoteToken": "0x2", "levels": [["x", "1"]]}',
+        '{"chainId": 1, "baseToken": "0x1", "quoteToken": "0x2", "levels": [["-1", "1"]]}',
+        '{"chainId": 1, "baseToken": "0x1", "quoteToken": "0x2", "levels": [["1", "0"]]}',
+        '{"chainId": 1, "baseToken": "0x1", "quoteToken": "0x2", "levels": [["NaN", "1"]]}',
+    ],
+)
+def test_pair_levels_invalid(raw):
+    with pytest.raises(ValueError):
+        PairLevels.from_json(raw)
+
+
+def test_quote_for_base_uses_depth_curve():
+    pair = make_pair([["100", "1"], ["100", "0.5"]])
+    # base token with 6 decimals, quote token with 18 decimals
+    assert pair.quote_for_base(50 * 10**6, 6, 18) == 50 * 10**18
+    assert pair.quote_for_base(150 * 10**6, 6, 18) == 125 * 10**18
+    assert pair.quote_for_base(200 * 10**6, 6, 18) == 150 * 10**18
+    assert pair.quote_for_base(200 * 10**6 + 1, 6, 18) is None
+    # and the other way around, rounding down to the quote token precision
+    assert pair.quote_for_base(150 * 10**18 + 1, 18, 6) == 125 * 10**6
+
+
+def test_levels_cache_publishes_new_versions():
+    cache = LevelsCache()
+    notified = []
+    cache.add_listener(lambda snapshot, updates: notified.append((snapshot.version, updates)))
+    first = cache.snapshot
+    assert first.version == 0
+    assert first.get(42161, USDT, USDC) is None
+
+    pair = make_pair([["100", "1"]])
+    second = cache.publish([pair])
+    assert cache.snapshot is second
+    assert second.version == 1
+    assert second.get(42161, USDT.lower(), USDC.upper().replace("0X", "0x")) == pair
+    # Previously taken snapshots are never mutated
+    assert first.get(42161, USDT, USDC) is None
+    with pytest.raises(TypeError):
+        second.pairs[pair.key] = pair  # type: ignore[index]
+
+    assert notified == [(1, [pair])]
+
+    third = cache.publish([make_pair([])])
+    assert third.version == 2
+    assert third.get(42161, USDT, USDC) is None
+    assert second.get(42161, USDT, USDC) == pair
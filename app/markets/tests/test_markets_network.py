@@ -1,6 +1,7 @@
 import pytest
 
 from app.evm.chains import arbitrum, ethereum
+from app.markets.levels import PairLevels
 from app.markets.markets import MarketState
 
 
@@ -31,3 +32,59 @@ def test_ethereum_stablecoins_connected(market_state):
 
 def test_cross_chain_disconnected(market_state):
     assert not market_state.graph.has_edge(arbitrum.USDT, ethereum.USDT)
+
+
+def test_edge_rates_derived_from_levels(market_state):
+    market_state.levels.publish(
+        [
+            PairLevels.from_dict(
+                {
+                    "chainId": arbitrum.CHAIN_ID,
+                    "baseToken": arbitrum.USDT.address,
+                    "quoteToken": arbitrum.USDC.address,
+                    "levels": [["1000", "0.9995"], ["1000", "0.99"]],
+                }
+            )
+        ]
+    )
+    edge = market_state.graph[arbitrum.USDT][arbitrum.USDC]
+    assert edge["rate"] == pytest.approx(0.9995)
+    assert edge["depth"] == 2000 * 10**18
+    assert edge["weight"] == 1.0
+    # reverse direction is independent
+    assert "rate" not in market_state.graph[arbitrum.USDC][arbitrum.USDT]
+
+    market_state.levels.publish(
+        [
+            PairLevels.from_dict(
+                {
+                    "chainId": arbitrum.CHAIN_ID,
+                    "baseToken": arbitrum.USDT.address,
+                    "quoteToken": arbitrum.USDC.address,
+                    "levels": [],
+                }
+            )
+        ]
+    )
+    assert not market_state.graph.has_edge(arbitrum.USDT, arbitrum.USDC)
+    assert market_state.graph.has_edge(arbitrum.USDC, arbitrum.USDT)
+
+
+def test_path_not_driven_by_rates(market_state):
+    market_state.levels.publish(
+        [
+            PairLevels.from_dict(
+                {
+                    "chainId": arbitrum.CHAIN_ID,
+                    "baseToken": arbitrum.USDT.address,
+                    "quoteToken": arbitrum.USDC.address,
+                    "levels": [["1000", "3"]],
+                }
+            )
+        ]
+    )
+    # a better rate must not make the direct pair look longer than a detour
+    assert market_state.shortest_path(arbitrum.USDT, arbitrum.USDC) == [
+        arbitrum.USDT,
+        arbitrum.USDC,
+    ]
@@ -1,15 +1,101 @@
 import time
+from abc import ABC, abstractmethod
 from collections import defaultdict
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 
 from fastapi import APIRouter, Response
 from prometheus_client import Counter
 
+from app.protocols.liquorice.client import LiquoriceClient
+from app.schemas.chain import Chain
 
-class CounterHealthChecker:  # pylint: disable=too-few-public-methods
+from .loop import LoopMonitor
+
+HEALTH_MAX_LOOP_LAG = 1.0  # seconds, max tolerated event loop lag
+
+
+class HealthChecker(ABC):  # pylint: disable=too-few-public-methods
+    """Base class of health checkers.
+    `check()` runs on every `/health` request and should be O(1)."""
+
+    @abstractmethod
+    def check(self) -> bool:
+        """Check the health status."""
+
+
+class TimestampHealthChecker(HealthChecker):  # pylint: disable=too-few-public-methods
+    """Healthy if the timestamp provided by `get_ts` (`time.time()` based)
+    is not older than `max_age` seconds. A zero timestamp means "never"."""
+
+    def __init__(self, get_ts: Callable[[], float], max_age: float) -> None:
+        """
+        Args:
+            get_ts: Returns the last success timestamp, e.g. of the last quote sent.
+            max_age: Max age of the last success in seconds.
+        """
+        self.get_ts = get_ts
+        self.max_age = max_age
+
+    def check(self) -> bool:
+        """Check the last success is recent enough."""
+        ts = self.get_ts()
+        return ts > 0 and time.time() - ts <= self.max_age
+
+
+class LiquoriceHealthChecker(HealthChecker):  # pylint: disable=too-few-public-methods
+    """Healthy while the Liquorice WebSocket is connected
+    (dead connections are detected and closed by the websockets keepalive pings)."""
+
+    def __init__(self, client: LiquoriceClient) -> None:
+        self.client = client
+
+    def check(self) -> bool:
+        """Check the Liquorice WebSocket connection."""
+        return self.client.connected
+
+
+class BalancesHealthChecker(HealthChecker):  # pylint: disable=too-few-public-methods
+    """Healthy if the chain's token balances were read within `max_age` seconds
+    and (optionally) are at most `max_blocks` behind the chain head."""
+
+    def __init__(self, chain: Chain, max_age: float, max_blocks: Optional[int] = None) -> None:
+        self.chain = chain
+        self.max_age = max_age
+        self.max_blocks = max_blocks
+
+    def check(self) -> bool:
+        """Check balances freshness of the chain."""
+        chain = self.chain
+        if not chain.balances_block or time.time() - chain.balances_updated_ts > self.max_age:
+            return False
+        return (
+            self.max_blocks is None or chain.head_block - chain.balances_block <= self.max_blocks
+        )
+
+
+class LoopLagHealthChecker(HealthChecker):  # pylint: disable=too-few-public-methods
+    """Healthy if the event loop lag monitor is sampling and the last lag is below `max_lag`."""
+
+    def __init__(self, monitor: LoopMonitor, max_lag: float = HEALTH_MAX_LOOP_LAG) -> None:
+        self.monitor = monitor
+        self.max_lag = max_lag
+
+    def check(self) -> bool:
+        """Check the last event loop lag sample."""
+        monitor = self.monitor
+        # a stalled loop also stops producing samples
+        max_sample_age = monitor.interval + self.max_lag
+        return (
+            time.time() - monitor.last_sample_ts <= max_sample_age
+            and monitor.last_lag <= self.max_lag
+        )
+
+
+class CounterHealthChecker(HealthChecker):  # pylint: disable=too-few-public-methods
     """A health checker for Prometheus Counter metrics.
     This class checks if the counter metrics have been updated within a specified interval.
     If any of the specified label k-v pairs have been incremented, it considers the system healthy.
+    Collecting the counter is O(cardinality), prefer `TimestampHealthChecker` on hot paths.
     """
 
     def __init__(
@@ -58,16 +144,16 @@ class CounterHealthChecker:  # pylint: disable=too-few-public-methods
 
 
 class HealthService:
-    """A service to manage health checks for multiple CounterHealthCheckers."""
+    """A service to manage health checks for multiple HealthCheckers."""
 
     def __init__(self) -> None:
-        self.checkers: Dict[str, CounterHealthChecker] = {}
+        self.checkers: Dict[str, HealthChecker] = {}
         self.router = APIRouter(tags=["health"])
         self.router.add_api_route(
             "/health", self.health_check, methods=["GET"], response_model=Dict[str, bool]
         )
 
-    def add_checker(self, checker: CounterHealthChecker, name: str) -> None:
+    def add_checker(self, checker: HealthChecker, name: str) -> None:
         """Add a health checker to the service."""
         self.checkers[name] = checker
 
@@ -1,11 +1,16 @@
 # pylint: disable=too-many-return-statements
-"""Health check script that makes HTTP request and validates response."""
-import argparse
+"""Health check script that makes HTTP request and validates response.
+
+Stdlib only and free of `app` imports, so the container HEALTHCHECK can run it
+with a bare interpreter: `python3 -I -S app/metrics/healthcheck_client.py`.
+Speaks plain HTTP/1.0 over a socket: `http.client` alone takes ~40ms to import.
+"""
+
+import json
+import socket
 import sys
 from typing import Tuple
-from urllib.parse import urlparse
-
-import requests
+from urllib.parse import SplitResult, urlsplit
 
 DEFAULT_URL = "http://localhost:8080/health"
 HTTP_CODE_OK = 200
@@ -13,6 +18,35 @@ HTTP_CODE_DEGRADED = 503
 HTTP_TIMEOUT = 10
 
 
+def http_get(parsed: SplitResult) -> Tuple[int, bytes]:
+    """Make a single HTTP/1.0 GET request (no keep-alive).
+
+    Returns:
+        tuple: (status code, body)
+    """
+    host = parsed.hostname or ""
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+    request = f"GET {path} HTTP/1.0\r\nHost: {parsed.netloc}\r\nConnection: close\r\n\r\n"
+    with socket.create_connection((host, port), timeout=HTTP_TIMEOUT) as sock:
+        conn = sock
+        if parsed.scheme == "https":
+            import ssl  # pylint: disable=import-outside-toplevel
+
+            conn = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        conn.sendall(request.encode())
+        chunks = []
+        while chunk := conn.recv(65536):
+            chunks.append(chunk)
+    head, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+    status_line = head.split(b"\r\n", 1)[0].split()
+    if len(status_line) < 2 or not status_line[0].startswith(b"HTTP/"):
+        raise ConnectionError("Malformed HTTP response")
+    return int(status_line[1]), body
+
+
 def health_check(url: str) -> Tuple[int, str]:
     """
     Make HTTP request and validate response.
@@ -25,37 +59,39 @@ def health_check(url: str) -> Tuple[int, str]:
     """
     try:
         # Validate URL
-        parsed = urlparse(url)
-        if not parsed.scheme or not parsed.netloc:
+        parsed = urlsplit(url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            return 2, "ERR_URL_INVALID"
+        try:
+            _ = parsed.port
+        except ValueError:
             return 2, "ERR_URL_INVALID"
 
-        http_resp = requests.get(url, timeout=HTTP_TIMEOUT)
-        data = http_resp.json()
-        if http_resp.status_code == HTTP_CODE_OK and all(data.values()):
+        status, body = http_get(parsed)
+        data = json.loads(body)
+        if status == HTTP_CODE_OK and all(data.values()):
             return 0, "OK"
 
         # Unix exit codes are limited to 1B (0-255), so we use modulo 256
-        ret_code = http_resp.status_code % 256
+        ret_code = status % 256
 
         degraded_services = [svc for svc, status in data.items() if status is not True]
         degraded_list = "_".join(degraded_services).upper()
 
-        return ret_code, f"ERR_DEGRADED_{http_resp.status_code}_{degraded_list}"
+        return ret_code, f"ERR_DEGRADED_{status}_{degraded_list}"
 
-    except requests.exceptions.Timeout:
+    except TimeoutError:
         return 3, "ERR_TIMEOUT"
-    except requests.exceptions.ConnectionError:
+    except OSError:  # includes ConnectionError and DNS errors
         return 4, "ERR_CONNECTION"
-    except requests.exceptions.JSONDecodeError:
+    except ValueError:  # includes json.JSONDecodeError
         return 5, "ERR_INVALID_JSON"
 
 
 def main() -> None:
-    """Main function to parse arguments and perform health check."""
-    parser = argparse.ArgumentParser(description="HTTP health check script")
-    parser.add_argument("url", nargs="?", default=DEFAULT_URL, help="URL to check")
-    args = parser.parse_args()
-    exit_code, message = health_check(args.url)
+    """Main function to perform health check of the URL given as the only (optional) argument."""
+    url = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_URL
+    exit_code, message = health_check(url)
     print(message)
     sys.exit(exit_code)
 
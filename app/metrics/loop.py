@@ -0,0 +1,152 @@
+"""Event loop lag monitor and slow callback detector.
+
+The lag monitor sleeps for a fixed interval and measures how late it wakes up,
+which is the time the loop spent running other callbacks (signing, validation,
+metrics rendering...) instead of serving it.
+
+The optional slow callback detector wraps `asyncio.Handle._run` and records every
+callback running longer than a threshold into a ring buffer served by `/debug/loop`.
+It relies on the pure-Python `asyncio.Handle` and has no effect on uvloop.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from logging import getLogger
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from fastapi import APIRouter
+
+from .metrics import metrics
+
+LOOP_LAG_INTERVAL = 0.25  # seconds, how often to sample the event loop lag
+LOOP_SLOW_CALLBACKS_BUFFER = 100  # number of slow callbacks to keep
+
+log = getLogger(__name__)
+
+
+def describe_handle(handle: asyncio.Handle) -> str:
+    """Human-readable origin of a loop callback: the coroutine for task steps."""
+    callback = getattr(handle, "_callback", None)
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        description = f"Task {owner.get_name()} {getattr(coro, '__qualname__', coro)}"
+        frame = getattr(coro, "cr_frame", None)
+        if frame is not None:
+            # where the coroutine is suspended after the slow step
+            description += f" at {frame.f_code.co_filename}:{frame.f_lineno}"
+        return description
+    return repr(handle)
+
+
+class LoopMonitor:  # pylint: disable=too-many-instance-attributes
+    """Samples event loop lag and optionally records slow callbacks."""
+
+    interval: float
+    slow_callback_threshold: Optional[float]
+    slow_callbacks: Deque[Dict[str, Any]]
+    last_lag: float
+    max_lag: float
+    last_sample_ts: float
+
+    def __init__(
+        self,
+        interval: float = LOOP_LAG_INTERVAL,
+        slow_callback_threshold: Optional[float] = None,
+        buffer_size: int = LOOP_SLOW_CALLBACKS_BUFFER,
+    ) -> None:
+        """
+        Args:
+            interval: Lag sampling interval in seconds.
+            slow_callback_threshold: Record callbacks running longer than this (seconds),
+                None disables the detector.
+            buffer_size: Number of most recent slow callbacks to keep.
+        """
+        self.interval = interval
+        self.slow_callback_threshold = slow_callback_threshold
+        self.slow_callbacks = deque(maxlen=buffer_size)
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_sample_ts = 0.0
+        self._orig_handle_run: Optional[Callable[[asyncio.Handle], None]] = None
+        self.router = APIRouter(tags=["debug"])
+        self.router.add_api_route("/debug/loop", self.debug_info, methods=["GET"])
+
+    @classmethod
+    def from_env(cls) -> "LoopMonitor":
+        """Create from `LOOP_LAG_INTERVAL`, `LOOP_SLOW_CALLBACK_MS`
+        and `LOOP_SLOW_CALLBACKS_BUFFER` env vars."""
+        slow_callback_ms = os.getenv("LOOP_SLOW_CALLBACK_MS")
+        return cls(
+            interval=float(os.getenv("LOOP_LAG_INTERVAL", str(LOOP_LAG_INTERVAL))),
+            slow_callback_threshold=float(slow_callback_ms) / 1000 if slow_callback_ms else None,
+            buffer_size=int(
+                os.getenv("LOOP_SLOW_CALLBACKS_BUFFER", str(LOOP_SLOW_CALLBACKS_BUFFER))
+            ),
+        )
+
+    def record_lag(self, lag: float) -> None:
+        """Account one lag sample."""
+        lag = max(lag, 0.0)
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.last_sample_ts = time.time()
+        metrics.event_loop_lag.observe(lag)
+
+    def record_slow_callback(self, handle: asyncio.Handle, duration: float) -> None:
+        """Account one slow callback."""
+        metrics.event_loop_slow_callbacks_total.inc()
+        self.slow_callbacks.append(
+            {"ts": time.time(), "duration": duration, "callback": describe_handle(handle)}
+        )
+
+    def install_slow_callback_detector(self) -> None:
+        """Wrap `asyncio.Handle._run` to time every callback (idempotent)."""
+        if self.slow_callback_threshold is None or self._orig_handle_run is not None:
+            return
+        orig_run: Callable[[asyncio.Handle], None] = getattr(asyncio.Handle, "_run")
+        threshold = self.slow_callback_threshold
+        monitor = self
+
+        def timed_run(handle: asyncio.Handle) -> None:
+            start = time.perf_counter()
+            orig_run(handle)
+            duration = time.perf_counter() - start
+            if duration >= threshold:
+                monitor.record_slow_callback(handle, duration)
+
+        self._orig_handle_run = orig_run
+        setattr(asyncio.Handle, "_run", timed_run)
+        log.info("Slow callback detector installed, threshold %.3fs", threshold)
+
+    def uninstall_slow_callback_detector(self) -> None:
+        """Restore the original `asyncio.Handle._run`."""
+        if self._orig_handle_run is not None:
+            setattr(asyncio.Handle, "_run", self._orig_handle_run)
+            self._orig_handle_run = None
+
+    async def run(self) -> None:
+        """Sample the loop lag until cancelled."""
+        loop = asyncio.get_running_loop()
+        self.install_slow_callback_detector()
+        try:
+            while True:
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                self.record_lag(loop.time() - expected)
+        finally:
+            self.uninstall_slow_callback_detector()
+
+    async def debug_info(self) -> Dict[str, Any]:
+        """Loop lag stats and the most recent slow callbacks."""
+        slow_callbacks: List[Dict[str, Any]] = list(self.slow_callbacks)
+        return {
+            "interval": self.interval,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "last_sample_ts": self.last_sample_ts,
+            "slow_callback_threshold": self.slow_callback_threshold,
+            "slow_callbacks": slow_callbacks,
+        }
@@ -1,11 +1,44 @@
+import os
+from logging import getLogger
+from typing import Dict, Optional, Set, Tuple
+
 from fastapi import APIRouter, Response
-from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, generate_latest
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+METRICS_MAX_SOLVERS = 50  # distinct solver label values, the rest is reported as OTHER_SOLVER
+OTHER_SOLVER = "other"
+UNKNOWN_SOLVER = "unknown"  # solver label of RFQs without a solver
+
+log = getLogger(__name__)
+
+RfqLabels = Tuple[int, str, str, str, str]  # (chain_id, solver, base_token, quote_token, status)
+RfqPair = Tuple[
+    int, Optional[str], str, str
+]  # (chain_id, solver, base_token, quote_token) of an RFQ
 
 
-class Metrics:  # pylint: disable=too-few-public-methods
-    """Prometheus metrics singleton for quoter service"""
+class Metrics:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """Prometheus metrics singleton for quoter service, one attribute per metric"""
+
+    def __init__(self, max_solvers: Optional[int] = None) -> None:
+        """
+        Args:
+            max_solvers: Cap of distinct `solver` label values,
+                `METRICS_MAX_SOLVERS` env var by default.
+        """
+        if max_solvers is None:
+            max_solvers = int(os.getenv("METRICS_MAX_SOLVERS", str(METRICS_MAX_SOLVERS)))
+        self.max_solvers = max_solvers
+        self.solvers: Set[str] = set()
+        self._rfqs_children: Dict[RfqLabels, Counter] = {}
 
-    def __init__(self) -> None:
         self.rfqs_total = Counter(
             "rfqs_total",
             "Total number of RFQs processed",
@@ -18,16 +51,225 @@ class Metrics:  # pylint: disable=too-few-public-methods
             ["chain_id", "solver", "base_token", "quote_token"],
         )
 
+        self.settlement_latency = Histogram(
+            "settlement_latency_seconds",
+            "Time from sending a quote to receiving its settlement log",
+            ["chain_id"],
+            buckets=(1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0),
+        )
+
+        self.quotes_settled = Counter(
+            "quotes_settled_total",
+            "Total number of quotes sent and settled",
+            ["chain_id"],
+        )
+
+        self.quotes_expired = Counter(
+            "quotes_expired_total",
+            "Total number of quotes sent and expired without settlement",
+            ["chain_id"],
+        )
+
+        self.traces_total = Counter(
+            "traces_total",
+            "Total number of settlement transactions traced, served from cache, failed or dropped",
+            ["chain", "status"],
+        )
+
+        self.trace_duration = Histogram(
+            "trace_duration_seconds",
+            "Duration of settlement transaction traces",
+            ["chain"],
+            buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+        )
+
+        self.settlement_fills = Counter(
+            "settlement_fills_total",
+            "Total token amount settled to (in) or from (out) the settlement keeper, from traces",
+            ["chain", "token", "side"],
+        )
+
+        self.levels_updates_total = Counter(
+            "levels_updates_total",
+            "Total number of price levels updates ingested",
+            ["status"],
+        )
+
+        self.levels_update_latency = Histogram(
+            "levels_update_latency_seconds",
+            "Time from price levels update receipt to its visibility in the levels snapshot",
+            buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 1.0),
+        )
+
+        self.levels_snapshot_version = Gauge(
+            "levels_snapshot_version",
+            "Version of the latest published price levels snapshot",
+        )
+
+        self.log_records_dropped_total = Counter(
+            "log_records_dropped_total",
+            "Total number of log records dropped by rate limiting or a full log queue",
+            ["reason"],
+        )
+
+        self.event_loop_lag = Histogram(
+            "event_loop_lag_seconds",
+            "Delay between scheduled and actual wakeup of the event loop lag monitor",
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+        )
+
+        self.event_loop_slow_callbacks_total = Counter(
+            "event_loop_slow_callbacks_total",
+            "Total number of event loop callbacks exceeding the slow callback threshold",
+        )
+
+        self.balances_refresh_duration = Histogram(
+            "balances_refresh_duration_seconds",
+            "Duration of a full token balances refresh",
+            ["chain"],
+            buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+        )
+
+        self.balances_age_blocks = Gauge(
+            "balances_age_blocks",
+            "Blocks between the chain head and the block of the last balances refresh",
+            ["chain"],
+        )
+
+        self.token_allowance_coverage = Gauge(
+            "token_allowance_coverage_ratio",
+            "Balance Manager allowance of a token relative to its balance, capped at 1",
+            ["chain", "token"],
+        )
+
+        self.tokens_allowance_low = Gauge(
+            "tokens_allowance_low",
+            "Number of tokens whose Balance Manager allowance is below their balance",
+            ["chain"],
+        )
+
+        self.transfers_reverted = Counter(
+            "transfers_reverted_total",
+            "Total number of token transfers reverted from the balances by a chain reorg",
+            ["chain"],
+        )
+
+        self.balances_refresh_stride = Gauge(
+            "balances_refresh_stride_blocks",
+            "Current adaptive stride (in blocks) of newHeads driven balances refreshes",
+            ["chain"],
+        )
+
+        self.rpc_request_duration = Histogram(
+            "rpc_request_duration_seconds",
+            "Duration of successful RPC reads and probes per endpoint",
+            ["chain", "endpoint"],
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+        )
+
+        self.rpc_endpoint_latency = Gauge(
+            "rpc_endpoint_latency_seconds",
+            "Latency estimate (EMA) used to route RPC reads",
+            ["chain", "endpoint"],
+        )
+
+        self.rpc_endpoint_healthy = Gauge(
+            "rpc_endpoint_healthy",
+            "Whether the RPC endpoint takes reads and subscriptions",
+            ["chain", "endpoint"],
+        )
+
+        self.rpc_errors = Counter(
+            "rpc_errors_total",
+            "Total number of RPC endpoint failures (connection, timeout, RPC errors)",
+            ["chain", "endpoint"],
+        )
+
+        self.rpc_read_queue = Histogram(
+            "rpc_read_queue_seconds",
+            "Time RPC reads wait for a read connection with a free in-flight slot",
+            ["chain", "endpoint"],
+            buckets=(0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+        )
+
+        self.rpc_notification_queue = Histogram(
+            "rpc_notification_queue_seconds",
+            "Time subscription notifications wait from receipt to their handler",
+            ["chain"],
+            buckets=(0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+        )
+
+        self.rpc_subscription_failovers = Counter(
+            "rpc_subscription_failovers_total",
+            "Total number of subscription moves between RPC endpoints",
+            ["chain"],
+        )
+
+        self.rpc_batch_size = Histogram(
+            "rpc_batch_size",
+            "Number of reads sent in one JSON-RPC batch request",
+            ["chain"],
+            buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+        )
+
+        self.rpc_round_trips_saved = Counter(
+            "rpc_round_trips_saved_total",
+            "Total number of RPC round trips saved by batching reads",
+            ["chain"],
+        )
+
+    def solver_label(self, solver: Optional[str]) -> str:
+        """Solver label value, `OTHER_SOLVER` once `max_solvers` distinct solvers were seen
+        and `UNKNOWN_SOLVER` for RFQs without one."""
+        if solver is None:
+            return UNKNOWN_SOLVER
+        if solver in self.solvers:
+            return solver
+        if len(self.solvers) >= self.max_solvers:
+            return OTHER_SOLVER
+        self.solvers.add(solver)
+        return solver
+
+    def count_rfq(self, rfq_pair: RfqPair, status: str) -> None:
+        """Increment `rfqs_total` through a cached pre-bound child.
+
+        `Counter.labels()` takes a lock and stringifies the label values on every call,
+        the cache is a plain dict lookup (only touched from the event loop). It is keyed
+        by the solver label, so it is bounded like the label values."""
+        chain_id, solver, base_token, quote_token = rfq_pair
+        key = (chain_id, self.solver_label(solver), base_token, quote_token, status)
+        child = self._rfqs_children.get(key)
+        if child is None:
+            child = self.rfqs_total.labels(
+                chain_id=chain_id,
+                solver=key[1],
+                base_token=base_token,
+                quote_token=quote_token,
+                status=status,
+            )
+            self._rfqs_children[key] = child
+        child.inc()
+
 
 metrics = Metrics()
 metrics_router = APIRouter(tags=["metrics"])
 
 
 @metrics_router.get("/metrics")
-async def get_metrics() -> Response:
+def get_metrics() -> Response:
     """
     Prometheus metrics endpoint.
 
     Returns metrics in Prometheus exposition format.
+    Sync on purpose: FastAPI renders it in the threadpool, off the event loop.
     """
     return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def start_metrics_server_from_env() -> None:
+    """Serve metrics from a separate lightweight HTTP server thread
+    if `METRICS_PORT` env var is set (scrapes then never touch the FastAPI app)."""
+    port = os.getenv("METRICS_PORT")
+    if port:
+        start_http_server(int(port))
+        log.info("Metrics server listening on port %s", port)
@@ -0,0 +1,209 @@
+"""On-demand profiling of the running gateway.
+
+`POST /debug/profile` captures for `seconds` (or until `rfqs` more RFQs are processed)
+and returns aggregated stats as plain text:
+
+- `cprofile`: deterministic `cProfile` of the event loop thread, top functions
+  by cumulative time
+- `sample`: a background thread samples the event loop thread's stack every
+  `interval` seconds, collapsed stacks (flamegraph input) by sample count
+- `memory`: `tracemalloc` snapshot diff, top allocation growth by line
+
+The route requires `Authorization: Bearer <ADMIN_TOKEN>` and is disabled when
+the `ADMIN_TOKEN` env var is not set.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from enum import Enum
+from logging import getLogger
+from typing import Callable, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+PROFILE_MAX_SECONDS = 300.0  # max capture duration
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+PROFILE_RFQS_POLL_INTERVAL = 0.05  # seconds between processed RFQs count checks
+PROFILE_TRACEMALLOC_FRAMES = 10  # frames stored per allocation traceback
+
+log = getLogger(__name__)
+
+
+class ProfileMode(str, Enum):
+    """Profiling modes."""
+
+    CPROFILE = "cprofile"
+    SAMPLE = "sample"
+    MEMORY = "memory"
+
+
+class StackSampler:
+    """Samples the stack of one thread from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)  # pylint: disable=protected-access
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the sampler thread."""
+        self._stop.set()
+        self._thread.join()
+
+    def report(self, top: int) -> str:
+        """Collapsed stacks of the `top` most sampled stacks, most sampled first."""
+        total = sum(self.samples.values())
+        lines = [f"# {total} samples every {self.interval}s, collapsed stacks"]
+        lines += [f"{stack} {count}" for stack, count in self.samples.most_common(top)]
+        return "\n".join(lines) + "\n"
+
+
+def memory_report(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, top: int) -> str:
+    """Top `top` allocation changes by line between two `tracemalloc` snapshots."""
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    lines = [f"# top {top} allocation changes by line"]
+    lines += [str(stat) for stat in stats[:top]]
+    return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """Admin-only profiling routes, see module docstring."""
+
+    def __init__(
+        self, admin_token: Optional[str] = None, rfqs_count: Optional[Callable[[], int]] = None
+    ) -> None:
+        """
+        Args:
+            admin_token: Bearer token required by the routes, None disables them.
+            rfqs_count: Returns the total number of RFQs processed, enables `rfqs` captures.
+        """
+        self.admin_token = admin_token
+        self.rfqs_count = rfqs_count
+        self._lock = asyncio.Lock()
+        self.router = APIRouter(tags=["debug"])
+        self.router.add_api_route(
+            "/debug/profile",
+            self.profile,
+            methods=["POST"],
+            response_class=PlainTextResponse,
+        )
+
+    @classmethod
+    def from_env(cls, rfqs_count: Optional[Callable[[], int]] = None) -> "Profiler":
+        """Create with admin token from `ADMIN_TOKEN` env var."""
+        return cls(admin_token=os.getenv("ADMIN_TOKEN") or None, rfqs_count=rfqs_count)
+
+    def authorize(self, authorization: Optional[str]) -> None:
+        """Check the bearer token.
+
+        Raises:
+            HTTPException: 404 if profiling is disabled, 401 on missing or wrong token
+        """
+        if not self.admin_token:
+            raise HTTPException(status_code=404, detail="Profiling is disabled")
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(
+            token.encode(), self.admin_token.encode()
+        ):
+            raise HTTPException(status_code=401, detail="Invalid admin token")
+
+    async def wait(self, seconds: float, rfqs: Optional[int]) -> None:
+        """Wait `seconds`, or until `rfqs` more RFQs are processed (at most `seconds`)."""
+        if rfqs is None or self.rfqs_count is None:
+            await asyncio.sleep(seconds)
+            return
+        target = self.rfqs_count() + rfqs
+        deadline = time.monotonic() + seconds
+        while self.rfqs_count() < target and time.monotonic() < deadline:
+            await asyncio.sleep(PROFILE_RFQS_POLL_INTERVAL)
+
+    async def profile(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        mode: ProfileMode = ProfileMode.CPROFILE,
+        seconds: float = Query(10.0, gt=0, le=PROFILE_MAX_SECONDS),
+        rfqs: Optional[int] = Query(None, gt=0),
+        top: int = Query(50, gt=0),
+        interval: float = Query(PROFILE_SAMPLE_INTERVAL, gt=0, le=1),
+        authorization: Optional[str] = Header(None),
+    ) -> str:
+        """Profile the live event loop, see module docstring."""
+        self.authorize(authorization)
+        if rfqs is not None and self.rfqs_count is None:
+            raise HTTPException(status_code=400, detail="RFQ count is not available")
+        if self._lock.locked():
+            raise HTTPException(status_code=409, detail="Profiling is already in progress")
+        async with self._lock:
+            log.info("Profiling (%s) for %ss / %s RFQs", mode.value, seconds, rfqs)
+            if mode == ProfileMode.CPROFILE:
+                return await self.capture_cprofile(seconds, rfqs, top)
+            if mode == ProfileMode.SAMPLE:
+                return await self.capture_samples(seconds, rfqs, top, interval)
+            return await self.capture_memory(seconds, rfqs, top)
+
+    async def capture_cprofile(self, seconds: float, rfqs: Optional[int], top: int) -> str:
+        """cProfile the event loop thread (the caller's thread)."""
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await self.wait(seconds, rfqs)
+        finally:
+            profile.disable()
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+        return out.getvalue()
+
+    async def capture_samples(
+        self, seconds: float, rfqs: Optional[int], top: int, interval: float
+    ) -> str:
+        """Sample stacks of the event loop thread (the caller's thread)."""
+        sampler = StackSampler(threading.get_ident(), interval)
+        sampler.start()
+        try:
+            await self.wait(seconds, rfqs)
+        finally:
+            sampler.stop()
+        return sampler.report(top)
+
+    async def capture_memory(self, seconds: float, rfqs: Optional[int], top: int) -> str:
+        """Diff two `tracemalloc` snapshots taken before and after the capture.
+        Snapshots are taken and compared in a worker thread, off the event loop."""
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        try:
+            before = await asyncio.to_thread(tracemalloc.take_snapshot)
+            await self.wait(seconds, rfqs)
+            after = await asyncio.to_thread(tracemalloc.take_snapshot)
+        finally:
+            if started:
+                tracemalloc.stop()
+        return await asyncio.to_thread(memory_report, before, after, top)
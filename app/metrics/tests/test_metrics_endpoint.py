@@ -3,8 +3,9 @@
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
 
-from app.metrics.metrics import metrics, metrics_router
+from app.metrics.metrics import OTHER_SOLVER, UNKNOWN_SOLVER, metrics, metrics_router
 
 
 @pytest.fixture
@@ -65,3 +66,38 @@ def test_metrics_with_sample_data(client):
         'rfqs_waiting{base_token="0x123",chain_id="1",quote_token="0x456",solver="test_solver"} 5.0'
         in metrics_text
     )
+
+
+def test_count_rfq_reuses_bound_children(monkeypatch):
+    """Test that count_rfq binds label children once and caps solver cardinality."""
+    monkeypatch.setattr(metrics, "max_solvers", 1)
+    monkeypatch.setattr(metrics, "solvers", set())
+    monkeypatch.setattr(metrics, "_rfqs_children", {})
+    labels = {"chain_id": "10", "base_token": "0xaaa", "quote_token": "0xbbb"}
+    for _ in range(3):
+        metrics.count_rfq((10, "solver_a", "0xaaa", "0xbbb"), "QUOTE_SENT")
+    assert len(metrics._rfqs_children) == 1  # pylint: disable=protected-access
+    assert (
+        REGISTRY.get_sample_value(
+            "rfqs_total", {**labels, "solver": "solver_a", "status": "QUOTE_SENT"}
+        )
+        == 3
+    )
+    metrics.count_rfq((10, "solver_b", "0xaaa", "0xbbb"), "QUOTE_SENT")
+    metrics.count_rfq((10, "solver_c", "0xaaa", "0xbbb"), "QUOTE_SENT")
+    # solvers beyond the cap share one child
+    assert len(metrics._rfqs_children) == 2  # pylint: disable=protected-access
+    assert (
+        REGISTRY.get_sample_value(
+            "rfqs_total", {**labels, "solver": OTHER_SOLVER, "status": "QUOTE_SENT"}
+        )
+        == 2
+    )
+    assert metrics.solvers == {"solver_a"}
+    metrics.count_rfq((10, None, "0xaaa", "0xbbb"), "QUOTE_SENT")
+    assert (
+        REGISTRY.get_sample_value(
+            "rfqs_total", {**labels, "solver": UNKNOWN_SOLVER, "status": "QUOTE_SENT"}
+        )
+        == 1
+    )
@@ -0,0 +1,77 @@
+"""Tests for the container health check probe."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, Tuple
+
+import pytest
+
+from app.metrics import healthcheck_client
+from app.metrics.healthcheck_client import health_check
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    """Serves canned responses keyed by path."""
+
+    canned: Dict[str, Tuple[int, str]] = {
+        "/health": (200, json.dumps({"rfq": True, "liquorice": True})),
+        "/degraded": (503, json.dumps({"rfq": True, "liquorice": False})),
+        "/not-json": (200, "<html></html>"),
+    }
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        status, body = self.canned[self.path]
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    """Start a local HTTP server."""
+    server = HTTPServer(("127.0.0.1", 0), HealthHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/health", (0, "OK")),
+        ("/degraded", (503 % 256, "ERR_DEGRADED_503_LIQUORICE")),
+        ("/not-json", (5, "ERR_INVALID_JSON")),
+    ],
+)
+def test_health_check_responses(server_url, path, expected):
+    assert health_check(server_url + path) == expected
+
+
+@pytest.mark.parametrize("url", ["localhost:8080/health", "ftp://localhost/", "http://:80/"])
+def test_health_check_invalid_url(url):
+    assert health_check(url) == (2, "ERR_URL_INVALID")
+
+
+def test_health_check_connection_refused():
+    server = HTTPServer(("127.0.0.1", 0), HealthHandler)
+    port = server.server_port
+    server.server_close()
+    assert health_check(f"http://127.0.0.1:{port}/health") == (4, "ERR_CONNECTION")
+
+
+def test_health_check_timeout(monkeypatch):
+    server = HTTPServer(("127.0.0.1", 0), HealthHandler)  # listening, but never accepting
+    monkeypatch.setattr(healthcheck_client, "HTTP_TIMEOUT", 0.1)
+    try:
+        assert health_check(f"http://127.0.0.1:{server.server_port}/health") == (
+            3,
+            "ERR_TIMEOUT",
+        )
+    finally:
+        server.server_close()
@@ -4,8 +4,16 @@ from unittest.mock import patch
 
 import pytest
 from prometheus_client import CollectorRegistry, Counter
+from web3.main import to_checksum_address
 
-from app.metrics.health import CounterHealthChecker
+from app.metrics.health import (
+    BalancesHealthChecker,
+    CounterHealthChecker,
+    LoopLagHealthChecker,
+    TimestampHealthChecker,
+)
+from app.metrics.loop import LoopMonitor
+from app.schemas.chain import Chain
 
 
 @pytest.fixture
@@ -129,3 +137,46 @@ def test_metrics_healthchecker_with_data(metrics_counter, mock_time):
         status="QUOTE_SENT",
     ).inc()
     assert hc.check() is True
+
+
+def test_timestamp_healthchecker(mock_time):
+    last_ts = 0.0
+    hc = TimestampHealthChecker(lambda: last_ts, max_age=60)
+    # never succeeded
+    assert hc.check() is False
+    last_ts = mock_time.return_value
+    assert hc.check() is True
+    mock_time.return_value += 60
+    assert hc.check() is True
+    mock_time.return_value += 1
+    assert hc.check() is False
+
+
+def test_balances_healthchecker(mock_time):
+    chain = Chain(id=1, liquorice_settlement_address=to_checksum_address("0x" + "00" * 20))
+    hc = BalancesHealthChecker(chain, max_age=120, max_blocks=10)
+    # balances never read
+    assert hc.check() is False
+    chain.head_block = chain.balances_block = 100
+    chain.balances_updated_ts = mock_time.return_value
+    assert hc.check() is True
+    chain.head_block = 111
+    assert hc.check() is False
+    chain.balances_block = 111
+    mock_time.return_value += 121
+    assert hc.check() is False
+
+
+def test_loop_lag_healthchecker(mock_time):
+    monitor = LoopMonitor(interval=1)
+    hc = LoopLagHealthChecker(monitor, max_lag=0.5)
+    # monitor never sampled
+    assert hc.check() is False
+    monitor.record_lag(0.1)
+    assert hc.check() is True
+    monitor.record_lag(0.6)
+    assert hc.check() is False
+    monitor.record_lag(0.1)
+    # samples stop coming
+    mock_time.return_value += 2
+    assert hc.check() is False
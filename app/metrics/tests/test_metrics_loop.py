@@ -0,0 +1,65 @@
+"""Tests for event loop lag monitor and slow callback detector."""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.metrics.loop import LoopMonitor
+
+ORIG_HANDLE_RUN = asyncio.Handle._run  # pylint: disable=protected-access
+
+
+async def blocking_coroutine() -> None:
+    await asyncio.sleep(0)
+    time.sleep(0.05)  # blocks the event loop
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_is_measured():
+    monitor = LoopMonitor(interval=0.01)
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.02)
+    time.sleep(0.05)
+    await asyncio.sleep(0.03)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert monitor.max_lag >= 0.03
+    assert monitor.last_sample_ts > 0
+    # detector is disabled by default
+    assert asyncio.Handle._run is ORIG_HANDLE_RUN  # pylint: disable=protected-access
+    assert not monitor.slow_callbacks
+
+
+@pytest.mark.asyncio
+async def test_slow_callbacks_are_recorded():
+    monitor = LoopMonitor(interval=0.01, slow_callback_threshold=0.02, buffer_size=2)
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0)
+    for _ in range(3):
+        await asyncio.create_task(blocking_coroutine(), name="blocker")
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # original Handle._run is restored when the monitor stops
+    assert asyncio.Handle._run is ORIG_HANDLE_RUN  # pylint: disable=protected-access
+    assert len(monitor.slow_callbacks) == 2  # ring buffer keeps the most recent ones
+    record = monitor.slow_callbacks[-1]
+    assert record["duration"] >= 0.02
+    assert record["callback"].startswith("Task blocker blocking_coroutine")
+
+
+def test_debug_endpoint():
+    monitor = LoopMonitor(slow_callback_threshold=0.1)
+    monitor.record_lag(0.5)
+    app = FastAPI()
+    app.include_router(monitor.router)
+    response = TestClient(app).get("/debug/loop")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["max_lag"] == 0.5
+    assert data["slow_callback_threshold"] == 0.1
+    assert data["slow_callbacks"] == []
@@ -0,0 +1,92 @@
+# pylint: disable=redefined-outer-name
+"""Tests for the profiling endpoint."""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.metrics.profiler import ProfileMode, Profiler
+
+AUTH = {"Authorization": "Bearer s3cret"}
+
+
+def busy_function() -> list:
+    """Burn some CPU (and memory) on the event loop."""
+    end = time.perf_counter() + 0.05
+    garbage = []
+    while time.perf_counter() < end:
+        garbage.append(object())
+    return garbage
+
+
+@pytest.fixture
+def profiler():
+    return Profiler(admin_token="s3cret", rfqs_count=lambda: 0)
+
+
+@pytest.fixture
+def client(profiler):
+    app = FastAPI()
+    app.include_router(profiler.router)
+    return TestClient(app)
+
+
+def test_profile_disabled_without_admin_token():
+    app = FastAPI()
+    app.include_router(Profiler().router)
+    response = TestClient(app).post("/debug/profile", headers=AUTH)
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize(
+    "headers", [{}, {"Authorization": "Bearer wrong"}, {"Authorization": "s3cret"}]
+)
+def test_profile_requires_admin_token(client, headers):
+    response = client.post("/debug/profile", params={"seconds": 0.01}, headers=headers)
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", list(ProfileMode))
+async def test_profile_captures_event_loop(profiler, mode):
+    async def busy() -> list:
+        await asyncio.sleep(0.05)
+        return busy_function()  # kept alive by the task until the capture ends
+
+    busy_task = asyncio.create_task(busy())
+    report = await profiler.profile(
+        mode=mode,
+        seconds=0.2,
+        rfqs=None,
+        top=50,
+        interval=0.001,
+        authorization=AUTH["Authorization"],
+    )
+    await busy_task
+    assert "test_metrics_profiler.py" in report
+    if mode != ProfileMode.MEMORY:
+        assert "busy_function" in report
+
+
+def test_profile_memory(client):
+    response = client.post(
+        "/debug/profile", params={"mode": "memory", "seconds": 0.01, "top": 5}, headers=AUTH
+    )
+    assert response.status_code == 200
+    assert response.text.startswith("# top 5 allocation changes by line")
+
+
+def test_profile_rfqs():
+    count = iter(range(100))
+    profiler = Profiler(admin_token="s3cret", rfqs_count=lambda: next(count))
+    app = FastAPI()
+    app.include_router(profiler.router)
+    started = time.monotonic()
+    response = TestClient(app).post(
+        "/debug/profile", params={"mode": "sample", "rfqs": 3, "seconds": 10}, headers=AUTH
+    )
+    assert response.status_code == 200
+    assert time.monotonic() - started < 5  # finished after 3 RFQs, not 10 seconds
@@ -0,0 +1,88 @@
+"""Append-only capture of Liquorice websocket frames.
+
+A capture file starts with `CAPTURE_MAGIC` followed by records of a fixed
+13 byte header (`time.time()` float64, direction byte, payload length uint32,
+little endian) and the raw frame payload. Writes go to a large userspace buffer
+which is flushed at most every `flush_interval` seconds, so recording a frame is
+a `struct.pack` and two buffer copies on the event loop.
+"""
+
+import struct
+import time
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import BinaryIO, Iterator, Optional, Union
+
+CAPTURE_MAGIC = b"LQCAP1\n"
+CAPTURE_BUFFER_SIZE = 1 << 20  # bytes buffered before a write to the file
+CAPTURE_FLUSH_INTERVAL = 1.0  # max seconds between flushes
+_HEADER = struct.Struct("<dBI")
+
+
+class Direction(IntEnum):
+    """Frame direction relative to the gateway."""
+
+    IN = 0
+    OUT = 1
+
+
+@dataclass(slots=True)
+class Frame:
+    """Captured websocket frame."""
+
+    ts: float  # time.time() of receipt (IN) or send (OUT)
+    direction: Direction
+    data: bytes
+
+
+class FrameCapture:
+    """Appends frames to a capture file, see module docstring."""
+
+    def __init__(self, path: str, flush_interval: float = CAPTURE_FLUSH_INTERVAL) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.frames = 0
+        self._file: Optional[BinaryIO] = open(path, "ab", buffering=CAPTURE_BUFFER_SIZE)
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+        self._flushed_at = time.monotonic()
+
+    def record(self, direction: Direction, ts: float, data: Union[str, bytes]) -> None:
+        """Append one frame."""
+        if self._file is None:
+            return
+        if isinstance(data, str):
+            data = data.encode()
+        self._file.write(_HEADER.pack(ts, direction, len(data)))
+        self._file.write(data)
+        self.frames += 1
+        now = time.monotonic()
+        if now - self._flushed_at >= self.flush_interval:
+            self._file.flush()
+            self._flushed_at = now
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path: str) -> Iterator[Frame]:
+    """Iterate frames of a capture file, a truncated last record is skipped.
+
+    Raises:
+        ValueError: if the file is not a capture file
+    """
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a Liquorice capture file")
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            ts, direction, size = _HEADER.unpack(header)
+            data = f.read(size)
+            if len(data) < size:
+                return
+            yield Frame(ts=ts, direction=Direction(direction), data=data)
@@ -1,71 +1,112 @@
 import asyncio
+import time
 from logging import getLogger
+from typing import Optional
 
 import websockets
-from pydantic import ValidationError
 from websockets.asyncio.client import ClientConnection
 
 from app.config.maker import MakerConfig
 
-from .schemas import LiquoriceEnvelope, MessageType, RFQMessage, RFQQuoteMessage
-
-LIQUORICE_WS_URL = "wss://api.liquorice.tech/v1/maker/ws"
+from .capture import Direction, FrameCapture
+from .internal import Quote, Rfq, decode_envelope, decode_envelope_fast
+from .schemas import LiquoriceEnvelope, MessageType
 
 log = getLogger(__name__)
 
 
 class LiquoriceClient:
     """Client for connecting to the Liquorice WebSocket API.
-    Relays RFQs and quotes between the queues and the WebSocket."""
+    Relays RFQs and quotes between the queues and the WebSocket.
+
+    Pydantic models are built only here, at the edge; with `fast_path` enabled
+    messages are decoded and encoded with plain `json` instead. With `capture_path`
+    set, every frame is appended to a capture file (see `capture`)."""
 
-    out_rfqs: asyncio.Queue[RFQMessage]
-    in_quotes: asyncio.Queue[RFQQuoteMessage]
+    out_rfqs: asyncio.Queue[Rfq]
+    in_quotes: asyncio.Queue[Quote]
+    connected: bool
 
     def __init__(self, cfg_maker: MakerConfig) -> None:
         self.out_rfqs = asyncio.Queue()
         self.in_quotes = asyncio.Queue()
-        self.uri = LIQUORICE_WS_URL
+        self.uri = cfg_maker.ws_url
         self.headers = {
             "maker": cfg_maker.maker,
             "authorization": cfg_maker.authorization,
         }
-        self.out_rfqs: asyncio.Queue[RFQMessage] = asyncio.Queue()  # Queue for outgoing RFQs
-        self.in_quotes: asyncio.Queue[RFQQuoteMessage] = (
-            asyncio.Queue()
-        )  # Queue for incoming quotes
+        self.fast_path = cfg_maker.fast_path
+        self.capture_path = cfg_maker.capture_path
+        self.capture: Optional[FrameCapture] = None
+        self.connected = False
+        self.out_rfqs: asyncio.Queue[Rfq] = asyncio.Queue()  # Queue for outgoing RFQs
+        self.in_quotes: asyncio.Queue[Quote] = asyncio.Queue()  # Queue for incoming quotes
 
     async def _reader(self, ws: ClientConnection) -> None:
         """Reads messages from the WebSocket and puts them into the rfqs queue."""
+        decode = decode_envelope_fast if self.fast_path else decode_envelope
         async for message in ws:
+            received_at = time.time()
+            if self.capture is not None:
+                self.capture.record(Direction.IN, received_at, message)
             try:
                 log.debug("Rcvd: %s", message)
-                rfq = LiquoriceEnvelope.model_validate_json(message)
-                if rfq.messageType == MessageType.CONNECTED:
+                message_type, rfq = decode(message)
+                if message_type == MessageType.CONNECTED:
                     log.debug("Message type CONNECTED received, ignoring")
                     continue
-                elif rfq.messageType == MessageType.RFQ:
+                elif message_type == MessageType.RFQ:
                     log.debug("Message type RFQ received, processing")
-                    await self.out_rfqs.put(rfq.message)
+                    assert rfq is not None
+                    rfq.received_at = received_at
+                    await self.out_rfqs.put(rfq)
                 else:
-                    log.warning("Unexpected message type Rcvd: %s", rfq.messageType)
-            except ValidationError as e:
+                    log.warning("Unexpected message type Rcvd: %s", message_type)
+            except ValueError as e:  # includes pydantic ValidationError
                 log.error("Validation error: %s", e)
                 continue
 
     async def _writer(self, ws: ClientConnection) -> None:
         """Reads quote from the quotes queue and sends them over the WebSocket."""
         while True:
-            quote_msg = await self.in_quotes.get()
-            assert isinstance(quote_msg, RFQQuoteMessage), "Expected RFQQuoteMessage"
-            raw_msg = LiquoriceEnvelope(
-                message=quote_msg, messageType=MessageType.RFQ_QUOTE
-            ).model_dump_json(exclude_none=True)
+            quote = await self.in_quotes.get()
+            assert isinstance(quote, Quote), "Expected Quote"
+            if self.fast_path:
+                raw_msg = quote.to_envelope_json()
+            else:
+                raw_msg = LiquoriceEnvelope(
+                    message=quote.to_message(), messageType=MessageType.RFQ_QUOTE
+                ).model_dump_json(exclude_none=True)
             await ws.send(raw_msg)
+            if self.capture is not None:
+                self.capture.record(Direction.OUT, time.time(), raw_msg)
             log.debug("Sent: %s", raw_msg)
 
     async def run(self) -> None:
         """Connects to the Liquorice WebSocket and starts reading and writing messages."""
-        async with websockets.connect(self.uri, additional_headers=self.headers) as ws:
-            log.info("Connected to Liquorice WebSocket at %s", self.uri)
-            # Start the reader and writer tasks
-            await asyncio.gather(self._reader(ws), self._writer(ws))
+        if self.capture_path:
+            self.capture = FrameCapture(self.capture_path)
+        try:
+            async with websockets.connect(self.uri, additional_headers=self.headers) as ws:
+                log.info("Connected to Liquorice WebSocket at %s", self.uri)
+                self.connected = True
+                tasks = (
+                    asyncio.create_task(self._reader(ws)),
+                    asyncio.create_task(self._writer(ws)),
+                )
+                try:
+                    # The reader ends when the server closes the connection,
+                    # the writer only on an error
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    self.connected = False
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                for task in done:
+                    task.result()  # raises the error that ended the connection, if any
+        finally:
+            if self.capture is not None:
+                log.info("Captured %d frames to %s", self.capture.frames, self.capture_path)
+                self.capture.close()
+                self.capture = None
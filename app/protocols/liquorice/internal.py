@@ -0,0 +1,267 @@
+"""Lightweight internal RFQ and quote representations.
+
+Pydantic models from `schemas` describe the wire format and are built only at the
+edges (when decoding/encoding in `LiquoriceClient`). Everything between decode and
+serialize (quoter, signer) works with the slotted dataclasses below, which are cheap
+to allocate and free to mutate.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import UUID
+
+from eth_typing import ChecksumAddress, HexAddress, HexStr
+from hexbytes import HexBytes
+
+from .schemas import (
+    MAX_UINT256,
+    LiquoriceEnvelope,
+    MessageType,
+    QuoteLevelLite,
+    RFQMessage,
+    RFQQuoteMessage,
+)
+
+_UUID_RE = re.compile(
+    r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+)
+_ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
+_NONCE_RE = re.compile(r"^(0x)?[0-9a-f]{64}$")
+_AMOUNT_RE = re.compile(r"^\d{1,78}$")
+_JSON_SEPARATORS = (",", ":")
+
+
+@dataclass(slots=True)
+class Rfq:
+    """Internal RFQ representation, the counterpart of `RFQMessage`.
+
+    Ids are kept as canonical (lowercase, hyphenated) UUID strings since they are
+    only ever used in their string form (signing, topics, logging)."""
+
+    chain_id: int
+    solver: Optional[str]
+    solver_rfq_id: str
+    rfq_id: str
+    nonce: bytes
+    base_token: ChecksumAddress
+    quote_token: ChecksumAddress
+    trader: ChecksumAddress
+    effective_trader: ChecksumAddress
+    expiry: int
+    base_token_amount: Optional[int] = None
+    quote_token_amount: Optional[int] = None
+    received_at: float = field(default=0.0, compare=False)  # time.time() of receipt
+
+    @classmethod
+    def from_message(cls, msg: RFQMessage) -> "Rfq":
+        """Build from an already validated `RFQMessage`."""
+        return cls(
+            chain_id=msg.chainId,
+            solver=msg.solver,
+            solver_rfq_id=str(msg.solverRfqId),
+            rfq_id=str(msg.rfqId),
+            nonce=bytes(msg.nonce),
+            base_token=msg.baseToken,
+            quote_token=msg.quoteToken,
+            trader=msg.trader,
+            effective_trader=msg.effectiveTrader,
+            expiry=msg.expiry,
+            base_token_amount=msg.baseTokenAmount,
+            quote_token_amount=msg.quoteTokenAmount,
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Rfq":
+        """Build from a decoded JSON `message` object without pydantic.
+
+        Performs the same checks as `RFQMessage` except address checksum verification
+        (addresses are matched case-insensitively against the markets anyway).
+
+        Raises:
+            ValueError: if the message is malformed
+        """
+        try:
+            chain_id = data["chainId"]
+            if not isinstance(chain_id, int) or isinstance(chain_id, bool):
+                raise ValueError("chainId must be an integer")
+            solver = data.get("solver")
+            if solver is not None and not isinstance(solver, str):
+                raise ValueError("solver must be a string")
+            expiry = data["expiry"]
+            if not isinstance(expiry, int) or not 1750000000 < expiry < 2000000000:
+                raise ValueError("Expiry must be a unix timestamp in seconds")
+            nonce = data["nonce"]
+            if not isinstance(nonce, str) or not _NONCE_RE.match(nonce):
+                raise ValueError("nonce must be a 32-byte hex string")
+            base_token_amount = _parse_amount(data.get("baseTokenAmount"))
+            quote_token_amount = _parse_amount(data.get("quoteTokenAmount"))
+            if bool(base_token_amount) == bool(quote_token_amount):
+                raise ValueError("Exactly one of baseTokenAmount or quoteTokenAmount must be set")
+            return cls(
+                chain_id=chain_id,
+                solver=solver,
+                solver_rfq_id=_parse_uuid(data["solverRfqId"]),
+                rfq_id=_parse_uuid(data["rfqId"]),
+                nonce=bytes.fromhex(nonce[2:] if nonce.startswith("0x") else nonce),
+                base_token=_parse_address(data["baseToken"]),
+                quote_token=_parse_address(data["quoteToken"]),
+                trader=_parse_address(data["trader"]),
+                effective_trader=_parse_address(data["effectiveTrader"]),
+                expiry=expiry,
+                base_token_amount=base_token_amount,
+                quote_token_amount=quote_token_amount,
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Malformed RFQ message: {e!r}") from e
+
+
+@dataclass(slots=True)
+class QuoteLevel:
+    """Internal quote level representation, the counterpart of `QuoteLevelLite`.
+
+    `signer`, `recipient`, `signature` and `eip1271Verifier` stay unset until
+    the level is signed by `Web3Signer`."""
+
+    base_token: ChecksumAddress
+    quote_token: ChecksumAddress
+    base_token_amount: int
+    quote_token_amount: int
+    expiry: int
+    settlement_contract: ChecksumAddress
+    min_quote_token_amount: int = 1
+    signer: Optional[ChecksumAddress] = None
+    recipient: Optional[ChecksumAddress] = None
+    signature: Optional[bytes] = None
+    eip1271_verifier: Optional[ChecksumAddress] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready dict matching `QuoteLevelLite.model_dump(exclude_none=True)` output."""
+        assert self.signer and self.signature is not None, "Quote level must be signed"
+        result: Dict[str, Any] = {
+            "type": "lite",
+            "expiry": self.expiry,
+            "settlementContract": self.settlement_contract,
+            "signer": self.signer,
+        }
+        if self.recipient is not None:
+            result["recipient"] = self.recipient
+        result["baseToken"] = self.base_token
+        result["quoteToken"] = self.quote_token
+        result["baseTokenAmount"] = str(self.base_token_amount)
+        result["quoteTokenAmount"] = str(self.quote_token_amount)
+        result["minQuoteTokenAmount"] = str(self.min_quote_token_amount)
+        result["signature"] = "0x" + self.signature.hex()
+        if self.eip1271_verifier is not None:
+            result["eip1271Verifier"] = self.eip1271_verifier
+        return result
+
+    def to_model(self) -> QuoteLevelLite:
+        """Build the wire-level pydantic model."""
+        assert self.signer and self.signature is not None, "Quote level must be signed"
+        return QuoteLevelLite(
+            expiry=self.expiry,
+            settlementContract=self.settlement_contract,
+            signer=self.signer,
+            recipient=self.recipient,
+            baseToken=self.base_token,
+            quoteToken=self.quote_token,
+            baseTokenAmount=self.base_token_amount,
+            quoteTokenAmount=self.quote_token_amount,
+            minQuoteTokenAmount=self.min_quote_token_amount,
+            signature=HexBytes(self.signature),
+            eip1271Verifier=self.eip1271_verifier,
+        )
+
+
+@dataclass(slots=True)
+class Quote:
+    """Internal quote representation, the counterpart of `RFQQuoteMessage`."""
+
+    rfq_id: str
+    levels: List[QuoteLevel] = field(default_factory=list)
+
+    def to_message(self) -> RFQQuoteMessage:
+        """Build the wire-level pydantic model."""
+        return RFQQuoteMessage(
+            rfqId=UUID(self.rfq_id), levels=[lvl.to_model() for lvl in self.levels]
+        )
+
+    def to_envelope_json(self) -> str:
+        """Serialize to an `rfqQuote` envelope without pydantic.
+
+        Output is identical to `LiquoriceEnvelope(...).model_dump_json(exclude_none=True)`.
+        """
+        return json.dumps(
+            {
+                "messageType": MessageType.RFQ_QUOTE.value,
+                "message": {
+                    "rfqId": self.rfq_id,
+                    "levels": [lvl.to_dict() for lvl in self.levels],
+                },
+            },
+            separators=_JSON_SEPARATORS,
+        )
+
+
+def decode_envelope(raw: Union[str, bytes]) -> Tuple[MessageType, Optional[Rfq]]:
+    """Decode an inbound envelope with pydantic and convert RFQs to `Rfq`.
+
+    Raises:
+        ValueError: if the message is malformed (including pydantic `ValidationError`)
+    """
+    envelope = LiquoriceEnvelope.model_validate_json(raw)
+    if envelope.messageType == MessageType.RFQ:
+        assert isinstance(envelope.message, RFQMessage)
+        return envelope.messageType, Rfq.from_message(envelope.message)
+    return envelope.messageType, None
+
+
+def decode_envelope_fast(raw: Union[str, bytes]) -> Tuple[MessageType, Optional[Rfq]]:
+    """Decode an inbound envelope with `json` only, building no pydantic models.
+
+    Raises:
+        ValueError: if the message is malformed
+    """
+    data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("Envelope must be a JSON object")
+    try:
+        message_type = MessageType(data.get("messageType"))
+    except ValueError as e:
+        raise ValueError(f"Unknown message type: {data.get('messageType')}") from e
+    message = data.get("message")
+    if not isinstance(message, dict):
+        raise ValueError("Envelope message must be a JSON object")
+    if message_type == MessageType.RFQ:
+        return message_type, Rfq.from_dict(message)
+    return message_type, None
+
+
+def _parse_uuid(v: Any) -> str:
+    if not isinstance(v, str) or not _UUID_RE.match(v):
+        raise ValueError(f"Bad UUID: {v}")
+    return v.lower()
+
+
+def _parse_address(v: Any) -> ChecksumAddress:
+    if not isinstance(v, str) or not _ADDRESS_RE.match(v):
+        raise ValueError(f"Bad Ethereum address: {v}")
+    return ChecksumAddress(HexAddress(HexStr(v)))
+
+
+def _parse_amount(v: Any) -> Optional[int]:
+    if v is None:
+        return None
+    if isinstance(v, str):
+        if not _AMOUNT_RE.match(v):
+            raise ValueError("Amount must be a string containing only digits")
+        amount = int(v)
+    elif not isinstance(v, int) or isinstance(v, bool) or v < 0:
+        raise ValueError("Amount must be a non-negative integer or string")
+    else:
+        amount = v
+    if amount > MAX_UINT256:
+        raise ValueError("Amount exceeds maximum token value (256 bits)")
+    return amount
@@ -1,6 +1,6 @@
 import logging
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Union
 from uuid import UUID
 
 from eth_abi import encode
@@ -12,6 +12,7 @@ from web3 import Web3
 
 from app.evm.registry import ChainRegistry
 
+from .internal import Quote, QuoteLevel, Rfq
 from .schemas import RFQMessage, RFQQuoteMessage
 
 EIP712_DOMAIN_TYPEHASH = keccak(
@@ -38,11 +39,11 @@ class SignableRfqQuoteLevel:
     effective_trader: ChecksumAddress
     quote_expiry: int
     min_quote_token_amount: int
-    nonce: HexBytes
+    nonce: bytes
     quote_token: ChecksumAddress
     quote_token_amount: int
     recipient: ChecksumAddress
-    rfq_id: UUID
+    rfq_id: Union[UUID, str]
     market: ChecksumAddress
     trader: ChecksumAddress
 
@@ -123,8 +124,41 @@ class Web3Signer:
     def sign_quote_levels(
         self, rfq: RFQMessage, quote: RFQQuoteMessage
     ) -> Optional[RFQQuoteMessage]:
-        """Sign RFQ quote levels with the account's private key."""
-        chain_id = rfq.chainId
+        """Sign RFQ quote levels of the wire-level pydantic models.
+
+        Thin adapter over `sign_quote` for callers holding pydantic models."""
+        signed_quote = self.sign_quote(
+            Rfq.from_message(rfq),
+            Quote(
+                rfq_id=str(quote.rfqId),
+                levels=[
+                    QuoteLevel(
+                        base_token=lvl.baseToken,
+                        quote_token=lvl.quoteToken,
+                        base_token_amount=lvl.baseTokenAmount,
+                        quote_token_amount=lvl.quoteTokenAmount,
+                        expiry=lvl.expiry,
+                        settlement_contract=lvl.settlementContract,
+                        min_quote_token_amount=lvl.minQuoteTokenAmount,
+                    )
+                    for lvl in quote.levels
+                ],
+            ),
+        )
+        if not signed_quote:
+            return None
+        for quote_level, signed_lvl in zip(quote.levels, signed_quote.levels):
+            assert signed_lvl.signer and signed_lvl.signature is not None
+            quote_level.signature = HexBytes(signed_lvl.signature)
+            quote_level.eip1271Verifier = signed_lvl.eip1271_verifier
+            quote_level.recipient = signed_lvl.recipient
+            quote_level.signer = signed_lvl.signer
+            quote_level.settlementContract = signed_lvl.settlement_contract
+        return quote
+
+    def sign_quote(self, rfq: Rfq, quote: Quote) -> Optional[Quote]:
+        """Sign internal quote levels in place with the account's private key."""
+        chain_id = rfq.chain_id
         if chain_id not in self.chain_registry.chain_by_id:
             log.error("Chain ID %s not found in chain registry", chain_id)
             return None
@@ -135,30 +169,28 @@ class Web3Signer:
         assert chain.skeeper_address
         assert chain.liquorice_settlement_address
         for quote_level in quote.levels:
-            quote_level.recipient = self.account.address
-            quote_level.signer = self.account.address
             signable_lvl = SignableRfqQuoteLevel(
-                base_token=quote_level.baseToken,
-                base_token_amount=quote_level.baseTokenAmount,
-                chain_id=rfq.chainId,
-                effective_trader=rfq.effectiveTrader,
+                base_token=quote_level.base_token,
+                base_token_amount=quote_level.base_token_amount,
+                chain_id=rfq.chain_id,
+                effective_trader=rfq.effective_trader,
                 quote_expiry=quote_level.expiry,
-                min_quote_token_amount=quote_level.minQuoteTokenAmount,
+                min_quote_token_amount=quote_level.min_quote_token_amount,
                 nonce=rfq.nonce,
-                quote_token=quote_level.quoteToken,
-                quote_token_amount=quote_level.quoteTokenAmount,
+                quote_token=quote_level.quote_token,
+                quote_token_amount=quote_level.quote_token_amount,
                 # Both recipient and EIP-1271 verifier are same if you use SKeeper contract address
                 recipient=chain.skeeper_address,
-                rfq_id=quote.rfqId,
-                market=quote_level.settlementContract,
+                rfq_id=quote.rfq_id,
+                market=quote_level.settlement_contract,
                 trader=rfq.trader,
                 settlement_contract=chain.liquorice_settlement_address,
             )
             quote_level.signature = self.account.unsafe_sign_hash(signable_lvl.hash).signature
             # Both recipient and EIP-1271 verifier are same if you use SKeeper contract address
-            quote_level.eip1271Verifier = chain.skeeper_address
+            quote_level.eip1271_verifier = chain.skeeper_address
             quote_level.recipient = chain.skeeper_address
             quote_level.signer = self.account.address
-            quote_level.settlementContract = chain.liquorice_settlement_address
+            quote_level.settlement_contract = chain.liquorice_settlement_address
 
         return quote
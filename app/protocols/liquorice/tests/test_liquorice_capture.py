@@ -0,0 +1,64 @@
+import pytest
+
+from app.protocols.liquorice.capture import (
+    CAPTURE_MAGIC,
+    Direction,
+    FrameCapture,
+    read_capture,
+)
+
+
+def test_capture_roundtrip(tmp_path):
+    """Frames are read back in order with timestamps, direction and exact payload."""
+    path = str(tmp_path / "frames.lqcap")
+    capture = FrameCapture(path)
+    capture.record(Direction.IN, 1.5, '{"messageType":"rfq"}')
+    capture.record(Direction.OUT, 2.25, b'{"messageType":"rfqQuote"}')
+    capture.record(Direction.IN, 3.0, "")
+    capture.close()
+    capture.record(Direction.IN, 4.0, "after close is ignored")
+    assert capture.frames == 3
+
+    frames = list(read_capture(path))
+    assert [(f.ts, f.direction, f.data) for f in frames] == [
+        (1.5, Direction.IN, b'{"messageType":"rfq"}'),
+        (2.25, Direction.OUT, b'{"messageType":"rfqQuote"}'),
+        (3.0, Direction.IN, b""),
+    ]
+
+
+def test_capture_appends(tmp_path):
+    """Reopening appends records without a second header."""
+    path = str(tmp_path / "frames.lqcap")
+    for ts in (1.0, 2.0):
+        capture = FrameCapture(path)
+        capture.record(Direction.IN, ts, "x")
+        capture.close()
+    assert [f.ts for f in read_capture(path)] == [1.0, 2.0]
+    assert open(path, "rb").read().count(CAPTURE_MAGIC) == 1
+
+
+def test_capture_flushes_periodically(tmp_path):
+    path = str(tmp_path / "frames.lqcap")
+    capture = FrameCapture(path, flush_interval=0)
+    capture.record(Direction.IN, 1.0, "x")
+    # readable before close
+    assert len(list(read_capture(path))) == 1
+    capture.close()
+
+
+def test_read_capture_skips_truncated_record(tmp_path):
+    path = tmp_path / "frames.lqcap"
+    capture = FrameCapture(str(path))
+    capture.record(Direction.IN, 1.0, "complete")
+    capture.record(Direction.IN, 2.0, "truncated")
+    capture.close()
+    path.write_bytes(path.read_bytes()[:-3])
+    assert [f.data for f in read_capture(str(path))] == [b"complete"]
+
+
+def test_read_capture_rejects_other_files(tmp_path):
+    path = tmp_path / "other.json"
+    path.write_text("{}")
+    with pytest.raises(ValueError):
+        list(read_capture(str(path)))
@@ -9,11 +9,12 @@ import pytest
 from eth_typing import HexStr
 
 from app.config.maker import MakerConfig
+from app.protocols.liquorice.capture import Direction, read_capture
 from app.protocols.liquorice.client import LiquoriceClient
+from app.protocols.liquorice.internal import Quote, QuoteLevel, Rfq
 from app.protocols.liquorice.schemas import (
     LiquoriceEnvelope,
     MessageType,
-    RFQMessage,
     RFQQuoteMessage,
 )
 
@@ -23,12 +24,14 @@ class MockWsConnection:
     - Receiving predefined messages from a queue
     - Sending messages back through the connection
     - Tracking message completion with events
+    - Staying open once all messages are received, until closed by the server
 
     Attributes:
         sent (List[str]): Messages that have been actually sent through the connection
         msgs_expected_to_be_sent (List[str]): Messages expected to be sent (now only counted)
         msg_all_received (asyncio.Event): Set when all messages are received
         msg_all_sent (asyncio.Event): Set when all expected messages are sent
+        closed (asyncio.Event): Set to close the connection cleanly from the server side
         _recv (asyncio.Queue[str]): Queue containing messages to be received
     """
 
@@ -39,6 +42,7 @@ class MockWsConnection:
         self.msgs_expected_to_be_sent = msgs_expected_to_be_sent
         self.msg_all_received = asyncio.Event()
         self.msg_all_sent = asyncio.Event()
+        self.closed = asyncio.Event()
         self._recv = asyncio.Queue()  # Queue for incoming RFQs (to receive from mocked WebSocket)
         for msg in msgs_to_receive:
             self._recv.put_nowait(msg)
@@ -48,6 +52,7 @@ class MockWsConnection:
             while not self._recv.empty():
                 yield await self._recv.get()
             self.msg_all_received.set()
+            await self.closed.wait()
 
         return iter_msgs()
 
@@ -65,13 +70,37 @@ quote_lite_msg_dto = RFQQuoteMessage.model_validate_json(quote_lite_text_msg_onl
 expected_quote_raw_msg = LiquoriceEnvelope(
     message=quote_lite_msg_dto, messageType=MessageType.RFQ_QUOTE
 ).model_dump_json(exclude_none=True)
+quote_internal = Quote(
+    rfq_id=str(quote_lite_msg_dto.rfqId),
+    levels=[
+        QuoteLevel(
+            base_token=lvl.baseToken,
+            quote_token=lvl.quoteToken,
+            base_token_amount=lvl.baseTokenAmount,
+            quote_token_amount=lvl.quoteTokenAmount,
+            expiry=lvl.expiry,
+            settlement_contract=lvl.settlementContract,
+            min_quote_token_amount=lvl.minQuoteTokenAmount,
+            signer=lvl.signer,
+            recipient=lvl.recipient,
+            signature=bytes(lvl.signature),
+        )
+        for lvl in quote_lite_msg_dto.levels
+    ],
+)
 
 
 @pytest.mark.asyncio
-async def test_liquorice_client_run_relays_messages():
+@pytest.mark.parametrize("fast_path", [False, True])
+async def test_liquorice_client_run_relays_messages(fast_path: bool):
     """Test the LiquoriceClient's run method relays messages between respective queues and websocket."""
     client = LiquoriceClient(
-        MakerConfig(maker="maker_name", authorization="auth", signer_priv_key=HexStr("0x00"))
+        MakerConfig(
+            maker="maker_name",
+            authorization="auth",
+            signer_priv_key=HexStr("0x00"),
+            fast_path=fast_path,
+        )
     )
 
     # Mock WebSocket connection
@@ -81,7 +110,7 @@ async def test_liquorice_client_run_relays_messages():
     )
 
     # TODO: Put realistic quote into the outbound queue
-    await client.in_quotes.put(quote_lite_msg_dto)
+    await client.in_quotes.put(quote_internal)
 
     with patch(
         "app.protocols.liquorice.client.websockets.connect",
@@ -92,19 +121,81 @@ async def test_liquorice_client_run_relays_messages():
 
         await asyncio.wait_for(ws_mock.msg_all_received.wait(), timeout=1)
         await asyncio.wait_for(ws_mock.msg_all_sent.wait(), timeout=1)
+        assert client.connected
 
         task.cancel()
         with pytest.raises(asyncio.CancelledError):
             await task
+        assert not client.connected
 
         assert not client.out_rfqs.empty()
         rfq = await client.out_rfqs.get()
-        assert isinstance(rfq, RFQMessage)
-        assert rfq.solverRfqId == UUID("95a0f428-a6c4-4207-81b2-e47436741e9b")
-        assert rfq.rfqId == UUID("846063db-1769-438b-8002-00fd981603df")
-        assert rfq.chainId == 42161
+        assert isinstance(rfq, Rfq)
+        assert UUID(rfq.solver_rfq_id) == UUID("95a0f428-a6c4-4207-81b2-e47436741e9b")
+        assert UUID(rfq.rfq_id) == UUID("846063db-1769-438b-8002-00fd981603df")
+        assert rfq.chain_id == 42161
         assert rfq.solver == "portus"
 
         assert client.in_quotes.empty()
         assert len(ws_mock.sent) == 1
         assert ws_mock.sent[0] == expected_quote_raw_msg
+
+
+@pytest.mark.asyncio
+async def test_liquorice_client_captures_frames(tmp_path):
+    """With a capture path every inbound and outbound frame is appended to the capture."""
+    capture_path = str(tmp_path / "frames.lqcap")
+    client = LiquoriceClient(
+        MakerConfig(
+            maker="maker_name",
+            authorization="auth",
+            signer_priv_key=HexStr("0x00"),
+            capture_path=capture_path,
+        )
+    )
+    ws_mock = MockWsConnection(
+        msgs_to_receive=[connected_text, rfq_text],
+        msgs_expected_to_be_sent=[expected_quote_raw_msg],
+    )
+    await client.in_quotes.put(quote_internal)
+
+    with patch(
+        "app.protocols.liquorice.client.websockets.connect",
+        return_value=AsyncMock(__aenter__=AsyncMock(return_value=ws_mock)),
+    ):
+        task = asyncio.create_task(client.run())
+        await asyncio.wait_for(ws_mock.msg_all_received.wait(), timeout=1)
+        await asyncio.wait_for(ws_mock.msg_all_sent.wait(), timeout=1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert client.capture is None
+
+    frames = list(read_capture(capture_path))
+    assert [f.direction for f in frames] == [Direction.IN, Direction.IN, Direction.OUT]
+    assert frames[0].data.decode() == connected_text
+    assert frames[1].data.decode() == rfq_text
+    assert frames[2].data.decode() == expected_quote_raw_msg
+    assert all(0 < f.ts for f in frames)
+
+
+@pytest.mark.asyncio
+async def test_liquorice_client_server_close_disconnects():
+    """A clean close by the server ends `run()` and clears the connected flag."""
+    client = LiquoriceClient(
+        MakerConfig(maker="maker_name", authorization="auth", signer_priv_key=HexStr("0x00"))
+    )
+    ws_mock = MockWsConnection(msgs_to_receive=[connected_text])
+
+    with patch(
+        "app.protocols.liquorice.client.websockets.connect",
+        return_value=AsyncMock(__aenter__=AsyncMock(return_value=ws_mock)),
+    ):
+        task = asyncio.create_task(client.run())
+        await asyncio.wait_for(ws_mock.msg_all_received.wait(), timeout=1)
+        assert client.connected
+
+        ws_mock.closed.set()
+        await asyncio.wait_for(task, timeout=1)
+        assert not client.connected
+        assert not ws_mock.sent
@@ -0,0 +1,118 @@
+import json
+from pathlib import Path
+
+import pytest
+from hexbytes import HexBytes
+
+from app.protocols.liquorice.internal import (
+    Quote,
+    QuoteLevel,
+    Rfq,
+    decode_envelope,
+    decode_envelope_fast,
+)
+from app.protocols.liquorice.schemas import (
+    LiquoriceEnvelope,
+    MessageType,
+    RFQQuoteMessage,
+)
+
+connected_text = (Path(__file__).parent / "data" / "connected_msg.json").read_text()
+rfq_text = (Path(__file__).parent / "data" / "liquorice_rfq.json").read_text()
+quote_text = (Path(__file__).parent / "data" / "liquorice_quote_lite.json").read_text()
+quote_msg = RFQQuoteMessage.model_validate_json(json.dumps(json.loads(quote_text)["message"]))
+
+
+def _rfq_text_with(**overrides) -> str:
+    rfq_dict = json.loads(rfq_text)
+    rfq_dict["message"].update(overrides)
+    return json.dumps(rfq_dict)
+
+
+def _signed_quote() -> Quote:
+    lvl = quote_msg.levels[0]
+    return Quote(
+        rfq_id=str(quote_msg.rfqId),
+        levels=[
+            QuoteLevel(
+                base_token=lvl.baseToken,
+                quote_token=lvl.quoteToken,
+                base_token_amount=lvl.baseTokenAmount,
+                quote_token_amount=lvl.quoteTokenAmount,
+                expiry=lvl.expiry,
+                settlement_contract=lvl.settlementContract,
+                min_quote_token_amount=lvl.minQuoteTokenAmount,
+                signer=lvl.signer,
+                recipient=lvl.recipient,
+                signature=bytes(lvl.signature),
+            )
+        ],
+    )
+
+
+def test_fast_decode_matches_pydantic_decode():
+    msg_type, rfq = decode_envelope(rfq_text)
+    fast_msg_type, fast_rfq = decode_envelope_fast(rfq_text)
+    assert msg_type == fast_msg_type == MessageType.RFQ
+    assert isinstance(rfq, Rfq)
+    assert rfq == fast_rfq
+    assert rfq.rfq_id == "846063db-1769-438b-8002-00fd981603df"
+    assert rfq.nonce == HexBytes(
+        "0xade8af8413607c37361fcebe3b00cc3de354986c188efe9d6db0fa8c74843ad0"
+    )
+    assert rfq.base_token_amount == 6358600000
+    assert rfq.quote_token_amount is None
+
+
+@pytest.mark.parametrize("decode", [decode_envelope, decode_envelope_fast])
+def test_decode_connected(decode):
+    assert decode(connected_text) == (MessageType.CONNECTED, None)
+
+
+@pytest.mark.parametrize("decode", [decode_envelope, decode_envelope_fast])
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"baseTokenAmount": None},
+        {"quoteTokenAmount": "1"},
+        {"baseTokenAmount": "-1"},
+        {"baseTokenAmount": "1" * 79},
+        {"expiry": 1},
+        {"nonce": "0xabc"},
+        {"rfqId": "not-a-uuid"},
+        {"baseToken": "0x123"},
+    ],
+)
+def test_decode_rejects_invalid_rfq(decode, overrides):
+    with pytest.raises(ValueError):
+        decode(_rfq_text_with(**overrides))
+
+
+def test_fast_decode_rejects_malformed_envelope():
+    with pytest.raises(ValueError):
+        decode_envelope_fast("[]")
+    with pytest.raises(ValueError):
+        decode_envelope_fast('{"messageType": "bogus", "message": {}}')
+    with pytest.raises(ValueError):
+        decode_envelope_fast('{"messageType": "rfq", "message": {}}')
+
+
+def test_quote_serialization_matches_pydantic():
+    quote = _signed_quote()
+    expected = LiquoriceEnvelope(
+        message=quote_msg, messageType=MessageType.RFQ_QUOTE
+    ).model_dump_json(exclude_none=True)
+    assert quote.to_envelope_json() == expected
+    assert (
+        LiquoriceEnvelope(
+            message=quote.to_message(), messageType=MessageType.RFQ_QUOTE
+        ).model_dump_json(exclude_none=True)
+        == expected
+    )
+
+
+def test_unsigned_quote_is_not_serializable():
+    quote = _signed_quote()
+    quote.levels[0].signature = None
+    with pytest.raises(AssertionError):
+        quote.to_envelope_json()
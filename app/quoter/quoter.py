@@ -1,45 +1,91 @@
 """A service to handle RFQs and send quotes"""
 
 import asyncio
+import os
+import time
 from contextlib import suppress
-from decimal import Decimal
 from logging import getLogger
-from typing import AsyncIterator
+from typing import AsyncIterator, Optional, Tuple, Union
 
-from hexbytes import HexBytes
 from web3.main import to_checksum_address
 
 from app.evm.const import ERC20_ZERO_ADDRESS as ZERO_ADDRESS
+from app.evm.settlement import SettlementTracker
+from app.markets.levels import PairLevels
 from app.markets.markets import MarketState
-from app.metrics.metrics import metrics
-from app.protocols.liquorice.schemas import QuoteLevelLite, RFQMessage, RFQQuoteMessage
+from app.metrics.metrics import RfqPair, metrics
+from app.protocols.liquorice.internal import Quote, QuoteLevel, Rfq
 from app.protocols.liquorice.signer import Web3Signer
+from app.schemas.token import ERC20Token
+
+from .recorder import RFQ_RECORDER_MEMORY_MB, FlightRecorder
+
+ZERO_CHECKSUM_ADDRESS = to_checksum_address(ZERO_ADDRESS)
 
 log = getLogger(__name__)
 
 
-class LiquoriceQuoter:
+def max_balance_age_blocks_from_env() -> Optional[int]:
+    """`QUOTER_MAX_BALANCE_AGE_BLOCKS` env var, None (no limit) if unset."""
+    value = os.getenv("QUOTER_MAX_BALANCE_AGE_BLOCKS")
+    return int(value) if value else None
+
+
+def confirmations_from_env() -> int:
+    """`QUOTER_CONFIRMATIONS` env var, 0 (latest balances) if unset."""
+    return int(os.getenv("QUOTER_CONFIRMATIONS", "0"))
+
+
+class LiquoriceQuoter:  # pylint: disable=too-many-instance-attributes
     """Responder service singleton that reads RFQs from a queue
     and sends quotes back (if quoting conditions satisfy)"""
 
-    in_rfqs: asyncio.Queue[RFQMessage]
-    out_quotes: asyncio.Queue[RFQQuoteMessage]
+    in_rfqs: asyncio.Queue[Rfq]
+    out_quotes: asyncio.Queue[Quote]
     markets: MarketState
     signer: Web3Signer
+    last_quote_ts: float
+    recorder: FlightRecorder
+    max_balance_age_blocks: Optional[int]
+    max_restored_age_blocks: Optional[int]
+    settlements: Optional[SettlementTracker]
+    confirmations: int
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments
         self,
-        in_rfqs: asyncio.Queue[RFQMessage],
-        out_quotes: asyncio.Queue[RFQQuoteMessage],
+        in_rfqs: asyncio.Queue[Rfq],
+        out_quotes: asyncio.Queue[Quote],
         markets: MarketState,
         signer: Web3Signer,
+        *,
+        recorder: Optional[FlightRecorder] = None,
+        max_balance_age_blocks: Optional[int] = None,
+        max_restored_age_blocks: Optional[int] = None,
+        settlements: Optional[SettlementTracker] = None,
+        confirmations: int = 0,
     ) -> None:
+        """
+        Args:
+            max_balance_age_blocks: Ignore RFQs when the quote token balance was read
+                more than this many blocks behind the chain head, None for no limit.
+            max_restored_age_blocks: Same for balances restored from a checkpoint and
+                not reconciled with the chain yet.
+            settlements: Tracks the settlement of the quotes sent.
+            confirmations: Quote the balances with this many confirmations (an incoming
+                transfer counts once this many blocks are on top of it), 0 for the latest.
+        """
         self.in_rfqs = in_rfqs
         self.out_quotes = out_quotes
         self.markets = markets
         self.signer = signer
+        self.last_quote_ts = 0.0  # time.time() of the last quote sent, read by health checks
+        self.recorder = recorder or FlightRecorder.from_memory_budget(RFQ_RECORDER_MEMORY_MB)
+        self.max_balance_age_blocks = max_balance_age_blocks
+        self.max_restored_age_blocks = max_restored_age_blocks
+        self.settlements = settlements
+        self.confirmations = confirmations
 
-    async def rfq_stream(self) -> AsyncIterator[RFQMessage]:
+    async def rfq_stream(self) -> AsyncIterator[Rfq]:
         """Stream RFQs from the input queue."""
         while True:
             rfq = await self.in_rfqs.get()
@@ -48,78 +94,157 @@ class LiquoriceQuoter:
             finally:
                 self.in_rfqs.task_done()
 
+    def outcome(
+        self,
+        slot: int,
+        metrics_labels: RfqPair,
+        status: str,
+        amounts: Optional[Tuple[int, int]] = None,
+    ) -> None:
+        """Account the outcome of an RFQ in metrics and the flight recorder,
+        `amounts` are the base and quote token amounts of a quote sent."""
+        metrics.count_rfq(metrics_labels, status)
+        base_token_amount, quote_token_amount = amounts or (None, None)
+        self.recorder.finish(slot, status, base_token_amount, quote_token_amount)
+
+    def max_balance_age(self, token: ERC20Token) -> Optional[int]:
+        """Blocks the token balance may trail the chain head to be quoted, None for no limit."""
+        limits = [self.max_balance_age_blocks]
+        if token.chain.balances_restored:
+            limits.append(self.max_restored_age_blocks)
+        return min((limit for limit in limits if limit is not None), default=None)
+
+    @staticmethod
+    def low_quote_token_status(token: ERC20Token) -> str:
+        """RFQ status when nothing of the quote token is available to quote."""
+        if not token.raw_balance:
+            return "LOW_QT_BALANCE"
+        if not token.raw_spendable:
+            return "LOW_QT_ALLOWANCE"
+        if token.raw_reserved:
+            return "LOW_QT_RESERVED"
+        return "LOW_QT_BALANCE"
+
+    def market(self, rfq: Rfq) -> Union[str, Tuple[ERC20Token, ERC20Token, PairLevels]]:
+        """Base token, quote token and price levels to quote an RFQ, or the status it is
+        ignored with."""
+        base_token = self.markets.get_token(rfq.base_token, rfq.chain_id)
+        if not base_token:
+            log.info("BaseToken %s unsupported. Ignoring RFQ: %s", rfq.base_token, rfq.rfq_id)
+            return "UNSUPPORTED_BT"
+        quote_token = self.markets.get_token(rfq.quote_token, rfq.chain_id)
+        if not quote_token:
+            log.info("QuoteToken %s unsupported. Ignoring RFQ: %s", rfq.quote_token, rfq.rfq_id)
+            return "UNSUPPORTED_QT"
+        max_age = self.max_balance_age(quote_token)
+        if (
+            max_age is not None
+            and quote_token.chain.head_block - quote_token.last_updated_block > max_age
+        ):
+            log.info(
+                "Stale %s balance (block %d, head %d). Ignoring RFQ %s",
+                quote_token.symbol,
+                quote_token.last_updated_block,
+                quote_token.chain.head_block,
+                rfq.rfq_id,
+            )
+            return "STALE_BALANCE"
+        if not self.markets.shortest_path(base_token, quote_token):
+            log.info("No market path for RFQ %s. Ignoring", rfq.rfq_id)
+            return "NO_PATH"
+        pair_levels = self.markets.levels.snapshot.get(
+            rfq.chain_id, base_token.address, quote_token.address
+        )
+        if not pair_levels:
+            log.info("No price levels for RFQ %s. Ignoring", rfq.rfq_id)
+            return "NO_LEVELS"
+        return base_token, quote_token, pair_levels
+
+    def amounts(
+        self, rfq: Rfq, base_token: ERC20Token, quote_token: ERC20Token, pair_levels: PairLevels
+    ) -> Optional[Tuple[int, int]]:
+        """Raw amounts of base token received and quote token sent for an RFQ, capped by
+        the quote token available. None if the price levels are too shallow."""
+        available = quote_token.raw_available_confirmed(self.confirmations)
+        if rfq.base_token_amount:
+            # exact-in: trader sends a fixed amount of base token
+            quote_raw_amount = pair_levels.quote_for_base(
+                rfq.base_token_amount, base_token.decimals, quote_token.decimals
+            )
+            if quote_raw_amount is None:
+                return None
+            return rfq.base_token_amount, min(quote_raw_amount, available)
+        # exact-out: trader wants a fixed amount of quote token
+        send_quote_token_raw_amount = min(rfq.quote_token_amount or 0, available)
+        base_raw_amount = pair_levels.base_for_quote(
+            send_quote_token_raw_amount, base_token.decimals, quote_token.decimals
+        )
+        if base_raw_amount is None:
+            return None
+        return base_raw_amount, send_quote_token_raw_amount
+
+    async def process(self, rfq: Rfq, slot: int, metrics_labels: RfqPair) -> None:
+        """Price, sign and send the quote of an RFQ, accounting its outcome."""
+        log.debug("Processing RFQ: %s", rfq)
+        market = self.market(rfq)
+        if isinstance(market, str):
+            self.outcome(slot, metrics_labels, market)
+            return
+        base_token, quote_token, pair_levels = market
+        amounts = self.amounts(rfq, base_token, quote_token, pair_levels)
+        if amounts is None:
+            log.info("Price levels too shallow for RFQ %s. Ignoring", rfq.rfq_id)
+            self.outcome(slot, metrics_labels, "LOW_DEPTH")
+            return
+        receive_base_token_raw_amount, send_quote_token_raw_amount = amounts
+        if send_quote_token_raw_amount == 0:
+            log.info("No quote tokens available for RFQ %s: %s", rfq.rfq_id, rfq.quote_token)
+            self.outcome(slot, metrics_labels, self.low_quote_token_status(quote_token))
+            return
+        self.recorder.stage(slot, "priced")
+        # signer, recipient and signature are set later by Web3 Signer
+        quote_lvl = QuoteLevel(
+            base_token=base_token.address,
+            quote_token=quote_token.address,
+            base_token_amount=receive_base_token_raw_amount,
+            quote_token_amount=send_quote_token_raw_amount,
+            expiry=rfq.expiry + 30,
+            settlement_contract=ZERO_CHECKSUM_ADDRESS,
+            min_quote_token_amount=1,
+        )
+        non_signed_quote = Quote(rfq_id=rfq.rfq_id, levels=[quote_lvl])
+        signed_quote = self.signer.sign_quote(rfq, non_signed_quote)
+        if not signed_quote:
+            log.error("Failed to sign quote for RFQ: %s", rfq.rfq_id)
+            self.outcome(slot, metrics_labels, "SIGN_FAILED")
+            return
+        self.recorder.stage(slot, "signed")
+        log.info(
+            "Sending quote for RFQ %s: %d %s for %d %s",
+            rfq.rfq_id,
+            receive_base_token_raw_amount,
+            base_token.symbol,
+            send_quote_token_raw_amount,
+            quote_token.symbol,
+        )
+        log.debug("Signed quote: %s", signed_quote)
+        await self.out_quotes.put(signed_quote)
+        self.recorder.stage(slot, "sent")
+        if self.settlements is not None:
+            self.settlements.quote_sent(
+                rfq, quote_token, send_quote_token_raw_amount, quote_lvl.expiry
+            )
+        self.outcome(slot, metrics_labels, "QUOTE_SENT", amounts)
+        self.last_quote_ts = time.time()
+
     async def run(self) -> None:
         """Process RFQs from queue until cancelled."""
         with suppress(asyncio.CancelledError):
             async for rfq in self.rfq_stream():
-                metrics_labels = {
-                    "chain_id": rfq.chainId,
-                    "solver": rfq.solver,
-                    "base_token": rfq.baseToken,
-                    "quote_token": rfq.quoteToken,
-                }
+                metrics_labels = (rfq.chain_id, rfq.solver, rfq.base_token, rfq.quote_token)
+                slot = self.recorder.start(rfq)
                 try:
-                    log.debug("Processing RFQ: %s", rfq)
-                    base_token = self.markets.get_token(rfq.baseToken, rfq.chainId)
-                    if not base_token:
-                        log.info(
-                            "BaseToken %s unsupported. Ignoring RFQ: %s", rfq.baseToken, rfq.rfqId
-                        )
-                        metrics.rfqs_total.labels(**metrics_labels, status="UNSUPPORTED_BT").inc()
-                        continue
-                    quote_token = self.markets.get_token(rfq.quoteToken, rfq.chainId)
-                    if not quote_token:
-                        log.info(
-                            "QuoteToken %s unsupported. Ignoring RFQ: %s",
-                            rfq.quoteToken,
-                            rfq.rfqId,
-                        )
-                        metrics.rfqs_total.labels(**metrics_labels, status="UNSUPPORTED_QT").inc()
-                        continue
-                    path = self.markets.shortest_path(base_token, quote_token)
-                    assert path, "No path found for RFQ"
-                    assert isinstance(rfq.baseTokenAmount, int)
-                    assert rfq.baseTokenAmount > 0
-                    receive_base_token_amount = base_token.raw_to_decimal(rfq.baseTokenAmount)
-                    send_quote_token_amount = min(
-                        receive_base_token_amount * Decimal("1.05"), quote_token.balance
-                    )
-                    send_quote_token_raw_amount = quote_token.decimal_to_raw(
-                        send_quote_token_amount
-                    )
-                    if send_quote_token_amount == 0:
-                        log.info(
-                            "No quote tokens available for RFQ %s: %s",
-                            rfq.rfqId,
-                            rfq.quoteToken,
-                        )
-                        metrics.rfqs_total.labels(**metrics_labels, status="LOW_QT_BALANCE").inc()
-                        continue
-                    quote_lvl = QuoteLevelLite(
-                        baseToken=base_token.address,
-                        quoteToken=quote_token.address,
-                        baseTokenAmount=int(rfq.baseTokenAmount),
-                        quoteTokenAmount=send_quote_token_raw_amount,
-                        expiry=rfq.expiry + 30,
-                        settlementContract=to_checksum_address(ZERO_ADDRESS),
-                        minQuoteTokenAmount=1,
-                        signer=to_checksum_address(
-                            ZERO_ADDRESS
-                        ),  # Placeholder, will be set later by Web3 Signer
-                        recipient=to_checksum_address(ZERO_ADDRESS),  # Placeholder
-                        signature=HexBytes("00" * 65),  # Placeholder
-                    )
-                    non_signed_quote = RFQQuoteMessage(rfqId=rfq.rfqId, levels=[quote_lvl])
-                    signed_quote = self.signer.sign_quote_levels(rfq, non_signed_quote)
-                    if not signed_quote:
-                        log.error("Failed to sign quote for RFQ: %s", rfq.rfqId)
-                        continue
-                    log.info("Sending quote for RFQ %s: %s", rfq.rfqId, signed_quote)
-                    await self.out_quotes.put(signed_quote)
-                    metrics.rfqs_total.labels(**metrics_labels, status="QUOTE_SENT").inc()
-
+                    await self.process(rfq, slot, metrics_labels)
                 except Exception as e:  # pylint: disable=broad-exception-caught
                     log.error("Failed to process RFQ: %s", e)
-                    metrics.rfqs_total.labels(
-                        **metrics_labels, status="QUOTER_UNHANDLED_EXC"
-                    ).inc()
+                    self.outcome(slot, metrics_labels, "QUOTER_UNHANDLED_EXC")
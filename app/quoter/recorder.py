@@ -0,0 +1,156 @@
+"""RFQ flight recorder.
+
+Keeps compact lifecycle records of the most recent RFQs in a preallocated columnar
+ring buffer: one list per field, a record is a slot index. Recording is a handful of
+list item assignments, with no allocation besides the values themselves.
+The buffer is dumped on demand from `/debug/rfqs`.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Response
+
+from app.protocols.liquorice.internal import Rfq
+
+RFQ_RECORDER_MEMORY_MB = 8.0  # default memory budget of the recorder
+# Approximate size of one record: 14 list slots, floats, ints and the strings
+# (ids, addresses) which are kept alive after the RFQ itself is gone.
+RFQ_RECORD_BYTES = 512
+
+# Stage timestamp columns, dumped as microsecond offsets from `received`
+STAGES = ("started", "priced", "signed", "sent")
+COLUMNS = (
+    "rfq_id",
+    "solver_rfq_id",
+    "solver",
+    "chain_id",
+    "base_token",
+    "quote_token",
+    "base_token_amount",
+    "quote_token_amount",
+    "status",
+    "received",
+) + STAGES
+
+
+def columnar_snapshot(
+    columns: Dict[str, List[Any]], count: int, capacity: int, limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """Ordered columnar dump of the last `limit` of `count` records of a ring buffer.
+
+    Amounts are strings (uint256 does not fit JSON numbers), `received` is a unix
+    timestamp and stages are integer microsecond offsets from `received` (or null)."""
+    size = min(count, capacity)
+    if limit is not None:
+        size = min(size, max(limit, 0))
+    end = count % capacity
+    start = (end - size) % capacity
+    if size and start >= end:
+        order = list(range(start, capacity)) + list(range(end))
+    else:
+        order = list(range(start, end))
+    data: Dict[str, List[Any]] = {}
+    for name in COLUMNS:
+        values = columns[name]
+        data[name] = [values[i] for i in order]
+    for name in ("base_token_amount", "quote_token_amount"):
+        data[name] = [None if v is None else str(v) for v in data[name]]
+    received = data["received"]
+    for stage in STAGES:
+        data[stage] = [
+            None if ts is None else round((ts - received[i]) * 1e6)
+            for i, ts in enumerate(data[stage])
+        ]
+    return {"total": count, "count": size, "columns": list(COLUMNS), "data": data}
+
+
+class FlightRecorder:
+    """Columnar ring buffer of per-RFQ lifecycle records.
+
+    `start()` reserves the next slot for an RFQ, `stage()` stamps a lifecycle stage
+    and `finish()` sets the outcome. Only the event loop writes into the buffer."""
+
+    capacity: int
+    columns: Dict[str, List[Any]]
+    count: int  # total number of RFQs recorded
+
+    def __init__(self, capacity: int) -> None:
+        assert capacity > 0, "Flight recorder capacity must be positive"
+        self.capacity = capacity
+        self.columns = {name: [None] * capacity for name in COLUMNS}
+        self.count = 0
+        self.router = APIRouter(tags=["debug"])
+        self.router.add_api_route("/debug/rfqs", self.dump, methods=["GET"])
+
+    @classmethod
+    def from_memory_budget(cls, budget_mb: float) -> "FlightRecorder":
+        """Create with as many records as fit into `budget_mb` megabytes."""
+        return cls(max(1, int(budget_mb * 2**20) // RFQ_RECORD_BYTES))
+
+    @classmethod
+    def from_env(cls) -> "FlightRecorder":
+        """Create with memory budget from `RFQ_RECORDER_MEMORY_MB` env var."""
+        return cls.from_memory_budget(
+            float(os.getenv("RFQ_RECORDER_MEMORY_MB", str(RFQ_RECORDER_MEMORY_MB)))
+        )
+
+    def start(self, rfq: Rfq) -> int:
+        """Record a new RFQ taken for processing, returns its slot."""
+        slot = self.count % self.capacity
+        self.count += 1
+        columns = self.columns
+        columns["rfq_id"][slot] = rfq.rfq_id
+        columns["solver_rfq_id"][slot] = rfq.solver_rfq_id
+        columns["solver"][slot] = rfq.solver
+        columns["chain_id"][slot] = rfq.chain_id
+        columns["base_token"][slot] = rfq.base_token
+        columns["quote_token"][slot] = rfq.quote_token
+        columns["base_token_amount"][slot] = rfq.base_token_amount
+        columns["quote_token_amount"][slot] = rfq.quote_token_amount
+        columns["status"][slot] = None
+        now = time.time()
+        columns["received"][slot] = rfq.received_at or now
+        columns["started"][slot] = now
+        for stage in STAGES[1:]:
+            columns[stage][slot] = None
+        return slot
+
+    def stage(self, slot: int, stage: str) -> None:
+        """Stamp a lifecycle stage (one of `STAGES`) of the RFQ in `slot`."""
+        self.columns[stage][slot] = time.time()
+
+    def finish(
+        self,
+        slot: int,
+        status: str,
+        base_token_amount: Optional[int] = None,
+        quote_token_amount: Optional[int] = None,
+    ) -> None:
+        """Set the outcome status and (if priced) the quoted amounts of the RFQ in `slot`."""
+        columns = self.columns
+        columns["status"][slot] = status
+        if base_token_amount is not None:
+            columns["base_token_amount"][slot] = base_token_amount
+        if quote_token_amount is not None:
+            columns["quote_token_amount"][slot] = quote_token_amount
+
+    def snapshot(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Columnar copy of the most recent `limit` (all by default) records, oldest first."""
+        return columnar_snapshot(self.columns, self.count, self.capacity, limit)
+
+    async def dump(self, limit: Optional[int] = None) -> Response:
+        """Dump the most recent RFQ lifecycle records in columnar JSON."""
+        # copy columns on the event loop, build and serialize the snapshot in a thread
+        columns = {name: list(values) for name, values in self.columns.items()}
+        count = self.count
+        content = await asyncio.to_thread(
+            lambda: json.dumps(
+                columnar_snapshot(columns, count, self.capacity, limit),
+                separators=(",", ":"),
+            )
+        )
+        return Response(content=content, media_type="application/json")
@@ -0,0 +1,263 @@
+# pylint: disable=redefined-outer-name
+"""Tests for LiquoriceQuoter pricing."""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Optional
+from unittest.mock import Mock
+
+import pytest
+from eth_typing import HexStr
+from prometheus_client import REGISTRY
+
+from app.evm.chains import arbitrum
+from app.evm.settlement import SettlementConfig, SettlementTracker, rfq_topic
+from app.markets.levels import PairLevels
+from app.markets.markets import MarketState
+from app.protocols.liquorice.const import LIQUORICE_SETTLEMENT_ADDRESS
+from app.protocols.liquorice.internal import Quote, Rfq
+from app.protocols.liquorice.signer import Web3Signer
+from app.quoter.quoter import LiquoriceQuoter
+
+rfq_dict = json.loads(
+    (Path(__file__).parents[2] / "protocols/liquorice/tests/data/liquorice_rfq.json").read_text()
+)["message"]
+
+# Well-known test mnemonic account #0, NEVER use it in production!
+PRIV_KEY = HexStr("ac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80")
+
+
+@pytest.fixture
+def markets():
+    markets = MarketState()
+    markets.levels.publish(
+        [
+            PairLevels.from_dict(
+                {
+                    "chainId": arbitrum.CHAIN_ID,
+                    "baseToken": arbitrum.USDT.address,
+                    "quoteToken": arbitrum.USDC.address,
+                    "levels": [["1000", "0.999"], ["1000", "0.99"]],
+                }
+            )
+        ]
+    )
+    arbitrum.USDC.raw_balance = 10_000 * 10**6
+    yield markets
+    arbitrum.USDC.raw_balance = 0
+    arbitrum.USDC.raw_allowance = None
+    arbitrum.USDC.raw_reserved = 0
+    arbitrum.USDC.balance_history.clear()
+
+
+@pytest.fixture
+def quoter(markets):
+    chain_registry = Mock()
+    chain_registry.chain_by_id = {
+        arbitrum.CHAIN_ID: Mock(
+            liquorice_settlement_address=LIQUORICE_SETTLEMENT_ADDRESS,
+            active=True,
+            skeeper_address=arbitrum.USDT.address,
+        ),
+    }
+    return LiquoriceQuoter(
+        asyncio.Queue(), asyncio.Queue(), markets, Web3Signer(chain_registry, PRIV_KEY)
+    )
+
+
+def make_rfq(
+    base_token_amount: Optional[int] = None, quote_token_amount: Optional[int] = None
+) -> Rfq:
+    rfq = Rfq.from_dict(
+        {
+            **rfq_dict,
+            "baseToken": arbitrum.USDT.address,
+            "quoteToken": arbitrum.USDC.address,
+            "baseTokenAmount": base_token_amount,
+            "quoteTokenAmount": quote_token_amount,
+            "solver": "test_quoter",
+        }
+    )
+    return rfq
+
+
+def rfqs_count(rfq: Rfq, status: str) -> float:
+    return (
+        REGISTRY.get_sample_value(
+            "rfqs_total",
+            {
+                "chain_id": str(rfq.chain_id),
+                "solver": "test_quoter",
+                "base_token": rfq.base_token,
+                "quote_token": rfq.quote_token,
+                "status": status,
+            },
+        )
+        or 0.0
+    )
+
+
+async def process(quoter: LiquoriceQuoter, rfq: Rfq) -> Optional[Quote]:
+    task = asyncio.create_task(quoter.run())
+    try:
+        await quoter.in_rfqs.put(rfq)
+        await asyncio.wait_for(quoter.in_rfqs.join(), timeout=5)
+        return None if quoter.out_quotes.empty() else quoter.out_quotes.get_nowait()
+    finally:
+        task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_quote_exact_in(quoter):
+    assert quoter.last_quote_ts == 0
+    quote = await process(quoter, make_rfq(base_token_amount=1500 * 10**6))
+    assert quote is not None
+    assert quoter.last_quote_ts > 0
+    level = quote.levels[0]
+    assert level.base_token_amount == 1500 * 10**6
+    assert level.quote_token_amount == 999 * 10**6 + 495 * 10**6
+    assert level.signature is not None
+
+
+@pytest.mark.asyncio
+async def test_quote_exact_out(quoter):
+    rfq = make_rfq(quote_token_amount=999 * 10**6 + 495 * 10**6)
+    quote = await process(quoter, rfq)
+    assert quote is not None
+    level = quote.levels[0]
+    assert level.quote_token_amount == 999 * 10**6 + 495 * 10**6
+    assert level.base_token_amount == 1500 * 10**6
+    assert rfqs_count(rfq, "QUOTER_UNHANDLED_EXC") == 0
+
+
+@pytest.mark.asyncio
+async def test_quote_exact_out_rounds_base_up(quoter):
+    quote = await process(quoter, make_rfq(quote_token_amount=1))
+    assert quote is not None
+    # 1 unit of USDC costs 1.001 units of USDT, never undersell
+    assert quote.levels[0].base_token_amount == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "rfq",
+    [make_rfq(base_token_amount=2001 * 10**6), make_rfq(quote_token_amount=1990 * 10**6)],
+)
+async def test_quote_too_deep(quoter, rfq):
+    before = rfqs_count(rfq, "LOW_DEPTH")
+    assert await process(quoter, rfq) is None
+    assert rfqs_count(rfq, "LOW_DEPTH") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_quote_exact_out_capped_by_balance(quoter):
+    arbitrum.USDC.raw_balance = 999 * 10**6
+    quote = await process(quoter, make_rfq(quote_token_amount=1200 * 10**6))
+    assert quote is not None
+    assert quote.levels[0].quote_token_amount == 999 * 10**6
+    assert quote.levels[0].base_token_amount == 1000 * 10**6
+
+
+async def test_quote_capped_by_allowance(quoter):
+    arbitrum.USDC.raw_allowance = 999 * 10**6
+    quote = await process(quoter, make_rfq(quote_token_amount=1200 * 10**6))
+    assert quote is not None
+    assert quote.levels[0].quote_token_amount == 999 * 10**6
+    arbitrum.USDC.raw_allowance = 0
+    rfq = make_rfq(base_token_amount=10**6)
+    before = rfqs_count(rfq, "LOW_QT_ALLOWANCE")
+    assert await process(quoter, rfq) is None
+    assert rfqs_count(rfq, "LOW_QT_ALLOWANCE") == before + 1
+
+
+async def test_quote_capped_by_confirmed_balance(quoter, monkeypatch):
+    monkeypatch.setattr(arbitrum.USDC.chain, "head_block", 102)
+    # 9500 USDC received at the head block
+    arbitrum.USDC.balance_history.extend([(100, 500 * 10**6), (102, 10_000 * 10**6)])
+    quoter.confirmations = 2
+    quote = await process(quoter, make_rfq(quote_token_amount=1200 * 10**6))
+    assert quote is not None
+    assert quote.levels[0].quote_token_amount == 500 * 10**6
+    quoter.confirmations = 0
+    quote = await process(quoter, make_rfq(quote_token_amount=1200 * 10**6))
+    assert quote is not None
+    assert quote.levels[0].quote_token_amount == 1200 * 10**6
+
+
+async def test_quote_reserved_until_settled(quoter):
+    quoter.settlements = SettlementTracker(SettlementConfig(reserve=True))
+    arbitrum.USDC.raw_balance = 999 * 10**6
+    rfq = make_rfq(quote_token_amount=1200 * 10**6)
+    assert await process(quoter, rfq) is not None
+    assert arbitrum.USDC.raw_reserved == 999 * 10**6
+    assert rfq_topic(rfq.rfq_id) in quoter.settlements.pending[rfq.chain_id]
+    before = rfqs_count(rfq, "LOW_QT_RESERVED")
+    assert await process(quoter, make_rfq(quote_token_amount=10**6)) is None
+    assert rfqs_count(rfq, "LOW_QT_RESERVED") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_quote_no_levels(quoter, markets):
+    markets.levels.publish(
+        [
+            PairLevels.from_dict(
+                {
+                    "chainId": arbitrum.CHAIN_ID,
+                    "baseToken": arbitrum.USDT.address,
+                    "quoteToken": arbitrum.USDC.address,
+                    "levels": [],
+                }
+            )
+        ]
+    )
+    rfq = make_rfq(base_token_amount=10**6)
+    before = rfqs_count(rfq, "NO_LEVELS")
+    assert await process(quoter, rfq) is None
+    assert rfqs_count(rfq, "NO_LEVELS") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_quoter_records_rfq_lifecycle(quoter):
+    rfq = make_rfq(quote_token_amount=999 * 10**6)
+    assert await process(quoter, rfq) is not None
+    data = quoter.recorder.snapshot(1)["data"]
+    assert data["rfq_id"] == [rfq.rfq_id]
+    assert data["status"] == ["QUOTE_SENT"]
+    # exact-out RFQ records the quoted base amount
+    assert data["base_token_amount"] == [str(10**9)]
+    assert data["quote_token_amount"] == [str(999 * 10**6)]
+    started, priced, signed, sent = (
+        data[stage][0] for stage in ("started", "priced", "signed", "sent")
+    )
+    assert 0 <= started <= priced <= signed <= sent
+
+
+@pytest.mark.asyncio
+async def test_quote_stale_balance(quoter, monkeypatch):
+    monkeypatch.setattr(arbitrum.CHAIN, "head_block", 110)
+    monkeypatch.setattr(arbitrum.USDC, "last_updated_block", 100)
+    quoter.max_balance_age_blocks = 10
+    assert await process(quoter, make_rfq(base_token_amount=10**6)) is not None
+    quoter.max_balance_age_blocks = 9
+    rfq = make_rfq(base_token_amount=10**6)
+    before = rfqs_count(rfq, "STALE_BALANCE")
+    assert await process(quoter, rfq) is None
+    assert rfqs_count(rfq, "STALE_BALANCE") == before + 1
+
+
+async def test_quote_restored_balance_age(quoter, monkeypatch):
+    monkeypatch.setattr(arbitrum.CHAIN, "head_block", 110)
+    monkeypatch.setattr(arbitrum.CHAIN, "balances_restored", True)
+    monkeypatch.setattr(arbitrum.USDC, "last_updated_block", 100)
+    quoter.max_restored_age_blocks = 10
+    assert await process(quoter, make_rfq(base_token_amount=10**6)) is not None
+    quoter.max_balance_age_blocks = 20
+    quoter.max_restored_age_blocks = 9
+    rfq = make_rfq(base_token_amount=10**6)
+    before = rfqs_count(rfq, "STALE_BALANCE")
+    assert await process(quoter, rfq) is None
+    assert rfqs_count(rfq, "STALE_BALANCE") == before + 1
+    # the limit no longer applies once the balances are reconciled
+    monkeypatch.setattr(arbitrum.CHAIN, "balances_restored", False)
+    assert await process(quoter, make_rfq(base_token_amount=10**6)) is not None
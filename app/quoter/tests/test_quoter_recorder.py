@@ -0,0 +1,62 @@
+"""Tests for the RFQ flight recorder."""
+
+import json
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.protocols.liquorice.internal import Rfq
+from app.quoter.recorder import COLUMNS, RFQ_RECORD_BYTES, FlightRecorder
+
+rfq_dict = json.loads(
+    (Path(__file__).parents[2] / "protocols/liquorice/tests/data/liquorice_rfq.json").read_text()
+)["message"]
+
+
+def record(recorder: FlightRecorder, n: int) -> None:
+    for i in range(n):
+        rfq = Rfq.from_dict({**rfq_dict, "baseTokenAmount": str(i + 1)})
+        rfq.rfq_id = f"rfq-{i}"
+        slot = recorder.start(rfq)
+        recorder.finish(slot, "NO_LEVELS")
+
+
+def test_from_memory_budget():
+    assert FlightRecorder.from_memory_budget(1).capacity == 2**20 // RFQ_RECORD_BYTES
+    assert FlightRecorder.from_memory_budget(0).capacity == 1
+
+
+@pytest.mark.parametrize("n, limit, expected", [(0, None, []), (2, None, [0, 1]), (3, 2, [1, 2])])
+def test_snapshot_before_wrap(n, limit, expected):
+    recorder = FlightRecorder(4)
+    record(recorder, n)
+    snapshot = recorder.snapshot(limit)
+    assert snapshot["columns"] == list(COLUMNS)
+    assert snapshot["count"] == len(expected)
+    assert snapshot["data"]["rfq_id"] == [f"rfq-{i}" for i in expected]
+
+
+def test_snapshot_after_wrap():
+    recorder = FlightRecorder(4)
+    record(recorder, 10)
+    snapshot = recorder.snapshot()
+    assert snapshot["total"] == 10
+    assert snapshot["data"]["rfq_id"] == ["rfq-6", "rfq-7", "rfq-8", "rfq-9"]
+    assert snapshot["data"]["base_token_amount"] == ["7", "8", "9", "10"]
+    assert snapshot["data"]["status"] == ["NO_LEVELS"] * 4
+    assert snapshot["data"]["priced"] == [None] * 4
+    assert recorder.snapshot(3)["data"]["rfq_id"] == ["rfq-7", "rfq-8", "rfq-9"]
+    record(recorder, 2)
+    assert recorder.snapshot()["data"]["rfq_id"] == ["rfq-8", "rfq-9", "rfq-0", "rfq-1"]
+
+
+def test_dump_endpoint():
+    recorder = FlightRecorder(8)
+    record(recorder, 3)
+    app = FastAPI()
+    app.include_router(recorder.router)
+    response = TestClient(app).get("/debug/rfqs", params={"limit": 2})
+    assert response.status_code == 200
+    assert response.json() == recorder.snapshot(2)
@@ -20,5 +20,11 @@ class Chain:
     poa: bool = False
     active: bool = False
     tokens: List = field(default_factory=list)
-    ws_rpc_url: Optional[str] = None
+    ws_rpc_url: Optional[str] = None  # primary RPC endpoint, ws_rpc_urls[0] if set
+    ws_rpc_urls: List[str] = field(default_factory=list)  # primary and standby RPC endpoints
     skeeper_address: Optional[ChecksumAddress] = None
+    # Updated by ERC20Service
+    head_block: int = 0
+    balances_block: int = 0
+    balances_updated_ts: float = 0.0  # time.time() of the last completed balances read
+    balances_restored: bool = False  # balances come from a checkpoint, not read yet
@@ -1,8 +1,9 @@
 """ERC-20 token related classes and schemas."""
 
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
 from decimal import Decimal
-from typing import Any, Union
+from typing import Any, Deque, Optional, Tuple, Union
 
 from eth_typing import ChecksumAddress
 
@@ -10,7 +11,7 @@ from .chain import Chain
 
 
 @dataclass
-class ERC20Token:
+class ERC20Token:  # pylint: disable=too-many-instance-attributes
     """Represents an ERC20 token with its chain and contract details."""
 
     name: str
@@ -20,7 +21,15 @@ class ERC20Token:
     decimals: int = 18
     # Updated by ERC20Service
     raw_balance: int = 0
+    # allowance to the Liquorice Balance Manager, None while unknown (native token)
+    raw_allowance: Optional[int] = None
     last_updated_block: int = 0
+    # Updated by SettlementTracker: quoted amounts reserved until settled or expired
+    raw_reserved: int = 0
+    # Updated by BalanceHistory: (block, raw balance) of the last blocks, oldest first
+    balance_history: Deque[Tuple[int, int]] = field(
+        default_factory=deque, repr=False, compare=False
+    )
 
     def raw_to_decimal(self, raw_amount: int) -> Decimal:
         """Convert raw token amount to decimal representation.
@@ -59,6 +68,42 @@ class ERC20Token:
         """Get current balance as decimal amount."""
         return self.raw_to_decimal(self.raw_balance)
 
+    def raw_balance_confirmed(self, confirmations: int) -> int:
+        """Raw balance once the changes of the last `confirmations` blocks are confirmed:
+        the lower of the latest balance and the balance `confirmations` blocks behind the
+        chain head (the oldest one known if the history is shorter). Outgoing transfers
+        count right away, incoming ones once confirmed."""
+        if confirmations <= 0:
+            return self.raw_balance
+        block = self.chain.head_block - confirmations
+        confirmed = self.raw_balance
+        for entry_block, raw_balance in reversed(self.balance_history):
+            confirmed = raw_balance
+            if entry_block <= block:
+                break
+        return min(self.raw_balance, confirmed)
+
+    @property
+    def raw_spendable(self) -> int:
+        """Raw amount the Balance Manager can pull: the balance capped by the allowance."""
+        return self.raw_spendable_confirmed(0)
+
+    def raw_spendable_confirmed(self, confirmations: int) -> int:
+        """`raw_spendable` of the balance with `confirmations` blocks, 0 for the latest."""
+        raw_balance = self.raw_balance_confirmed(confirmations)
+        if self.raw_allowance is None:
+            return raw_balance
+        return min(raw_balance, self.raw_allowance)
+
+    @property
+    def raw_available(self) -> int:
+        """Raw amount available to new quotes: the spendable amount not reserved."""
+        return self.raw_available_confirmed(0)
+
+    def raw_available_confirmed(self, confirmations: int) -> int:
+        """`raw_available` of the balance with `confirmations` blocks, 0 for the latest."""
+        return max(0, self.raw_spendable_confirmed(confirmations) - self.raw_reserved)
+
     def __hash__(self) -> int:
         """Hash based on chain and address which uniquely identify a token.
         for use in hash-based collection like networkx graphs.
@@ -0,0 +1,246 @@
+"""End-to-end RFQ pipeline benchmark.
+
+Wires the real `LiquoriceClient`, `LiquoriceQuoter`, `Web3Signer`, `MarketState`
+and `ChainServiceMgr` to local stand-ins (`FakeLiquoriceServer`, `FakeRpcNode`)
+and reports RFQ -> quote throughput and latency percentiles. Runs offline.
+
+Stand-ins run on their own event loop in a background thread, so RFQs are sent
+on schedule and quotes are timestamped on receipt regardless of the gateway's load.
+
+Usage:
+    python -m app.sim.bench --rate 100 --duration 10 [--fast-path] [--json]
+    python -m app.sim.bench --replay capture.lqcap [--speed 1|N|max]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Coroutine,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from eth_typing import HexStr
+from web3 import Web3
+
+from app.config.maker import MakerConfig
+from app.evm.chains import arbitrum
+from app.evm.registry import ChainRegistry
+from app.evm.service import ChainServiceMgr
+from app.markets.levels import PairLevels
+from app.markets.markets import MarketState
+from app.protocols.liquorice.client import LiquoriceClient
+from app.protocols.liquorice.signer import Web3Signer
+from app.quoter.quoter import LiquoriceQuoter
+from app.schemas.chain import Chain
+
+from .liquorice import FakeLiquoriceServer, RfqFactory, Schedule
+from .replay import load_capture, parse_speed, scale_schedule
+from .rpc import FakeRpcNode
+
+# Well-known test mnemonic account #0, NEVER use it in production!
+BENCH_PRIV_KEY = HexStr("ac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80")
+BENCH_SKEEPER = Web3.to_checksum_address("0x" + "5e" * 20)
+BENCH_TRADER = Web3.to_checksum_address("0x9008D19f58AAbD9eD0D60971565AA8510560ab41")
+BENCH_BALANCE_READY_TIMEOUT = 10.0  # seconds to wait for the first balances read
+
+T = TypeVar("T")
+
+log = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    """Event loop running in a daemon thread."""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="stand-ins", daemon=True)
+        self.thread.start()
+
+    async def call(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine on the background loop and await its result."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def stop(self) -> None:
+        """Stop the loop and join the thread."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@contextmanager
+def isolated_chains(chains: List[Chain]) -> Iterator[None]:
+    """Restore the (module level) chains and their tokens state on exit."""
+    saved_chains = [(chain, dict(vars(chain)), list(chain.tokens)) for chain in chains]
+    saved_tokens: List[Tuple[Any, Dict[str, Any]]] = []
+    try:
+        for chain, _, tokens in saved_chains:
+            saved_tokens.extend((token, dict(vars(token))) for token in tokens)
+        yield
+    finally:
+        for chain, chain_vars, tokens in saved_chains:
+            vars(chain).update(chain_vars)
+            chain.tokens = tokens
+        for token, token_vars in saved_tokens:
+            vars(token).update(token_vars)
+
+
+def client_signer(priv_key: HexStr) -> str:
+    """Checksum address of the quote signer."""
+    address: str = Web3().eth.account.from_key(priv_key).address
+    return address
+
+
+def usdt_usdc_rfq_factory(base_token_amount: int = 1000 * 10**6) -> RfqFactory:
+    """RFQs selling `base_token_amount` of Arbitrum USDT for USDC."""
+
+    def factory() -> Dict[str, Any]:
+        return {
+            "chainId": arbitrum.CHAIN_ID,
+            "solver": "bench",
+            "baseToken": arbitrum.USDT.address,
+            "quoteToken": arbitrum.USDC.address,
+            "trader": BENCH_TRADER,
+            "effectiveTrader": BENCH_TRADER,
+            "baseTokenAmount": str(base_token_amount),
+            "quoteTokenAmount": None,
+        }
+
+    return factory
+
+
+@asynccontextmanager
+async def bench_gateway(chain_rg: ChainRegistry, cfg_maker: MakerConfig) -> AsyncIterator[None]:
+    """Run the gateway pipeline quoting Arbitrum USDT/USDC while in the context."""
+    markets = MarketState()
+    markets.levels.publish(
+        [
+            PairLevels.from_dict(
+                {
+                    "chainId": arbitrum.CHAIN_ID,
+                    "baseToken": arbitrum.USDT.address,
+                    "quoteToken": arbitrum.USDC.address,
+                    "levels": [["100000", "0.9999"], ["1000000", "0.999"]],
+                }
+            )
+        ]
+    )
+    cs_mgr = ChainServiceMgr(chain_rg, markets)
+    tasks: List[asyncio.Task] = []
+    try:
+        await cs_mgr.run()
+        async with asyncio.timeout(BENCH_BALANCE_READY_TIMEOUT):
+            while not arbitrum.CHAIN.balances_block:
+                await asyncio.sleep(0.01)
+        client = LiquoriceClient(cfg_maker)
+        quoter = LiquoriceQuoter(
+            client.out_rfqs,
+            client.in_quotes,
+            markets,
+            Web3Signer(chain_rg, BENCH_PRIV_KEY),
+        )
+        tasks = [asyncio.create_task(client.run()), asyncio.create_task(quoter.run())]
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await cs_mgr.shutdown()
+
+
+async def run_benchmark(  # pylint: disable=too-many-arguments
+    rate: float,
+    duration: float,
+    *,
+    fast_path: bool = False,
+    drain: float = 2.0,
+    capture_path: Optional[str] = None,
+    schedule: Optional[Schedule] = None,
+) -> Dict[str, Any]:
+    """Run the RFQ pipeline against the stand-ins and return the load summary.
+
+    RFQs are generated at `rate` for `duration`, or sent from `schedule` (a replay)
+    if given. `capture_path` captures the client's websocket frames."""
+    stand_ins = BackgroundLoop()
+    node = FakeRpcNode(arbitrum.CHAIN_ID)
+    liquorice = FakeLiquoriceServer(usdt_usdc_rfq_factory())
+    chain_rg = ChainRegistry.from_chains_inventory()
+    with isolated_chains(chain_rg.chains):
+        try:
+            rpc_url = await stand_ins.call(node.start())
+            liquorice_url = await stand_ins.call(liquorice.start())
+            for chain in chain_rg.chains:
+                chain.active = False
+            chain = arbitrum.CHAIN
+            chain.ws_rpc_url, chain.skeeper_address, chain.active = rpc_url, BENCH_SKEEPER, True
+            chain.ws_rpc_urls = [rpc_url]
+            node.set_balance(arbitrum.USDC.address, BENCH_SKEEPER, 10**9 * 10**6)
+
+            cfg_maker = MakerConfig(
+                maker="bench",
+                authorization="bench",
+                signer_priv_key=BENCH_PRIV_KEY,
+                fast_path=fast_path,
+                ws_url=liquorice_url,
+                capture_path=capture_path,
+            )
+            async with bench_gateway(chain_rg, cfg_maker):
+                if schedule is None:
+                    stats = await stand_ins.call(liquorice.run_load(rate, duration, drain))
+                else:
+                    stats = await stand_ins.call(liquorice.run_schedule(schedule, drain))
+            stats.validate({client_signer(BENCH_PRIV_KEY)})
+            return stats.summary()
+        finally:
+            await stand_ins.call(liquorice.stop())
+            await stand_ins.call(node.stop())
+            stand_ins.stop()
+
+
+def main() -> None:
+    """Parse arguments, run the benchmark and print the report."""
+    parser = argparse.ArgumentParser(description="RFQ pipeline benchmark")
+    parser.add_argument("--rate", type=float, default=50.0, help="RFQs per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--fast-path", action="store_true", help="enable LIQUORICE_FAST_PATH")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--log-level", default="WARNING", help="gateway log level")
+    parser.add_argument("--capture", default=None, help="capture the client's frames to file")
+    parser.add_argument("--replay", default=None, help="send the RFQs of a capture file")
+    parser.add_argument(
+        "--speed", type=parse_speed, default=1.0, help="replay speed factor or 'max'"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+    schedule = None
+    if args.replay:
+        rfqs, _ = load_capture(args.replay)
+        schedule = scale_schedule(rfqs, args.speed)
+    summary = asyncio.run(
+        run_benchmark(
+            args.rate,
+            args.duration,
+            fast_path=args.fast_path,
+            capture_path=args.capture,
+            schedule=schedule,
+        )
+    )
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        for key, value in summary.items():
+            print(f"{key:>16}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Chain-side benchmark: `ChainServiceMgr` and `ERC20Service` against a fake node.
+
+Builds a synthetic chain with `tokens` ERC-20 tokens (all in the markets graph),
+runs the real chain services against `FakeRpcNode` with injected latency and
+measures:
+
+- subscription fan-in: time to the node's last `eth_subscribe` and their number
+- the first full balances read after connecting
+- balance refresh latency: from a `Transfer` moving a balance to the new balance
+  being visible in `MarketState`, over `probes` transfers
+- a `Transfer` storm of `storm` logs at `storm_rate` per second: notifications
+  delivered and balance reads it caused
+
+Usage:
+    python -m app.sim.chain_bench --tokens 300 --latency-ms 5 [--storm 2000] [--json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List
+
+from eth_utils import keccak
+from web3 import Web3
+
+from app.evm.registry import ChainRegistry
+from app.evm.service import ChainServiceMgr
+from app.markets.markets import MarketState
+from app.schemas.chain import Chain
+from app.schemas.token import ERC20Token
+
+from .bench import BackgroundLoop
+from .liquorice import percentile
+from .rpc import FakeRpcNode
+
+SIM_CHAIN_ID = 31337
+SIM_SKEEPER = Web3.to_checksum_address("0x" + "5e" * 20)
+SIM_SETTLEMENT = Web3.to_checksum_address("0x" + "5a" * 20)
+SIM_INITIAL_BALANCE = 10**24
+CHAIN_BENCH_TIMEOUT = 120.0  # seconds to wait for any single condition
+
+log = logging.getLogger(__name__)
+
+
+def synthetic_chain(tokens: int, ws_rpc_url: str) -> Chain:
+    """Active chain with `tokens` 18 decimals tokens at deterministic addresses."""
+    chain = Chain(
+        id=SIM_CHAIN_ID,
+        liquorice_settlement_address=SIM_SETTLEMENT,
+        name="Simulated",
+        short_names=["sim"],
+        active=True,
+        ws_rpc_url=ws_rpc_url,
+        skeeper_address=SIM_SKEEPER,
+    )
+    for i in range(tokens):
+        address = Web3.to_checksum_address(keccak(text=f"sim-token-{i}")[:20])
+        chain.tokens.append(
+            ERC20Token(name=f"Token {i}", symbol=f"TKN{i}", chain=chain, address=address)
+        )
+    return chain
+
+
+async def wait_for(condition: Any, timeout: float = CHAIN_BENCH_TIMEOUT) -> float:
+    """Poll `condition()` every millisecond, returns the seconds it took to hold."""
+    start = time.perf_counter()
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.001)
+    return time.perf_counter() - start
+
+
+def ring_markets(chain: Chain) -> MarketState:
+    """Markets graph trading every token of the chain for the next one."""
+    markets = MarketState()
+    for base, quote in zip(chain.tokens, chain.tokens[1:] + chain.tokens[:1]):
+        markets.graph.add_edge(base, quote, weight=1.0)
+    return markets
+
+
+async def measure_refreshes(
+    stand_ins: BackgroundLoop, node: FakeRpcNode, chain: Chain, probes: int
+) -> Dict[str, Any]:
+    """Balance refresh latency percentiles over `probes` transfers to the settlement keeper."""
+    latencies: List[float] = []
+    for i in range(probes):
+        token = chain.tokens[i * 7919 % len(chain.tokens)]
+        expected = node.get_balance(token.address, SIM_SKEEPER) + 1
+        await stand_ins.call(node.transfer(token.address, SIM_SETTLEMENT, SIM_SKEEPER, 1))
+        latencies.append(
+            await wait_for(lambda token=token, expected=expected: token.raw_balance == expected)
+        )
+    latencies.sort()
+    result: Dict[str, Any] = {}
+    for name, q in (("p50", 50), ("max", 100)):
+        value = percentile(latencies, q)
+        result[f"refresh_{name}_ms"] = None if value is None else round(value * 1000, 1)
+    return result
+
+
+async def measure_storm(
+    stand_ins: BackgroundLoop, node: FakeRpcNode, chain: Chain, storm: int, storm_rate: float
+) -> Dict[str, Any]:
+    """Notifications delivered and balance reads caused by a `Transfer` storm."""
+    reads_before, notifications_before = node.calls.get("eth_call", 0), node.notifications
+    storm_start = time.perf_counter()
+    await stand_ins.call(
+        node.transfer_storm(
+            [token.address for token in chain.tokens], SIM_SKEEPER, storm, rate=storm_rate
+        )
+    )
+    return {
+        "storm_transfers": storm,
+        "storm_s": round(time.perf_counter() - storm_start, 3),
+        "storm_notifications": node.notifications - notifications_before,
+        "storm_balance_reads": node.calls.get("eth_call", 0) - reads_before,
+    }
+
+
+async def run_chain_benchmark(
+    tokens: int = 100,
+    latency: float = 0.005,
+    probes: int = 5,
+    storm: int = 1000,
+    storm_rate: float = 500.0,
+) -> Dict[str, Any]:
+    """Run the chain services against the fake node and return the measurements."""
+    stand_ins = BackgroundLoop()
+    node = FakeRpcNode(SIM_CHAIN_ID, latency=latency)
+    cs_mgr = None
+    try:
+        chain = synthetic_chain(tokens, await stand_ins.call(node.start()))
+        registry = ChainRegistry()
+        registry.chains.append(chain)
+        registry.chain_by_id[chain.id] = chain
+        for token in chain.tokens:
+            node.set_balance(token.address, SIM_SKEEPER, SIM_INITIAL_BALANCE)
+
+        result: Dict[str, Any] = {"tokens": tokens, "latency_ms": latency * 1000}
+        start = time.perf_counter()
+        cs_mgr = ChainServiceMgr(registry, ring_markets(chain))
+        await cs_mgr.run()
+        await wait_for(lambda: len(node.subscriptions) >= 2 * tokens)
+        result["subscriptions"] = len(node.subscriptions)
+        result["subscribed_s"] = round(time.perf_counter() - start, 3)
+        await wait_for(lambda: chain.balances_block > 0)
+        result["first_balances_s"] = round(time.perf_counter() - start, 3)
+
+        result.update(await measure_refreshes(stand_ins, node, chain, probes))
+        result.update(await measure_storm(stand_ins, node, chain, storm, storm_rate))
+        result["rpc_calls"] = dict(node.calls)
+        return result
+    finally:
+        if cs_mgr is not None:
+            await cs_mgr.shutdown()
+        await stand_ins.call(node.stop())
+        stand_ins.stop()
+
+
+def main() -> None:
+    """Parse arguments, run the benchmark and print the report."""
+    parser = argparse.ArgumentParser(description="Chain services benchmark")
+    parser.add_argument("--tokens", type=int, default=100, help="number of tokens")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="RPC response latency")
+    parser.add_argument("--probes", type=int, default=5, help="balance refresh probes")
+    parser.add_argument("--storm", type=int, default=1000, help="Transfer logs of the storm")
+    parser.add_argument("--storm-rate", type=float, default=500.0, help="storm logs per second")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--log-level", default="WARNING", help="gateway log level")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+    result = asyncio.run(
+        run_chain_benchmark(
+            args.tokens, args.latency_ms / 1000, args.probes, args.storm, args.storm_rate
+        )
+    )
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>20}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+"""Fake Liquorice maker websocket API and RFQ load generator.
+
+Speaks the maker protocol envelopes of `app.protocols.liquorice.schemas`: sends
+`connected` on connect, then streams `rfq` messages at an open-loop arrival rate
+(sending does not wait for quotes, arrivals are evenly spaced or Poisson) and
+matches received `rfqQuote` messages to the RFQs to measure response latency.
+RFQs are drawn from an `RfqMix` of pairs, sizes and solvers. Quote signatures
+and amounts are validated after the run, off the latency measurement path.
+
+Usage (point the gateway at it with `LIQUORICE_WS_URL=ws://127.0.0.1:9010`):
+    python -m app.sim.liquorice --mix mix.json --rate 50 --duration 60 [--arrivals poisson]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from eth_account import Account
+from eth_keys.exceptions import BadSignature
+from hexbytes import HexBytes
+from web3 import Web3
+from websockets.asyncio.server import ServerConnection
+
+from app.protocols.liquorice.signer import SignableRfqQuoteLevel
+
+from .server import WsServer
+
+log = logging.getLogger(__name__)
+
+RfqFactory = Callable[[], Dict[str, Any]]  # returns an RFQ `message` without ids and nonce
+# RFQ messages with send offsets in seconds from start, None for a new RFQ of the factory
+Schedule = Sequence[Tuple[float, Optional[Dict[str, Any]]]]
+
+SIM_TRADER = Web3.to_checksum_address("0x9008D19f58AAbD9eD0D60971565AA8510560ab41")
+SIM_RFQ_EXPIRY = 300  # seconds from the RFQ creation
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (`q` in 0..100) of already sorted values."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+@dataclass(slots=True)
+class PairSpec:
+    """Pair of an RFQ mix with its raw amount range (of `side` token) and weight."""
+
+    chain_id: int
+    base_token: str
+    quote_token: str
+    min_amount: int
+    max_amount: int
+    weight: float = 1.0
+    side: str = "base"  # RFQ amount is `baseTokenAmount` or `quoteTokenAmount`
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PairSpec":
+        """Build from a JSON object, amounts may be strings."""
+        spec = cls(
+            chain_id=int(data["chainId"]),
+            base_token=Web3.to_checksum_address(data["baseToken"]),
+            quote_token=Web3.to_checksum_address(data["quoteToken"]),
+            min_amount=int(data["minAmount"]),
+            max_amount=int(data["maxAmount"]),
+            weight=float(data.get("weight", 1.0)),
+            side=data.get("side", "base"),
+        )
+        if spec.side not in ("base", "quote"):
+            raise ValueError(f"Pair side must be 'base' or 'quote', got {spec.side!r}")
+        if not 0 < spec.min_amount <= spec.max_amount:
+            raise ValueError("Pair amounts must satisfy 0 < minAmount <= maxAmount")
+        return spec
+
+
+@dataclass(slots=True)
+class RfqMix:
+    """Distribution of generated RFQs: weighted pairs with log-uniform sizes
+    and weighted solvers.
+
+    JSON form:
+        {"pairs": [{"chainId": 42161, "baseToken": "0x...", "quoteToken": "0x...",
+                    "minAmount": "1000000", "maxAmount": "100000000000",
+                    "weight": 3, "side": "base"}],
+         "solvers": {"solver-a": 0.7, "solver-b": 0.3},
+         "trader": "0x..."}
+    """
+
+    pairs: List[PairSpec]
+    solvers: Dict[str, float] = field(default_factory=lambda: {"sim": 1.0})
+    trader: str = SIM_TRADER
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RfqMix":
+        """Build from a decoded JSON object."""
+        pairs = [PairSpec.from_dict(pair) for pair in data["pairs"]]
+        if not pairs:
+            raise ValueError("RFQ mix must have at least one pair")
+        mix = cls(pairs=pairs)
+        if "solvers" in data:
+            mix.solvers = {str(k): float(v) for k, v in data["solvers"].items()}
+        if "trader" in data:
+            mix.trader = Web3.to_checksum_address(data["trader"])
+        return mix
+
+    @classmethod
+    def from_file(cls, path: str) -> "RfqMix":
+        """Load from a JSON file."""
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def factory(self, rng: random.Random) -> RfqFactory:
+        """RFQ factory drawing from the mix with `rng`."""
+        pair_weights = [pair.weight for pair in self.pairs]
+        solvers = list(self.solvers)
+        solver_weights = list(self.solvers.values())
+
+        def factory() -> Dict[str, Any]:
+            pair = rng.choices(self.pairs, pair_weights)[0]
+            # log-uniform: small RFQs are as frequent per order of magnitude as big ones
+            amount = int(
+                math.exp(rng.uniform(math.log(pair.min_amount), math.log(pair.max_amount)))
+            )
+            amount = min(max(amount, pair.min_amount), pair.max_amount)
+            return {
+                "chainId": pair.chain_id,
+                "solver": rng.choices(solvers, solver_weights)[0],
+                "baseToken": pair.base_token,
+                "quoteToken": pair.quote_token,
+                "trader": self.trader,
+                "effectiveTrader": self.trader,
+                "baseTokenAmount": str(amount) if pair.side == "base" else None,
+                "quoteTokenAmount": str(amount) if pair.side == "quote" else None,
+            }
+
+        return factory
+
+
+def arrival_times(
+    rate: float, duration: float, arrivals: str = "fixed", rng: Optional[random.Random] = None
+) -> List[float]:
+    """Open-loop RFQ send offsets (seconds from start) within `duration`.
+
+    `fixed` spaces RFQs evenly, `poisson` draws exponential inter-arrival times."""
+    if arrivals == "fixed":
+        return [i / rate for i in range(int(rate * duration))]
+    if arrivals != "poisson":
+        raise ValueError(f"Unknown arrivals {arrivals!r}, expected 'fixed' or 'poisson'")
+    rng = rng or random.Random()
+    offsets = []
+    offset = rng.expovariate(rate)
+    while offset < duration:
+        offsets.append(offset)
+        offset += rng.expovariate(rate)
+    return offsets
+
+
+def validate_quote(  # pylint: disable=too-many-return-statements  # one per error
+    rfq: Dict[str, Any], quote: Dict[str, Any], signers: Optional[Set[str]] = None
+) -> Optional[str]:
+    """Check a received `rfqQuote` message against its RFQ, returns the error or None.
+
+    Checks pair and amounts of every level and recovers the EIP-712 signer from the
+    level signature; `signers` (checksum addresses) restricts the accepted signers.
+    The RFQ nonce is hex, with or without the `0x` prefix."""
+    levels = quote.get("levels")
+    if not levels:
+        return "no levels"
+    try:
+        for level in levels:
+            if (level["baseToken"], level["quoteToken"]) != (rfq["baseToken"], rfq["quoteToken"]):
+                return "pair mismatch"
+            for name in ("baseTokenAmount", "quoteTokenAmount"):
+                if rfq[name] is not None and int(level[name]) > int(rfq[name]):
+                    return f"{name} exceeds RFQ"
+            signable = SignableRfqQuoteLevel(
+                base_token=level["baseToken"],
+                base_token_amount=int(level["baseTokenAmount"]),
+                chain_id=rfq["chainId"],
+                settlement_contract=level["settlementContract"],
+                effective_trader=rfq["effectiveTrader"],
+                quote_expiry=int(level["expiry"]),
+                min_quote_token_amount=int(level["minQuoteTokenAmount"]),
+                nonce=bytes.fromhex(rfq["nonce"].removeprefix("0x")),
+                quote_token=level["quoteToken"],
+                quote_token_amount=int(level["quoteTokenAmount"]),
+                recipient=level["recipient"],
+                rfq_id=rfq["rfqId"],
+                market=level["settlementContract"],
+                trader=rfq["trader"],
+            )
+            try:
+                recovered = Account()._recover_hash(  # pylint: disable=protected-access
+                    signable.hash, signature=HexBytes(level["signature"])
+                )
+            except BadSignature:
+                return "bad signature"
+            if recovered != level["signer"]:
+                return "bad signature"
+            if signers is not None and recovered not in signers:
+                return "unknown signer"
+    except (KeyError, TypeError, ValueError) as e:
+        return f"malformed: {e!r}"
+    return None
+
+
+@dataclass(slots=True)
+class LoadStats:  # pylint: disable=too-many-instance-attributes
+    """RFQ load results: sent RFQs, matched quotes and their latencies."""
+
+    rfqs: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # rfq_id -> RFQ message
+    sent_at: Dict[str, float] = field(default_factory=dict)  # rfq_id -> time.perf_counter()
+    quotes: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # rfq_id -> quote message
+    latencies: Dict[str, float] = field(default_factory=dict)  # rfq_id -> seconds
+    errors: Dict[str, str] = field(default_factory=dict)  # rfq_id -> quote validation error
+    unmatched_quotes: int = 0
+    started_at: float = 0.0
+    last_quote_at: float = 0.0
+    finished_at: float = 0.0
+
+    def validate(self, signers: Optional[Set[str]] = None) -> None:
+        """Validate all received quotes, see `validate_quote`."""
+        self.errors.clear()
+        for rfq_id, quote in self.quotes.items():
+            error = validate_quote(self.rfqs[rfq_id], quote, signers)
+            if error is not None:
+                self.errors[rfq_id] = error
+
+    def coverage(self, key: Callable[[Dict[str, Any]], str]) -> Dict[str, float]:
+        """Share of RFQs answered with a valid quote, grouped by `key` of the RFQ."""
+        sent: Dict[str, int] = defaultdict(int)
+        quoted: Dict[str, int] = defaultdict(int)
+        for rfq_id, rfq in self.rfqs.items():
+            group = key(rfq)
+            sent[group] += 1
+            if rfq_id in self.quotes and rfq_id not in self.errors:
+                quoted[group] += 1
+        return {group: round(quoted[group] / count, 4) for group, count in sent.items()}
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Per-RFQ results in send order."""
+        return [
+            {
+                "rfqId": rfq_id,
+                "chainId": rfq["chainId"],
+                "solver": rfq["solver"],
+                "baseToken": rfq["baseToken"],
+                "quoteToken": rfq["quoteToken"],
+                "baseTokenAmount": rfq["baseTokenAmount"],
+                "quoteTokenAmount": rfq["quoteTokenAmount"],
+                "quoted": rfq_id in self.quotes,
+                "latency_ms": (
+                    round(self.latencies[rfq_id] * 1000, 3) if rfq_id in self.latencies else None
+                ),
+                "error": self.errors.get(rfq_id),
+            }
+            for rfq_id, rfq in self.rfqs.items()
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        """Throughput, coverage and latency percentiles (in milliseconds)."""
+        latencies = sorted(self.latencies.values())
+        send_duration = max(max(self.sent_at.values(), default=0.0) - self.started_at, 1e-9)
+        quote_duration = max(self.last_quote_at - self.started_at, 1e-9)
+        sent = len(self.sent_at)
+        result: Dict[str, Any] = {
+            "rfqs_sent": sent,
+            "quotes_received": len(latencies),
+            "invalid_quotes": len(self.errors),
+            "unmatched_quotes": self.unmatched_quotes,
+            "coverage": round((len(latencies) - len(self.errors)) / sent, 4) if sent else None,
+            "duration_s": round(self.finished_at - self.started_at, 3),
+            "rfqs_per_s": round(sent / send_duration, 1),
+            "quotes_per_s": round(len(latencies) / quote_duration, 1),
+        }
+        for name, q in (("p50", 50), ("p99", 99), ("p999", 99.9)):
+            value = percentile(latencies, q)
+            result[f"{name}_ms"] = None if value is None else round(value * 1000, 3)
+        result["max_ms"] = round(latencies[-1] * 1000, 3) if latencies else None
+        return result
+
+
+class FakeLiquoriceServer(WsServer):
+    """In-process fake of the Liquorice maker websocket API, see module docstring."""
+
+    def __init__(self, rfq_factory: RfqFactory, rng: Optional[random.Random] = None) -> None:
+        super().__init__()
+        self.rfq_factory = rfq_factory
+        self.rng = rng or random.Random()
+        self.stats = LoadStats()
+        self.connection: Optional[ServerConnection] = None
+        self.connected = asyncio.Event()
+
+    @staticmethod
+    def envelope(message_type: str, message: Dict[str, Any]) -> str:
+        """Serialize a maker protocol envelope."""
+        return json.dumps(
+            {"messageType": message_type, "message": message, "timestamp": int(time.time() * 1000)}
+        )
+
+    def make_rfq(self) -> Dict[str, Any]:
+        """Build a new RFQ message with unique ids and nonce."""
+        message = self.rfq_factory()
+        message["rfqId"] = str(uuid.uuid4())
+        message["solverRfqId"] = str(uuid.uuid4())
+        message["nonce"] = os.urandom(32).hex()
+        message.setdefault("expiry", int(time.time()) + SIM_RFQ_EXPIRY)
+        return message
+
+    async def handler(self, ws: ServerConnection) -> None:
+        """Greet a maker connection and collect its quotes."""
+        await ws.send(self.envelope("connected", {}))
+        self.connection = ws
+        self.connected.set()
+        log.info("Maker connected from %s", ws.remote_address)
+        async for raw in ws:
+            received_at = time.perf_counter()
+            envelope = json.loads(raw)
+            if envelope.get("messageType") != "rfqQuote":
+                log.warning("Unexpected message type: %s", envelope.get("messageType"))
+                continue
+            self.on_quote(envelope["message"], received_at)
+
+    def on_quote(self, quote: Dict[str, Any], received_at: float) -> None:
+        """Account a received quote."""
+        rfq_id = quote.get("rfqId")
+        sent_at = self.stats.sent_at.get(rfq_id)  # type: ignore[arg-type]
+        if sent_at is None or rfq_id in self.stats.latencies:
+            self.stats.unmatched_quotes += 1
+            return
+        self.stats.latencies[rfq_id] = received_at - sent_at  # type: ignore[index]
+        self.stats.quotes[rfq_id] = quote  # type: ignore[index]
+        self.stats.last_quote_at = received_at
+
+    async def run_load(
+        self, rate: float, duration: float, drain: float = 1.0, arrivals: str = "fixed"
+    ) -> LoadStats:
+        """Send RFQs at `rate` per second for `duration` seconds to the connected maker
+        and wait up to `drain` seconds for the outstanding quotes."""
+        offsets = arrival_times(rate, duration, arrivals, self.rng)
+        return await self.run_schedule([(offset, None) for offset in offsets], drain)
+
+    async def run_schedule(self, schedule: Schedule, drain: float = 1.0) -> LoadStats:
+        """Send RFQ messages at their offsets (seconds from start, ascending) to the
+        connected maker and wait up to `drain` seconds for the outstanding quotes.
+        A None message is replaced with a new RFQ of the factory."""
+        await self.connected.wait()
+        assert self.connection is not None
+        stats = self.stats
+        stats.started_at = start = time.perf_counter()
+        for offset, message in schedule:
+            # open loop: RFQs are due on schedule regardless of the responses
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if message is None:
+                message = self.make_rfq()
+            stats.rfqs[message["rfqId"]] = message
+            stats.sent_at[message["rfqId"]] = time.perf_counter()
+            await self.connection.send(self.envelope("rfq", message))
+        deadline = time.perf_counter() + drain
+        while len(stats.latencies) < len(schedule) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        stats.finished_at = time.perf_counter()
+        return stats
+
+
+async def simulate(args: argparse.Namespace) -> LoadStats:
+    """Serve RFQs of the mix to the first maker that connects and collect its quotes."""
+    rng = random.Random(args.seed)
+    server = FakeLiquoriceServer(RfqMix.from_file(args.mix).factory(rng), rng)
+    url = await server.start(args.host, args.port)
+    log.warning("Waiting for a maker on %s", url)
+    try:
+        return await server.run_load(args.rate, args.duration, args.drain, args.arrivals)
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    """Parse arguments, run the simulation and print the report."""
+    parser = argparse.ArgumentParser(description="Liquorice maker API simulator")
+    parser.add_argument("--mix", required=True, help="RFQ mix JSON file, see `RfqMix`")
+    parser.add_argument("--rate", type=float, default=50.0, help="RFQs per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    parser.add_argument("--arrivals", choices=("fixed", "poisson"), default="poisson")
+    parser.add_argument("--seed", type=int, default=None, help="random seed of the mix")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    stats = asyncio.run(simulate(args))
+    print_report(build_report(stats, args.signer, args.output), args.json)
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the server and report arguments shared with the replay CLI."""
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to wait for quotes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9010)
+    parser.add_argument(
+        "--signer", action="append", default=None, help="accepted quote signer (repeatable)"
+    )
+    parser.add_argument("--output", default=None, help="write per-RFQ results as JSON lines")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+
+
+def build_report(
+    stats: LoadStats, signers: Optional[List[str]] = None, output: Optional[str] = None
+) -> Dict[str, Any]:
+    """Validate quotes, write per-RFQ results to `output` and build the load report."""
+    stats.validate({Web3.to_checksum_address(s) for s in signers} if signers else None)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            for record in stats.records():
+                f.write(json.dumps(record) + "\n")
+    report = stats.summary()
+    report["coverage_by_pair"] = stats.coverage(
+        lambda rfq: f"{rfq['chainId']}:{rfq['baseToken']}/{rfq['quoteToken']}"
+    )
+    report["coverage_by_solver"] = stats.coverage(lambda rfq: rfq["solver"])
+    report["errors"] = dict(Counter(stats.errors.values()))
+    return report
+
+
+def print_report(report: Dict[str, Any], as_json: bool = False) -> None:
+    """Print the report as JSON or aligned lines."""
+    if as_json:
+        print(json.dumps(report))
+        return
+    for key, value in report.items():
+        if isinstance(value, dict):
+            print(f"{key:>18}:")
+            for group, group_value in value.items():
+                print(f"{'':>20}{group}: {group_value}")
+        else:
+            print(f"{key:>18}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Replay of captured Liquorice websocket traffic.
+
+Serves the RFQs of a capture file (written by `LiquoriceClient` with
+`LIQUORICE_CAPTURE`) to the first maker that connects, with the captured
+inter-arrival times scaled by `speed` (or back to back with `max`), and reports
+the replayed quote latency and coverage next to the captured gateway-side latency
+(from RFQ receipt to quote send). RFQ messages are replayed verbatim, ids
+and nonces included.
+
+Usage (point the gateway at it with `LIQUORICE_WS_URL=ws://127.0.0.1:9010`):
+    python -m app.sim.replay capture.lqcap [--speed 1|N|max]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.protocols.liquorice.capture import Direction, read_capture
+
+from .liquorice import (
+    FakeLiquoriceServer,
+    LoadStats,
+    Schedule,
+    add_server_arguments,
+    build_report,
+    percentile,
+    print_report,
+)
+
+log = logging.getLogger(__name__)
+
+
+def load_capture(path: str) -> Tuple[List[Tuple[float, Dict[str, Any]]], Dict[str, float]]:
+    """Captured RFQ messages with their offsets from the first RFQ (seconds),
+    and the captured RFQ -> quote latencies (seconds) by RFQ id."""
+    rfqs: List[Tuple[float, Dict[str, Any]]] = []
+    received_at: Dict[str, float] = {}
+    latencies: Dict[str, float] = {}
+    for frame in read_capture(path):
+        try:
+            envelope = json.loads(frame.data)
+            message_type, message = envelope.get("messageType"), envelope["message"]
+            rfq_id = message["rfqId"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        if frame.direction == Direction.IN and message_type == "rfq":
+            rfqs.append((frame.ts, message))
+            received_at.setdefault(rfq_id, frame.ts)
+        elif frame.direction == Direction.OUT and message_type == "rfqQuote":
+            if rfq_id in received_at and rfq_id not in latencies:
+                latencies[rfq_id] = frame.ts - received_at[rfq_id]
+    if rfqs:
+        start = rfqs[0][0]
+        rfqs = [(ts - start, message) for ts, message in rfqs]
+    return rfqs, latencies
+
+
+def scale_schedule(rfqs: List[Tuple[float, Dict[str, Any]]], speed: Optional[float]) -> Schedule:
+    """Divide offsets by `speed`, None sends all RFQs back to back."""
+    if speed is None:
+        return [(0.0, message) for _, message in rfqs]
+    return [(offset / speed, message) for offset, message in rfqs]
+
+
+def captured_summary(latencies: Dict[str, float]) -> Dict[str, Any]:
+    """Percentiles (milliseconds) of the captured gateway-side latencies."""
+    values = sorted(latencies.values())
+    result: Dict[str, Any] = {"captured_quotes": len(values)}
+    for name, q in (("p50", 50), ("p99", 99), ("p999", 99.9)):
+        value = percentile(values, q)
+        result[f"captured_{name}_ms"] = None if value is None else round(value * 1000, 3)
+    return result
+
+
+async def replay(
+    schedule: Schedule,
+    host: str = "127.0.0.1",
+    port: int = 9010,
+    drain: float = 2.0,
+) -> LoadStats:
+    """Serve the schedule to the first maker that connects and collect its quotes."""
+
+    def no_factory() -> Dict[str, Any]:
+        raise AssertionError("Replay schedule has no generated RFQs")
+
+    server = FakeLiquoriceServer(no_factory)
+    url = await server.start(host, port)
+    log.warning("Waiting for a maker on %s to replay %d RFQs", url, len(schedule))
+    try:
+        return await server.run_schedule(schedule, drain)
+    finally:
+        await server.stop()
+
+
+def parse_speed(value: str) -> Optional[float]:
+    """`max` or a positive speed factor."""
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def main() -> None:
+    """Parse arguments, replay the capture and print the report."""
+    parser = argparse.ArgumentParser(description="Liquorice capture replay")
+    parser.add_argument("capture", help="capture file written with LIQUORICE_CAPTURE")
+    parser.add_argument(
+        "--speed", type=parse_speed, default=1.0, help="speed factor or 'max' (default 1)"
+    )
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    rfqs, captured = load_capture(args.capture)
+    stats = asyncio.run(replay(scale_schedule(rfqs, args.speed), args.host, args.port, args.drain))
+    report = build_report(stats, args.signer, args.output)
+    report.update(captured_summary(captured))
+    print_report(report, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""Fake EVM JSON-RPC websocket node.
+
+Answers the JSON-RPC API used by `ChainService` and `ERC20Service`:
+`eth_chainId`, `eth_blockNumber`, `eth_getBalance`, `eth_call` of ERC-20
+`balanceOf` and `allowance` and of Multicall3 `aggregate3` (batching `balanceOf`
+calls), batch requests and `eth_subscribe`/`eth_unsubscribe` of `logs` and
+`newHeads`. Balances are served from `balances`, native ones under the
+`NATIVE_TOKEN` pseudo-address, and allowances from `allowances` (unlimited unless set).
+
+Chain activity is scripted: `mine()` produces blocks (pushed to `newHeads`
+subscribers), `transfer()` and `transfer_storm()` emit ERC-20 `Transfer` logs to
+the matching `logs` subscribers and move the balances, `reorg()` notifies the
+logs of the reorged blocks again as removed and moves the balances back.
+`latency`, `jitter` and `method_latency` delay responses, `drop_connections()`
+closes all connections to exercise reconnects. Requests of a connection are
+served concurrently, like a real node, so injected latency does not serialize them.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, Deque, Dict, List, Optional, Set, Union
+
+from eth_abi import decode, encode
+from websockets.asyncio.server import ServerConnection
+from websockets.exceptions import ConnectionClosed
+
+from .server import WsServer
+
+BALANCE_OF_SELECTOR = "0x70a08231"  # keccak("balanceOf(address)")[:4]
+ALLOWANCE_SELECTOR = "0xdd62ed3e"  # keccak("allowance(address,address)")[:4]
+UNLIMITED_ALLOWANCE = 2**256 - 1
+AGGREGATE3_SELECTOR = "0x82ad56cb"  # keccak("aggregate3((address,bool,bytes)[])")[:4]
+MULTICALL3_ADDRESS = "0xca11bde05977b3631167028862be2a173976ca11"  # same on all chains
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+ZERO_HASH = "0x" + "00" * 32
+NODE_LOGS_KEPT = 10_000  # emitted logs kept for reorgs
+NATIVE_TOKEN = "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee"  # balances key of native balances
+
+log = getLogger(__name__)
+
+
+class RpcError(Exception):
+    """JSON-RPC error returned to the caller."""
+
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+@dataclass(slots=True)
+class Subscription:
+    """Active `eth_subscribe` subscription of a connection."""
+
+    id: str
+    ws: ServerConnection
+    kind: str  # "logs" or "newHeads"
+    addresses: Optional[Set[str]] = None  # lowercase, None matches any
+    topics: Optional[List[Any]] = None  # per position: None, topic or list of topics
+
+    def matches(self, address: str, topics: List[str]) -> bool:
+        """Whether a log of `address` with `topics` passes the subscription filter."""
+        if self.addresses is not None and address.lower() not in self.addresses:
+            return False
+        for i, expected in enumerate(self.topics or []):
+            if expected is None:
+                continue
+            if i >= len(topics):
+                return False
+            options = expected if isinstance(expected, list) else [expected]
+            if topics[i].lower() not in (option.lower() for option in options):
+                return False
+        return True
+
+
+def topic_address(address: str) -> str:
+    """Address left-padded to a 32 bytes topic."""
+    return "0x" + "00" * 12 + address.lower()[2:]
+
+
+class FakeRpcNode(
+    WsServer
+):  # pylint: disable=too-many-public-methods,too-many-instance-attributes
+    """In-process fake EVM JSON-RPC websocket server, see module docstring."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        chain_id: int,
+        *,
+        block_number: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        method_latency: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """
+        Args:
+            chain_id: Chain ID reported by `eth_chainId`.
+            block_number: Initial head block.
+            latency: Seconds added to every response.
+            jitter: Max random seconds added on top of `latency`.
+            method_latency: Seconds added to the responses of specific methods.
+        """
+        super().__init__()
+        self.chain_id = chain_id
+        self.block_number = block_number
+        self.latency = latency
+        self.jitter = jitter
+        self.method_latency = method_latency or {}
+        # (token address, holder address) lowercase -> raw balance
+        self.balances: Dict[tuple, int] = {}
+        # (token address, owner address, spender address) lowercase -> raw allowance
+        self.allowances: Dict[tuple, int] = {}
+        self.connections: Set[ServerConnection] = set()
+        self.subscriptions: Dict[str, Subscription] = {}
+        self._subscription_ids = itertools.count(1)
+        self._log_index = itertools.count()
+        self.logs: Deque[Dict[str, Any]] = deque(maxlen=NODE_LOGS_KEPT)  # emitted, oldest first
+        self.calls: Dict[str, int] = {}  # number of calls per method
+        self.notifications = 0  # number of subscription notifications sent
+        self.rng = random.Random()
+
+    def set_balance(self, token: str, holder: str, raw_balance: int) -> None:
+        """Set the `balanceOf(holder)` result of a token."""
+        self.balances[(token.lower(), holder.lower())] = raw_balance
+
+    def get_balance(self, token: str, holder: str) -> int:
+        """Current `balanceOf(holder)` of a token."""
+        return self.balances.get((token.lower(), holder.lower()), 0)
+
+    def set_allowance(self, token: str, owner: str, spender: str, raw_allowance: int) -> None:
+        """Set the `allowance(owner, spender)` result of a token."""
+        self.allowances[(token.lower(), owner.lower(), spender.lower())] = raw_allowance
+
+    def get_allowance(self, token: str, owner: str, spender: str) -> int:
+        """Current `allowance(owner, spender)` of a token, unlimited unless set."""
+        key = (token.lower(), owner.lower(), spender.lower())
+        return self.allowances.get(key, UNLIMITED_ALLOWANCE)
+
+    async def drop_connections(self) -> None:
+        """Close all client connections (and their subscriptions), the server keeps running."""
+        await asyncio.gather(
+            *(ws.close(1012, "node restart") for ws in list(self.connections)),
+            return_exceptions=True,
+        )
+
+    async def handler(self, ws: ServerConnection) -> None:
+        """Serve JSON-RPC requests of one connection, concurrently."""
+        self.connections.add(ws)
+        tasks: Set[asyncio.Task] = set()
+        try:
+            async for raw in ws:
+                task = asyncio.create_task(self.respond(ws, raw))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(ws)
+            for sub_id in [s.id for s in self.subscriptions.values() if s.ws is ws]:
+                del self.subscriptions[sub_id]
+            for task in tasks:
+                task.cancel()
+
+    async def respond(self, ws: ServerConnection, raw: Union[str, bytes]) -> None:
+        """Answer one request or batch of requests."""
+        request = json.loads(raw)
+        if isinstance(request, list):
+            self.calls["batch"] = self.calls.get("batch", 0) + 1
+            methods = [r.get("method", "") for r in request]
+            await self.delay(
+                max(methods, key=lambda m: self.method_latency.get(m, 0.0), default="")
+            )
+            response: Any = [self.call(ws, r) for r in request]
+        else:
+            await self.delay(request.get("method", ""))
+            response = self.call(ws, request)
+        try:
+            await ws.send(json.dumps(response))
+        except ConnectionClosed:
+            pass
+
+    async def delay(self, method: str) -> None:
+        """Injected response latency."""
+        seconds = self.latency + self.method_latency.get(method, 0.0)
+        if self.jitter:
+            seconds += self.rng.uniform(0, self.jitter)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def call(self, ws: ServerConnection, request: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON-RPC response object of one request."""
+        response: Dict[str, Any] = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            response["result"] = self.dispatch(request["method"], request.get("params") or [], ws)
+        except RpcError as e:
+            response["error"] = {"code": e.code, "message": e.message}
+        return response
+
+    def dispatch(  # pylint: disable=too-many-return-statements  # one per method
+        self, method: str, params: list, ws: Optional[ServerConnection] = None
+    ) -> Any:
+        """Handle one JSON-RPC call.
+
+        Raises:
+            RpcError: on unsupported method or call
+        """
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "eth_chainId":
+            return hex(self.chain_id)
+        if method == "net_version":
+            return str(self.chain_id)
+        if method == "eth_blockNumber":
+            return hex(self.block_number)
+        if method == "eth_call":
+            return self.eth_call(params[0])
+        if method == "eth_getBalance":
+            return hex(self.get_balance(NATIVE_TOKEN, params[0]))
+        if method == "eth_subscribe":
+            assert ws is not None, "Subscriptions need a connection"
+            return self.subscribe(ws, params)
+        if method == "eth_unsubscribe":
+            return self.subscriptions.pop(params[0], None) is not None
+        raise RpcError(-32601, f"Method {method} not supported")
+
+    def subscribe(self, ws: ServerConnection, params: list) -> str:
+        """Register a `logs` or `newHeads` subscription."""
+        kind = params[0]
+        sub = Subscription(id=hex(next(self._subscription_ids)), ws=ws, kind=kind)
+        if kind == "logs":
+            criteria = params[1] if len(params) > 1 else {}
+            address = criteria.get("address")
+            if address is not None:
+                addresses = address if isinstance(address, list) else [address]
+                sub.addresses = {a.lower() for a in addresses}
+            sub.topics = criteria.get("topics")
+        elif kind != "newHeads":
+            raise RpcError(-32602, f"Subscription {kind} not supported")
+        self.subscriptions[sub.id] = sub
+        return sub.id
+
+    def eth_call(self, tx: Dict[str, Any]) -> str:
+        """Answer ERC-20 `balanceOf` and `allowance` and Multicall3 `aggregate3` calls."""
+        data = tx.get("data") or tx.get("input") or ""
+        to = tx["to"].lower()
+        if to == MULTICALL3_ADDRESS and data.startswith(AGGREGATE3_SELECTOR):
+            (calls,) = decode(["(address,bool,bytes)[]"], bytes.fromhex(data[10:]))
+            results = []
+            for target, allow_failure, call_data in calls:
+                try:
+                    result = self.eth_call({"to": target, "data": "0x" + call_data.hex()})
+                    results.append((True, bytes.fromhex(result[2:])))
+                except RpcError:
+                    if not allow_failure:
+                        raise
+                    results.append((False, b""))
+            return "0x" + encode(["(bool,bytes)[]"], [results]).hex()
+        if data.startswith(ALLOWANCE_SELECTOR) and len(data) == 138:
+            owner, spender = "0x" + data[34:74], "0x" + data[98:138]
+            return "0x" + self.get_allowance(to, owner, spender).to_bytes(32, "big").hex()
+        if not data.startswith(BALANCE_OF_SELECTOR):
+            raise RpcError(-32000, "execution reverted")
+        holder = "0x" + data[len(BALANCE_OF_SELECTOR) :][-40:]
+        return "0x" + self.get_balance(to, holder).to_bytes(32, "big").hex()
+
+    async def notify(self, sub: Subscription, result: Dict[str, Any]) -> None:
+        """Send a subscription notification."""
+        message = {
+            "jsonrpc": "2.0",
+            "method": "eth_subscription",
+            "params": {"subscription": sub.id, "result": result},
+        }
+        try:
+            await sub.ws.send(json.dumps(message))
+            self.notifications += 1
+        except ConnectionClosed:
+            pass
+
+    def block_header(self, number: int) -> Dict[str, Any]:
+        """Synthetic block header of `number`."""
+        return {
+            "number": hex(number),
+            "hash": "0x" + number.to_bytes(32, "big").hex(),
+            "parentHash": "0x" + (number - 1).to_bytes(32, "big").hex(),
+            "nonce": "0x0000000000000000",
+            "sha3Uncles": ZERO_HASH,
+            "logsBloom": "0x" + "00" * 256,
+            "transactionsRoot": ZERO_HASH,
+            "stateRoot": ZERO_HASH,
+            "receiptsRoot": ZERO_HASH,
+            "miner": "0x" + "00" * 20,
+            "difficulty": "0x0",
+            "extraData": "0x",
+            "gasLimit": hex(30_000_000),
+            "gasUsed": "0x0",
+            "timestamp": hex(int(time.time())),
+            "baseFeePerGas": hex(10**8),
+            "mixHash": ZERO_HASH,
+        }
+
+    async def mine(self, blocks: int = 1) -> int:
+        """Advance the head by `blocks` and notify `newHeads` subscribers, returns the head."""
+        for _ in range(blocks):
+            self.block_number += 1
+            header = self.block_header(self.block_number)
+            await asyncio.gather(
+                *(
+                    self.notify(sub, header)
+                    for sub in list(self.subscriptions.values())
+                    if sub.kind == "newHeads"
+                )
+            )
+        return self.block_number
+
+    async def emit_log(self, address: str, topics: List[str], data: str) -> int:
+        """Notify matching `logs` subscribers of a log at the head block,
+        returns the number of notified subscriptions."""
+        entry = {
+            "address": address,
+            "topics": topics,
+            "data": data,
+            "blockNumber": hex(self.block_number),
+            "blockHash": "0x" + self.block_number.to_bytes(32, "big").hex(),
+            "transactionHash": "0x" + os.urandom(32).hex(),
+            "transactionIndex": "0x0",
+            "logIndex": hex(next(self._log_index)),
+            "removed": False,
+        }
+        self.logs.append(entry)
+        return await self.notify_log(entry)
+
+    async def notify_log(self, entry: Dict[str, Any]) -> int:
+        """Notify the matching `logs` subscribers of a log, returns their number."""
+        subs = [
+            sub
+            for sub in list(self.subscriptions.values())
+            if sub.kind == "logs" and sub.matches(entry["address"], entry["topics"])
+        ]
+        await asyncio.gather(*(self.notify(sub, entry) for sub in subs))
+        return len(subs)
+
+    async def reorg(self, block_number: int) -> int:
+        """Move the head back to `block_number`: the logs of the later blocks are
+        notified again with `removed: true` and their transfers are undone. Returns
+        the number of notifications."""
+        notified = 0
+        while self.logs and int(self.logs[-1]["blockNumber"], 16) > block_number:
+            entry = {**self.logs.pop(), "removed": True}
+            topics = entry["topics"]
+            if len(topics) == 3 and topics[0] == TRANSFER_TOPIC:
+                amount = int(entry["data"], 16)
+                sender, recipient = "0x" + topics[1][-40:], "0x" + topics[2][-40:]
+                token = entry["address"]
+                self.set_balance(
+                    token, recipient, max(0, self.get_balance(token, recipient) - amount)
+                )
+                self.set_balance(token, sender, self.get_balance(token, sender) + amount)
+            notified += await self.notify_log(entry)
+        self.block_number = min(self.block_number, block_number)
+        return notified
+
+    async def transfer(self, token: str, sender: str, recipient: str, amount: int) -> int:
+        """Move `amount` of a token and emit its `Transfer` log, returns notified subscriptions."""
+        self.set_balance(token, sender, max(0, self.get_balance(token, sender) - amount))
+        self.set_balance(token, recipient, self.get_balance(token, recipient) + amount)
+        return await self.emit_log(
+            token,
+            [TRANSFER_TOPIC, topic_address(sender), topic_address(recipient)],
+            "0x" + amount.to_bytes(32, "big").hex(),
+        )
+
+    async def transfer_storm(  # pylint: disable=too-many-arguments
+        self,
+        tokens: List[str],
+        holder: str,
+        count: int,
+        *,
+        rate: Optional[float] = None,
+        amount: int = 1,
+        transfers_per_block: int = 0,
+    ) -> int:
+        """Emit `count` transfers of random `tokens` to and from `holder` with random
+        counterparties, at `rate` per second (as fast as possible if None).
+
+        Transfers come in pairs of the same token (in, then out), so balances of `holder`
+        are unchanged after an even `count`. Mines a block every `transfers_per_block`
+        transfers if set. Returns the number of notifications."""
+        notified = 0
+        token = tokens[0]
+        start = time.perf_counter()
+        for i in range(count):
+            if rate:
+                delay = start + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if i % 2 == 0:
+                token = self.rng.choice(tokens)
+            counterparty = "0x" + os.urandom(20).hex()
+            if i % 2 == 0:
+                notified += await self.transfer(token, counterparty, holder, amount)
+            else:
+                notified += await self.transfer(token, holder, counterparty, amount)
+            if transfers_per_block and (i + 1) % transfers_per_block == 0:
+                await self.mine()
+        return notified
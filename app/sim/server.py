@@ -0,0 +1,38 @@
+"""Base of the in-process websocket stand-ins (`FakeLiquoriceServer`, `FakeRpcNode`)."""
+
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from websockets.asyncio.server import Server, ServerConnection, serve
+
+
+class WsServer(ABC):
+    """Websocket server on a local port, serving each connection with `handler()`."""
+
+    server: Optional[Server]
+
+    def __init__(self) -> None:
+        self.server = None
+
+    @property
+    def url(self) -> str:
+        """Websocket URL of the running server."""
+        assert self.server is not None, "Server is not started"
+        host, port = next(iter(self.server.sockets)).getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    @abstractmethod
+    async def handler(self, ws: ServerConnection) -> None:
+        """Serve one connection until it is closed."""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start listening, returns the server URL."""
+        self.server = await serve(self.handler, host, port, max_size=None)
+        return self.url
+
+    async def stop(self) -> None:
+        """Stop the server and close connections."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
@@ -0,0 +1,21 @@
+"""Smoke test of the RFQ pipeline benchmark."""
+
+import pytest
+
+from app.evm.chains import arbitrum
+from app.sim.bench import run_benchmark
+
+
+@pytest.mark.parametrize("fast_path", [False, True])
+async def test_benchmark_quotes_every_rfq(fast_path):
+    active, skeeper = arbitrum.CHAIN.active, arbitrum.CHAIN.skeeper_address
+    summary = await run_benchmark(rate=20, duration=0.5, fast_path=fast_path)
+    assert summary["rfqs_sent"] == 10
+    assert summary["quotes_received"] == 10
+    assert summary["unmatched_quotes"] == 0
+    assert summary["invalid_quotes"] == 0
+    assert summary["coverage"] == 1.0
+    assert 0 < summary["p50_ms"] <= summary["p99_ms"] <= summary["p999_ms"]
+    # module level chain state is restored
+    assert arbitrum.CHAIN.active == active
+    assert arbitrum.CHAIN.skeeper_address == skeeper
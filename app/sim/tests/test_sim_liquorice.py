@@ -0,0 +1,184 @@
+"""Tests of the Liquorice simulator: RFQ mix, arrivals and quote validation."""
+
+import random
+from typing import Any, Dict
+
+import pytest
+from eth_account import Account
+from web3 import Web3
+
+from app.evm.chains import arbitrum
+from app.protocols.liquorice.signer import SignableRfqQuoteLevel
+from app.sim.liquorice import (
+    FakeLiquoriceServer,
+    LoadStats,
+    RfqMix,
+    arrival_times,
+    percentile,
+    validate_quote,
+)
+
+PRIV_KEY = "0x" + "11" * 32
+SKEEPER = Web3.to_checksum_address("0x" + "5e" * 20)
+
+MIX: Dict[str, Any] = {
+    "pairs": [
+        {
+            "chainId": arbitrum.CHAIN_ID,
+            "baseToken": arbitrum.USDT.address,
+            "quoteToken": arbitrum.USDC.address,
+            "minAmount": "1000000",
+            "maxAmount": "1000000000000",
+            "weight": 3,
+        },
+        {
+            "chainId": arbitrum.CHAIN_ID,
+            "baseToken": arbitrum.WETH.address.lower(),
+            "quoteToken": arbitrum.USDC.address,
+            "minAmount": 10**6,
+            "maxAmount": 10**6,
+            "side": "quote",
+        },
+    ],
+    "solvers": {"a": 9, "b": 1},
+}
+
+
+def signed_quote(rfq: Dict[str, Any], quote_token_amount: int = 990 * 10**6) -> Dict[str, Any]:
+    """Quote of one level for `rfq` signed the way `Web3Signer` signs it."""
+    account = Account.from_key(PRIV_KEY)
+    level = {
+        "type": "lite",
+        "expiry": rfq["expiry"],
+        "settlementContract": arbitrum.CHAIN.liquorice_settlement_address,
+        "signer": account.address,
+        "recipient": SKEEPER,
+        "baseToken": rfq["baseToken"],
+        "quoteToken": rfq["quoteToken"],
+        "baseTokenAmount": rfq["baseTokenAmount"],
+        "quoteTokenAmount": str(quote_token_amount),
+        "minQuoteTokenAmount": "1",
+        "eip1271Verifier": SKEEPER,
+    }
+    signable = SignableRfqQuoteLevel(
+        base_token=level["baseToken"],
+        base_token_amount=int(level["baseTokenAmount"]),
+        chain_id=rfq["chainId"],
+        settlement_contract=level["settlementContract"],
+        effective_trader=rfq["effectiveTrader"],
+        quote_expiry=level["expiry"],
+        min_quote_token_amount=1,
+        nonce=bytes.fromhex(rfq["nonce"]),
+        quote_token=level["quoteToken"],
+        quote_token_amount=quote_token_amount,
+        recipient=SKEEPER,
+        rfq_id=rfq["rfqId"],
+        market=level["settlementContract"],
+        trader=rfq["trader"],
+    )
+    level["signature"] = "0x" + account.unsafe_sign_hash(signable.hash).signature.hex()
+    return {"rfqId": rfq["rfqId"], "levels": [level]}
+
+
+def make_rfq(seed: int = 1) -> Dict[str, Any]:
+    mix = RfqMix.from_dict({"pairs": MIX["pairs"][:1]})
+    return FakeLiquoriceServer(mix.factory(random.Random(seed))).make_rfq()
+
+
+def test_mix_draws_pairs_sizes_and_solvers():
+    mix = RfqMix.from_dict(MIX)
+    assert mix.pairs[1].base_token == arbitrum.WETH.address
+    factory = mix.factory(random.Random(42))
+    rfqs = [factory() for _ in range(2000)]
+    usdt = [r for r in rfqs if r["baseToken"] == arbitrum.USDT.address]
+    weth = [r for r in rfqs if r["baseToken"] == arbitrum.WETH.address]
+    assert 1350 < len(usdt) < 1650  # weight 3 of 4
+    assert all(10**6 <= int(r["baseTokenAmount"]) <= 10**12 for r in usdt)
+    assert all(r["quoteTokenAmount"] is None for r in usdt)
+    # log-uniform: about as many RFQs below 1000 USDT as above
+    below = sum(int(r["baseTokenAmount"]) < 10**9 for r in usdt)
+    assert 0.4 < below / len(usdt) < 0.6
+    assert all(r["quoteTokenAmount"] == "1000000" and r["baseTokenAmount"] is None for r in weth)
+    assert 1700 < sum(r["solver"] == "a" for r in rfqs) < 1900
+
+
+@pytest.mark.parametrize(
+    "pair, error",
+    [
+        ({"side": "both"}, "side"),
+        ({"minAmount": 0}, "minAmount"),
+        ({"minAmount": 10, "maxAmount": 5}, "minAmount"),
+    ],
+)
+def test_mix_rejects_bad_pairs(pair, error):
+    with pytest.raises(ValueError, match=error):
+        RfqMix.from_dict({"pairs": [{**MIX["pairs"][0], **pair}]})
+
+
+def test_arrival_times():
+    assert arrival_times(10, 1) == [i / 10 for i in range(10)]
+    offsets = arrival_times(1000, 10, "poisson", random.Random(7))
+    assert 9500 < len(offsets) < 10500
+    assert offsets == sorted(offsets) and 0 < offsets[0] and offsets[-1] < 10
+    with pytest.raises(ValueError):
+        arrival_times(10, 1, "bursty")
+
+
+def test_validate_quote():
+    rfq = make_rfq()
+    signer = Account.from_key(PRIV_KEY).address
+    quote = signed_quote(rfq)
+    assert validate_quote(rfq, quote) is None
+    assert validate_quote(rfq, quote, {signer}) is None
+    assert validate_quote(rfq, quote, {SKEEPER}) == "unknown signer"
+    assert validate_quote(rfq, {"rfqId": rfq["rfqId"], "levels": []}) == "no levels"
+
+    tampered = signed_quote(rfq)
+    tampered["levels"][0]["quoteTokenAmount"] = str(991 * 10**6)
+    assert validate_quote(rfq, tampered) == "bad signature"
+
+    other_rfq = {**rfq, "nonce": "00" * 32}
+    assert validate_quote(other_rfq, quote) == "bad signature"
+    assert validate_quote({**rfq, "nonce": "0x" + rfq["nonce"]}, quote) is None
+
+    too_big = signed_quote(rfq)
+    too_big["levels"][0]["baseTokenAmount"] = str(int(rfq["baseTokenAmount"]) + 1)
+    assert validate_quote(rfq, too_big) == "baseTokenAmount exceeds RFQ"
+
+    malformed = signed_quote(rfq)
+    del malformed["levels"][0]["signature"]
+    error = validate_quote(rfq, malformed)
+    assert error is not None and error.startswith("malformed")
+
+
+def test_stats_coverage_and_records():
+    stats = LoadStats()
+    rfqs = [make_rfq(seed) for seed in range(4)]
+    for i, rfq in enumerate(rfqs):
+        rfq["solver"] = "a" if i < 2 else "b"
+        stats.rfqs[rfq["rfqId"]] = rfq
+        stats.sent_at[rfq["rfqId"]] = float(i)
+    for rfq in rfqs[:3]:
+        stats.quotes[rfq["rfqId"]] = signed_quote(rfq)
+        stats.latencies[rfq["rfqId"]] = 0.005
+    stats.quotes[rfqs[2]["rfqId"]]["levels"][0]["signature"] = "0x" + "00" * 65
+    stats.validate()
+    assert stats.errors == {rfqs[2]["rfqId"]: "bad signature"}
+    assert stats.coverage(lambda rfq: rfq["solver"]) == {"a": 1.0, "b": 0.0}
+    summary = stats.summary()
+    assert summary["quotes_received"] == 3
+    assert summary["invalid_quotes"] == 1
+    assert summary["coverage"] == 0.5
+    records = stats.records()
+    assert [r["rfqId"] for r in records] == [r["rfqId"] for r in rfqs]
+    assert records[0]["latency_ms"] == 5.0 and records[0]["error"] is None
+    assert records[3]["quoted"] is False and records[3]["latency_ms"] is None
+
+
+def test_percentile():
+    values = [float(v) for v in range(1, 1001)]
+    assert percentile(values, 50) == 500
+    assert percentile(values, 99) == 990
+    assert percentile(values, 99.9) == 999
+    assert percentile([1.0], 99.9) == 1.0
+    assert percentile([], 50) is None
@@ -0,0 +1,61 @@
+"""Capture and replay of Liquorice traffic through the RFQ pipeline."""
+
+import json
+
+import pytest
+
+from app.protocols.liquorice.capture import Direction, FrameCapture
+from app.sim.bench import run_benchmark
+from app.sim.replay import captured_summary, load_capture, parse_speed, scale_schedule
+
+
+def rfq_frame(rfq_id: str) -> str:
+    return json.dumps({"messageType": "rfq", "message": {"rfqId": rfq_id}})
+
+
+def quote_frame(rfq_id: str) -> str:
+    return json.dumps({"messageType": "rfqQuote", "message": {"rfqId": rfq_id, "levels": []}})
+
+
+def test_load_capture(tmp_path):
+    path = str(tmp_path / "frames.lqcap")
+    capture = FrameCapture(path)
+    capture.record(Direction.IN, 99.0, json.dumps({"messageType": "connected", "message": {}}))
+    capture.record(Direction.IN, 100.0, rfq_frame("a"))
+    capture.record(Direction.IN, 100.5, rfq_frame("b"))
+    capture.record(Direction.IN, 100.6, "not json")
+    capture.record(Direction.OUT, 100.75, quote_frame("b"))
+    capture.record(Direction.IN, 102.0, rfq_frame("c"))
+    capture.record(Direction.OUT, 102.001, quote_frame("c"))
+    capture.record(Direction.OUT, 102.5, quote_frame("c"))
+    capture.close()
+
+    rfqs, latencies = load_capture(path)
+    assert [(offset, message["rfqId"]) for offset, message in rfqs] == [
+        (0.0, "a"),
+        (0.5, "b"),
+        (2.0, "c"),
+    ]
+    assert latencies == pytest.approx({"b": 0.25, "c": 0.001})
+    summary = captured_summary(latencies)
+    assert summary["captured_quotes"] == 2
+    assert summary["captured_p50_ms"] == pytest.approx(1.0)
+
+    assert [offset for offset, _ in scale_schedule(rfqs, 2.0)] == [0.0, 0.25, 1.0]
+    assert [offset for offset, _ in scale_schedule(rfqs, parse_speed("max"))] == [0, 0, 0]
+
+
+async def test_replay_captured_load(tmp_path):
+    """RFQs captured by the client are replayed verbatim through the pipeline."""
+    path = str(tmp_path / "frames.lqcap")
+    summary = await run_benchmark(rate=20, duration=0.5, capture_path=path)
+    assert summary["quotes_received"] == 10
+
+    rfqs, latencies = load_capture(path)
+    assert len(rfqs) == 10 and len(latencies) == 10
+    assert rfqs[-1][0] == pytest.approx(0.45, abs=0.05)
+
+    replayed = await run_benchmark(rate=0, duration=0, schedule=scale_schedule(rfqs, None))
+    assert replayed["rfqs_sent"] == 10
+    assert replayed["quotes_received"] == 10
+    assert replayed["invalid_quotes"] == 0
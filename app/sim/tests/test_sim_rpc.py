@@ -0,0 +1,140 @@
+"""Tests of the fake JSON-RPC node with a real web3 client."""
+
+import asyncio
+import json
+import time
+
+import pytest
+import websockets
+from eth_abi import decode, encode
+from web3 import AsyncWeb3, Web3
+from web3.providers.persistent import WebSocketProvider
+from web3.utils.subscriptions import LogsSubscription, NewHeadsSubscription
+
+from app.evm.erc20_service import ERC20_ABI
+from app.evm.helpers import encode_address
+from app.sim.chain_bench import run_chain_benchmark
+from app.sim.rpc import (
+    AGGREGATE3_SELECTOR,
+    MULTICALL3_ADDRESS,
+    TRANSFER_TOPIC,
+    FakeRpcNode,
+)
+
+TOKEN = Web3.to_checksum_address("0x" + "aa" * 20)
+HOLDER = Web3.to_checksum_address("0x" + "bb" * 20)
+OTHER = Web3.to_checksum_address("0x" + "cc" * 20)
+
+
+@pytest.fixture
+async def node():
+    node = FakeRpcNode(31337, block_number=100)
+    node.set_balance(TOKEN, HOLDER, 12345)
+    await node.start()
+    yield node
+    await node.stop()
+
+
+async def test_web3_calls(node):
+    async with AsyncWeb3(WebSocketProvider(node.url)) as w3:
+        assert await w3.eth.chain_id == 31337
+        assert await w3.eth.block_number == 100
+        contract = w3.eth.contract(address=TOKEN, abi=ERC20_ABI)
+        assert await contract.functions.balanceOf(HOLDER).call() == 12345
+        assert await contract.functions.balanceOf(OTHER).call() == 0
+
+        balance_of = bytes.fromhex("70a08231") + encode(["address"], [HOLDER])
+        calls = [(TOKEN, False, balance_of), (OTHER, True, b"\x00")]
+        raw = await w3.eth.call(
+            {
+                "to": Web3.to_checksum_address(MULTICALL3_ADDRESS),
+                "data": AGGREGATE3_SELECTOR + encode(["(address,bool,bytes)[]"], [calls]).hex(),
+            }
+        )
+        (results,) = decode(["(bool,bytes)[]"], raw)
+        assert results[0] == (True, (12345).to_bytes(32, "big"))
+        assert results[1] == (False, b"")
+
+
+async def test_batch_requests_and_latency(node):
+    node.latency = 0.1
+    async with websockets.connect(node.url) as ws:
+        start = time.perf_counter()
+        await ws.send(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "eth_chainId"}))
+        await ws.send(
+            json.dumps(
+                [
+                    {"jsonrpc": "2.0", "id": 2, "method": "eth_blockNumber"},
+                    {"jsonrpc": "2.0", "id": 3, "method": "eth_nope"},
+                ]
+            )
+        )
+        single, batch = sorted(
+            [json.loads(await ws.recv()) for _ in range(2)], key=lambda r: isinstance(r, list)
+        )
+        # requests are served concurrently: both delays overlap
+        assert 0.1 <= time.perf_counter() - start < 0.19
+    assert single == {"jsonrpc": "2.0", "id": 1, "result": hex(31337)}
+    assert batch[0]["result"] == hex(100)
+    assert batch[1]["error"]["code"] == -32601
+    assert node.calls["batch"] == 1
+
+
+async def test_subscriptions(node):
+    heads, logs = [], []
+
+    async def on_head(context):
+        heads.append(context.result)
+
+    async def on_log(context):
+        logs.append(context.result)
+
+    async with AsyncWeb3(WebSocketProvider(node.url)) as w3:
+        await w3.subscription_manager.subscribe(
+            [
+                NewHeadsSubscription(handler=on_head),
+                LogsSubscription(
+                    address=TOKEN,
+                    topics=[TRANSFER_TOPIC, None, encode_address(HOLDER)],
+                    handler=on_log,
+                ),
+            ]
+        )
+        task = asyncio.create_task(w3.subscription_manager.handle_subscriptions())
+        assert await node.mine(2) == 102
+        assert await node.transfer(TOKEN, OTHER, HOLDER, 5) == 1
+        assert await node.transfer(TOKEN, HOLDER, OTHER, 1) == 0  # from holder: filtered out
+        async with asyncio.timeout(2):
+            while len(heads) < 2 or not logs:
+                await asyncio.sleep(0.01)
+        task.cancel()
+    assert [head["number"] for head in heads] == [101, 102]
+    assert logs[0]["address"] == TOKEN
+    assert int.from_bytes(logs[0]["data"], "big") == 5
+    assert node.get_balance(TOKEN, HOLDER) == 12345 + 5 - 1
+    assert node.get_balance(TOKEN, OTHER) == 1  # sender balances do not go negative
+
+
+async def test_drop_connections(node):
+    async with websockets.connect(node.url) as ws:
+        await ws.send(
+            json.dumps(
+                {"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]}
+            )
+        )
+        await ws.recv()
+        assert len(node.subscriptions) == 1
+        await node.drop_connections()
+        with pytest.raises(websockets.ConnectionClosed):
+            await ws.recv()
+    async with asyncio.timeout(1):
+        while node.subscriptions or node.connections:
+            await asyncio.sleep(0.01)
+
+
+async def test_chain_benchmark():
+    result = await run_chain_benchmark(tokens=5, latency=0.001, probes=2, storm=20, storm_rate=0)
+    assert result["subscriptions"] == 10
+    assert result["refresh_max_ms"] is not None
+    # every transfer is to or from the SKeeper: exactly one subscription matches
+    assert result["storm_notifications"] == 20